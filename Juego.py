@@ -2,14 +2,36 @@ import pygame
 import sys
 import random
 import color_mapa
-import numpy as np
 from pygame.locals import *
-from mapa import Mapa, distancia, VACIO
+from mapa import Mapa, VACIO
+from vision import CampoVision
+from campo_distancias import CampoDistancias
+from cache_caminos import CacheCaminos
+from regiones import IndiceRegiones, SIN_REGION
+from render import Renderizador, RenderizadorVista
+from bucle import BucleJuego, interpolar
+from entidades import IndiceEntidades
+from fichero_mapa import cargar_mapa
+from perfilado import Perfilador
 from enum import Enum
 
 LADO_CELDA = 10
 ANCHO_MAPA = 70
 ALTO_MAPA = 70
+# Celdas visibles en pantalla; si el mapa es mayor se muestra una
+# ventana centrada en el jugador
+ANCHO_VISTA = 70
+ALTO_VISTA = 70
+# Ticks de simulacion por segundo, independientes de los fotogramas
+TICKS_POR_SEGUNDO = 10
+
+# Desplazamiento de cada flecha del teclado
+TECLAS_PASO = {
+    K_RIGHT: (0, 1),
+    K_LEFT: (0, -1),
+    K_UP: (-1, 0),
+    K_DOWN: (1, 0),
+}
 
 class Estado(Enum):
     PATRULLAR = 1
@@ -21,23 +43,19 @@ class Estado(Enum):
 
 
 class Monstruo():
-    def __init__(self, posicion):
+    __slots__ = ("posicion", "simulacion", "estado", "lentitud", "vida",
+                 "armadura", "turno", "fuerza", "distancia_visto",
+                 "distancia_olido", "max_dist_olfato", "max_dist_vista")
+
+    def __init__(self, posicion, simulacion):
         self.posicion = posicion
+        self.simulacion = simulacion
         self.estado = Estado.PATRULLAR
         self.lentitud = 2
         self.vida = 12
         self.armadura = 2
         self.turno = 0
         self.fuerza = 4
-
-        self.switcher = {
-            Estado.PATRULLAR: self.patrullar,
-            Estado.BUSCAR: self.buscar,
-            Estado.RASTREAR: self.rastrear,
-            Estado.HUIR: self.huir,
-            Estado.LUCHA: self.luchar,
-            Estado.MUERTO: self.morir
-        }
         self.distancia_visto = None
         self.distancia_olido = None
         self.max_dist_olfato = 10
@@ -52,19 +70,19 @@ class Monstruo():
         es menor a la distancia de olfato
         :return: Booleano si huele al jugador
         """
-        pos1 = self.posicion
-        pos2 = jugador.posicion
-        return distancia(pos1, pos2) <= self.max_dist_olfato
+        cercanos = self.simulacion.entidades.en_radio(
+            self.posicion, self.max_dist_olfato, Jugador)
+        return self.simulacion.jugador in cercanos
 
     def ver(self):
         """
         Comprobar si el monstruo puede visualizar al jugador
         :return: Booleano si ve al jugador
         """
-        esVisible = mapa.es_visble(jugador.posicion, self.posicion)
-        enRangoVisible = (distancia(self.posicion, jugador.posicion)
-                          <= self.max_dist_vista)
-        return esVisible and enRangoVisible
+        # El campo de vision ya esta limitado a la distancia maxima
+        return self.simulacion.vision.es_visible(
+            self.posicion, self.simulacion.jugador.posicion,
+            self.max_dist_vista)
 
     def percibir(self):
         """
@@ -72,6 +90,7 @@ class Monstruo():
         actualiza su estado
         :return: Booleano si percibe al jugador
         """
+        jugador = self.simulacion.jugador
         percibido = True
         if(self.oler()):
             if(self.vida > jugador.vida):
@@ -95,66 +114,42 @@ class Monstruo():
         la posición actual
         :return: 
         """
-        pasos = mapa.buscar_camino_recto(jugador.posicion, self.posicion)
-        self.posicion = (pasos[len(pasos)-1].i, pasos[len(pasos)-1].j)
+        mapa = self.simulacion.mapa
+        pasos = mapa.buscar_camino_recto(
+            self.simulacion.jugador.posicion, self.posicion)
+        siguiente = (pasos[len(pasos)-1].i, pasos[len(pasos)-1].j)
+        if mapa[siguiente] == VACIO:
+            self.simulacion.entidades.mover(self, siguiente)
 
     def rastrear(self):
         """
-        Calculo del camino más corto y actulización de 
-        la posición actual
+        Avanzar por el camino más corto hacia el jugador leyendo el
+        campo de distancias compartido por todos los monstruos
         :return:
         """
+        jugador = self.simulacion.jugador
+        campo_jugador = self.simulacion.campo_jugador
         if(self.posicion != jugador.posicion):
-            pasos = mapa.buscar_camino(self.posicion, jugador.posicion)
-            if not ((jugador.posicion[0] == pasos[0].i)
-                    and (jugador.posicion[1] == pasos[0].j)):
-                self.posicion = (pasos[0].i, pasos[0].j)
+            # Solo se recalcula si el jugador se ha movido
+            campo_jugador.actualizar(jugador.posicion)
+            siguiente = campo_jugador.siguiente_paso(self.posicion)
+            # No se pisa al jugador ni a otro monstruo
+            if siguiente is not None:
+                self.simulacion.entidades.mover(self, siguiente)
 
     def huir(self):
         """
-        Calculo del camino en dirección contraria al jugador
-        y actulización de la posición actual
+        Alejarse del jugador moviendose al vecino más lejano según el
+        campo de distancias compartido por todos los monstruos
         :return:
         """
+        jugador = self.simulacion.jugador
+        campo_jugador = self.simulacion.campo_jugador
         if(self.posicion != jugador.posicion):
-            #Se guardan las posiciones del jugador y del monstruo
-            posJugador = np.array([jugador.posicion[0], jugador.posicion[1]])
-            posMonstruo = np.array([self.posicion[0], self.posicion[1]])
-
-            #Calculo de la dirección opuesta al jugador
-            dirMJ = posJugador - posMonstruo
-            posNuevo = np.array([-jugador.posicion[0], -jugador.posicion[1]])
-            dirNJM = posNuevo - posMonstruo
-
-            maximoBusquedas = 10
-            contadorBusquedas = 0
-
-            # Mientras las busquedas sean menores al máximo y
-            # las coordenadas del destino y la dirección sean validas.
-            while contadorBusquedas < maximoBusquedas:
-                if mapa.esta_dentro((posNuevo[0], posNuevo[1])):
-                    if mapa[(posNuevo[0], posNuevo[1])] == VACIO:
-                        if not np.dot(dirMJ, dirNJM) > -0.3:
-                            break
-
-                # Generación del incremento en X e Y aleatoriamente
-                pasoX = random.randint(-1, 1)
-                pasoY = random.randint(-1, 1)
-
-                # Se actualiza la nueva posición destino del monstruo
-                posNuevo[0] = self.posicion[0] + pasoX
-                posNuevo[1] = self.posicion[1] + pasoY
-
-                # Actualiza la dirección 
-                dirNJM = posNuevo - posMonstruo
-                contadorBusquedas += 1
-
-            # Calculo del camino hacia el destino
-            #  y actualización de la posición
-            if contadorBusquedas < maximoBusquedas:
-                pasos = mapa.buscar_camino(
-                    self.posicion, (posNuevo[0], posNuevo[1]))
-                self.posicion = (pasos[0].i, pasos[0].j)
+            campo_jugador.actualizar(jugador.posicion)
+            siguiente = campo_jugador.paso_alejandose(self.posicion)
+            if siguiente is not None:
+                self.simulacion.entidades.mover(self, siguiente)
 
     def patrullar(self):
         """
@@ -162,13 +157,14 @@ class Monstruo():
         y actulización de la posición actual
         :return:
         """
-        pasoX = random.randint(-1, 1)
-        pasoY = random.randint(-1, 1)
+        mapa = self.simulacion.mapa
+        pasoX = self.simulacion.aleatorio.randint(-1, 1)
+        pasoY = self.simulacion.aleatorio.randint(-1, 1)
         nextPosition = (self.posicion[0]+pasoX, self.posicion[1]+pasoY)
         if mapa.esta_dentro(nextPosition) and (mapa[nextPosition] == VACIO):
             vacio = mapa.__getitem__(nextPosition)
             if (vacio == 0):
-                self.posicion = nextPosition
+                self.simulacion.entidades.mover(self, nextPosition)
 
     def atacar(self):
         """
@@ -176,7 +172,7 @@ class Monstruo():
         entre 0 y su fuerza máxima
         :return: Int ataque generado
         """
-        return (random.randint(0, self.fuerza))
+        return (self.simulacion.aleatorio.randint(0, self.fuerza))
 
     def defender(self, ataque):
         """
@@ -189,6 +185,8 @@ class Monstruo():
             self.vida -= (ataque - self.armadura)
         if self.vida <= 0:
             self.estado = Estado.MUERTO
+            # El cuerpo ya no ocupa su celda
+            self.simulacion.entidades.quitar(self)
 
     def luchar(self):
         """
@@ -197,7 +195,8 @@ class Monstruo():
         :return: 
         """
         if self.estado is not Estado.MUERTO:
-            if mapa.es_vecino(self.posicion, jugador.posicion):
+            for jugador in self.simulacion.entidades.vecinos(
+                    self.posicion, Jugador):
                 jugador.defender(self.atacar())
 
     def actualizar(self):
@@ -205,18 +204,54 @@ class Monstruo():
         Actualiza y ejecuta el estado actual
         :return:
         """
+        perfilador = self.simulacion.perfilador
+        if perfilador is not None:
+            self.actualizar_medido(perfilador)
+            return
         if(self.turno % self.lentitud == 0):
             if self.estado != Estado.MUERTO:
                 if self.percibir():
                     self.luchar()
             func = self.switcher.get(self.estado)
-            func()
+            func(self)
+        self.turno += 1
+
+    def actualizar_medido(self, perfilador):
+        """
+        Igual que actualizar pero midiendo la percepcion, la lucha y la
+        accion de cada estado
+        :param perfilador: Perfilador de la partida
+        :return:
+        """
+        if(self.turno % self.lentitud == 0):
+            if self.estado != Estado.MUERTO:
+                if perfilador.medir("percibir", self.percibir):
+                    perfilador.medir("luchar", self.luchar)
+            func = self.switcher.get(self.estado)
+            perfilador.medir(self.nombres_estado[self.estado], func, self)
         self.turno += 1
 
+    # Accion de cada estado, compartida por todos los monstruos
+    switcher = {
+        Estado.PATRULLAR: patrullar,
+        Estado.BUSCAR: buscar,
+        Estado.RASTREAR: rastrear,
+        Estado.HUIR: huir,
+        Estado.LUCHA: luchar,
+        Estado.MUERTO: morir
+    }
+    # Nombre de la medida de cada estado en el perfilador
+    nombres_estado = {estado: "estado." + estado.name.lower()
+                      for estado in Estado}
+
 
 class Jugador():
-    def __init__(self, posicion):
+    __slots__ = ("posicion", "simulacion", "movimientos", "vida",
+                 "armadura", "fuerza")
+
+    def __init__(self, posicion, simulacion):
         self.posicion = posicion
+        self.simulacion = simulacion
         self.movimientos = []
         self.vida = 8
         self.armadura = 3
@@ -228,7 +263,7 @@ class Jugador():
         entre 0 y su fuerza máxima
         :return: Int ataque generado
         """
-        return(random.randint(0, self.fuerza))
+        return(self.simulacion.aleatorio.randint(0, self.fuerza))
 
     def defender(self, ataque):
         """
@@ -246,9 +281,52 @@ class Jugador():
         esta en rango valido
         :return: 
         """
-        if mapa.es_vecino(self.posicion, m.posicion):
+        if m in self.simulacion.entidades.vecinos(self.posicion, Monstruo):
             m.defender(self.atacar())
 
+    def mover(self, paso):
+        """
+        Dar un paso limpiando los movimientos en cola
+        :param paso: Tupla (dx, dy) del desplazamiento
+        :return:
+        """
+        self.movimientos.clear()
+        mapa = self.simulacion.mapa
+        newPos = (self.posicion[0] + paso[0], self.posicion[1] + paso[1])
+        # Se actualiza la posición en caso de ser valida y estar libre
+        if mapa.esta_dentro(newPos) and (mapa[newPos] == VACIO):
+            self.simulacion.entidades.mover(self, newPos)
+
+    def golpear(self):
+        """
+        Atacar a todos los monstruos que esten en rango
+        :return:
+        """
+        self.movimientos.clear()
+        for monstruo in self.simulacion.entidades.vecinos(
+                self.posicion, Monstruo):
+            monstruo.defender(self.atacar())
+        for enjambre in self.simulacion.enjambres:
+            enjambre.recibir_golpe(self)
+
+    def ir_a(self, destino):
+        """
+        Poner en cola el camino más corto a una celda
+        :param destino: Celda destino
+        :return: Booleano si hay camino
+        """
+        # Un click fuera del mapa no es un destino
+        if not self.simulacion.mapa.esta_dentro(destino):
+            return False
+        pasos = self.simulacion.cache_caminos.buscar_camino(
+            self.posicion, destino)
+        if pasos is None:
+            return False
+        self.movimientos.clear()
+        for paso in pasos:
+            self.movimientos.append((paso.i, paso.j))
+        return True
+
     def actualizar(self, events):
         """
         Actualizar las acciones del jugador segun las 
@@ -264,88 +342,335 @@ class Jugador():
 
             # Evento tecla pulsada
             if event.type == KEYDOWN:
-
-                # limpian los movimientos en cola
-                self.movimientos.clear()
-
-                # Se genera un nueva posición en caso de pulsar una flecha
-                newPos = list(self.posicion)
-                if event.key == K_RIGHT:
-                    newPos[1] += 1
-                if event.key == K_LEFT:
-                    newPos[1] -= 1
-                if event.key == K_UP:
-                    newPos[0] -= 1
-                if event.key == K_DOWN:
-                    newPos[0] += 1
-                newPos = tuple(newPos)
-
-                # Se actualiza la posición en caso de ser valida
-                if mapa.esta_dentro(newPos) and (mapa[newPos] == VACIO):
-                    self.posicion = newPos
+                # Se da un paso en caso de pulsar una flecha
+                if event.key in TECLAS_PASO:
+                    self.mover(TECLAS_PASO[event.key])
 
                 # Tecla espacio genera un ataque
                 if event.key == K_SPACE:
-                    for monstruo in monstruos:
-                        self.luchar(monstruo)
+                    self.golpear()
 
-            # Evento click 
+            # Evento click
             elif event.type == MOUSEBUTTONDOWN:
-                # Se recoge la posición de la celda destino pulsada
-                pos = (event.pos[1] // LADO_CELDA, event.pos[0] // LADO_CELDA)
-                # Genera el camino más corto al destino
-                pasos = mapa.buscar_camino(self.posicion, pos)
-                # Se actualiza la cola de movimientos
-                if pasos is not None:
-                    self.movimientos.clear()
-                    for paso in pasos:
-                        self.movimientos.append((paso.i, paso.j))
+                # Se recoge la posición de la celda destino pulsada y se
+                # genera el camino más corto hasta ella
+                renderizador = self.simulacion.renderizador
+                self.ir_a(renderizador.celda_en_pantalla(event.pos))
 
         # Se actualiza la posición del jugador si hay movimiento en cola
+        # Si la celda esta ocupada se espera a que quede libre
         if (len(self.movimientos) > 0):
-            self.posicion = self.movimientos.pop(0)
+            if self.simulacion.entidades.mover(self, self.movimientos[0]):
+                self.movimientos.pop(0)
+
+
+class Simulacion():
+    """
+    Partida completa sin depender de pygame: el mapa, el jugador, los
+    monstruos y las estructuras que comparten. Se avanza tick a tick y
+    el jugador se mueve con los eventos recibidos o con una politica,
+    asi que sirve igual para jugar con ventana que para simular
+    partidas en lote
+    """
+    def __init__(self, ancho=ANCHO_MAPA, alto=ALTO_MAPA, semilla=None,
+                 politica=None, lado_celda=LADO_CELDA, con_pantalla=False,
+                 atributos_jugador=None, atributos_monstruo=None,
+                 perfilador=None, ruta_mapa=None):
+        """
+        Constructor de la partida
+        :param ancho: Ancho del mapa
+        :param alto: Alto del mapa
+        :param semilla: Semilla del mapa y de todos los sorteos
+        :param politica: Funcion (simulacion) que decide cada tick las
+        acciones del jugador o None si solo se atiende a eventos
+        :param lado_celda: Pixeles por celda del mapa
+        :param con_pantalla: Si el mapa abre ventana
+        :param atributos_jugador: Diccionario de atributos del jugador a
+        cambiar, por ejemplo {"vida": 10}
+        :param atributos_monstruo: Diccionario de atributos de cada
+        monstruo a cambiar
+        :param perfilador: Perfilador que mide cada tick o None para no
+        medir nada
+        :param ruta_mapa: Fichero de un mapa guardado con
+        fichero_mapa.guardar_mapa. Si se da se juega en ese mapa en
+        lugar de generar uno, y ancho y alto no se usan
+        """
+        self.aleatorio = random.Random(semilla)
+        self.politica = politica
+        self.renderizador = None
+        self.perfilador = None
+        self.ticks = 0
+
+        # Las entidades solo leen celdas, no hacen falta nodos por celda
+        semilla_mapa = self.aleatorio.getrandbits(64)
+        if ruta_mapa is not None:
+            self.mapa = cargar_mapa(ruta_mapa, lado_celda,
+                                    con_pantalla=con_pantalla)
+            (ancho, alto) = (self.mapa.ancho_mapa, self.mapa.alto_mapa)
+        else:
+            self.mapa = Mapa(ancho, alto, lado_celda, compacto=True,
+                             con_pantalla=con_pantalla)
+            self.mapa.generar_aleatorio(semilla_mapa)
+            self.mapa.generar_automata()
+        if self.mapa.regiones is None:
+            self.mapa.regiones = IndiceRegiones(self.mapa)
+        self.vision = CampoVision(self.mapa)
+        self.campo_jugador = CampoDistancias(self.mapa)
+        self.cache_caminos = CacheCaminos(self.mapa)
+
+        self.entidades = IndiceEntidades(self.mapa.offset_vecinos)
+        self.jugador = Jugador((0, 0), self)
+        for atributo, valor in (atributos_jugador or {}).items():
+            setattr(self.jugador, atributo, valor)
+        # Los monstruos salen en las esquinas si estan en la region del
+        # jugador y si no en otra celda cualquiera de esa region
+        regiones = self.mapa.regiones
+        region_jugador = regiones.region(self.jugador.posicion)
+        if region_jugador == SIN_REGION and regiones.tamanos:
+            # Si la esquina es muro el jugador sale en la region mayor
+            region_jugador = max(regiones.tamanos,
+                                 key=regiones.tamanos.get)
+            self.jugador.posicion = regiones.celda_aleatoria(
+                region_jugador, self.aleatorio)
+        self.entidades.agregar(self.jugador)
+        self.monstruos = []
+        for esquina in [(0, alto-1), (ancho-1, alto-1), (ancho-1, 0)]:
+            if regiones.region(esquina) != region_jugador:
+                esquina = regiones.celda_aleatoria(region_jugador,
+                                                   self.aleatorio)
+            monstruo = Monstruo(esquina, self)
+            for atributo, valor in (atributos_monstruo or {}).items():
+                setattr(monstruo, atributo, valor)
+            # Dos entidades no pueden compartir celda
+            while not self.entidades.agregar(monstruo):
+                monstruo.posicion = regiones.celda_aleatoria(
+                    region_jugador, self.aleatorio)
+            self.monstruos.append(monstruo)
+        # Enjambres de monstruos vectorizados, ver agregar_enjambre
+        self.enjambres = []
+
+        self.asignar_perfilador(perfilador)
+
+    def agregar_enjambre(self, enjambre):
+        """
+        Meter un enjambre en la partida: se actualiza cada tick despues
+        de los monstruos, recibe los golpes del jugador, cuenta para el
+        final de la partida y sus celdas quedan ocupadas en el indice
+        de entidades
+        :param enjambre: EnjambreMonstruos de esta simulacion
+        :return:
+        """
+        self.enjambres.append(enjambre)
+        self.entidades.agregar_externo(enjambre)
+
+    def quitar_enjambre(self, enjambre):
+        """
+        Sacar de la partida un enjambre agregado antes
+        :param enjambre: EnjambreMonstruos a quitar
+        :return:
+        """
+        self.enjambres.remove(enjambre)
+        self.entidades.quitar_externo(enjambre)
+
+    def asignar_perfilador(self, perfilador):
+        """
+        Empezar o dejar de medir la partida. Sin perfilador los
+        monstruos y el tick no miden nada
+        :param perfilador: Perfilador nuevo o None para no medir
+        :return:
+        """
+        self.perfilador = perfilador
+        if perfilador is None:
+            return
+        # Los movimientos del juego usan el campo de distancias y la
+        # cache de caminos, no Mapa.buscar_camino
+        perfilador.vigilar("campo_calculos", self.campo_jugador, "calculos")
+        perfilador.vigilar("campo_expansiones", self.campo_jugador,
+                           "expansiones")
+        perfilador.vigilar("cache_aciertos", self.cache_caminos, "aciertos")
+        perfilador.vigilar("cache_fallos", self.cache_caminos, "fallos")
+        perfilador.vigilar("expansiones_lpa", self.cache_caminos,
+                           "expansiones")
+        perfilador.vigilar("longitud_caminos_lpa", self.cache_caminos,
+                           "longitud_caminos")
+
+    def terminada(self):
+        """
+        Comprobar si la partida ha acabado
+        :return: Booleano si el jugador o todos los monstruos han muerto
+        """
+        return self.jugador.vida <= 0 or (
+            all(monstruo.estado == Estado.MUERTO
+                for monstruo in self.monstruos)
+            and not any(enjambre.vivos().any()
+                        for enjambre in self.enjambres))
+
+    def medir(self, nombre, funcion, *args):
+        """
+        Llamar a una funcion midiendola si hay perfilador
+        :param nombre: Nombre de la medida
+        :param funcion: Funcion a llamar
+        :param args: Argumentos de la funcion
+        :return: Lo que devuelva la funcion
+        """
+        if self.perfilador is None:
+            return funcion(*args)
+        return self.perfilador.medir(nombre, funcion, *args)
+
+    def actualizar_monstruos(self):
+        """
+        Actualizar todos los monstruos y enjambres
+        :return:
+        """
+        for monstruo in self.monstruos:
+            monstruo.actualizar()
+        for enjambre in self.enjambres:
+            enjambre.actualizar()
+
+    def tick(self, eventos=()):
+        """
+        Avanzar un tick la partida
+        :param eventos: Interacciones del usuario en este tick
+        :return:
+        """
+        if self.perfilador is not None:
+            self.perfilador.empezar_tick()
+        # Se actualiza las acciones del jugador en caso de estar vivo
+        if(self.jugador.vida > 0):
+            if self.politica is not None:
+                self.medir("politica", self.politica, self)
+            self.medir("jugador", self.jugador.actualizar, eventos)
+
+        # Se actualizan los estados de los monstruos vivos
+        self.medir("monstruos", self.actualizar_monstruos)
+        self.ticks += 1
+        if self.perfilador is not None:
+            self.perfilador.terminar_tick(self.ticks)
+
+    def ejecutar(self, max_ticks):
+        """
+        Simular sin pantalla hasta que acabe la partida o se llegue a
+        max_ticks
+        :param max_ticks: Numero maximo de ticks
+        :return: Diccionario con el resultado de la partida
+        """
+        while self.ticks < max_ticks and not self.terminada():
+            self.tick()
+        return self.resultado()
+
+    def resultado(self):
+        """
+        Resumen del estado de la partida
+        :return: Diccionario con ticks, vida del jugador y monstruos
+        muertos, los de los enjambres incluidos
+        """
+        total = len(self.monstruos) + sum(enjambre.numero
+                                          for enjambre in self.enjambres)
+        muertos = sum(monstruo.estado == Estado.MUERTO
+                      for monstruo in self.monstruos)
+        muertos += sum(int(enjambre.numero - enjambre.vivos().sum())
+                       for enjambre in self.enjambres)
+        return {
+            "ticks": self.ticks,
+            "vida_jugador": self.jugador.vida,
+            "monstruos": total,
+            "monstruos_muertos": muertos,
+            "gana_jugador": muertos == total
+                            and self.jugador.vida > 0,
+        }
 
 
 if __name__ == "__main__":
     pygame.init()
 
-    mapa = Mapa(ANCHO_MAPA, ALTO_MAPA, LADO_CELDA)
-    mapa.generar_aleatorio()
-    mapa.generar_automata()
-
-    jugador = Jugador((0, 0))
-    monstruos = [
-        Monstruo((0, ANCHO_MAPA-1)),
-        Monstruo((ALTO_MAPA-1, ANCHO_MAPA-1)),
-        Monstruo((ALTO_MAPA-1, 0))
-        ]
-
-    # Bucle infinito que simula el juego
-    while True:
-        # Se pinta le mapa
-        mapa.mostrar_mapa()
-        # Se recogen los eventos
-        events = pygame.event.get()
-        for event in events:
+    usar_vista = ANCHO_MAPA > ANCHO_VISTA or ALTO_MAPA > ALTO_VISTA
+    # F3 muestra los tiempos del ultimo tick; con un argumento ademas se
+    # vuelca cada tick en ese fichero en lineas JSON. Sin superposicion
+    # ni volcado no se mide nada
+    volcado = sys.argv[1] if len(sys.argv) > 1 else None
+    # Los mapas mayores que la vista no abren una ventana de su tamaño
+    simulacion = Simulacion(ANCHO_MAPA, ALTO_MAPA,
+                            con_pantalla=not usar_vista,
+                            perfilador=Perfilador(volcado)
+                            if volcado is not None else None)
+    mapa = simulacion.mapa
+    jugador = simulacion.jugador
+    monstruos = simulacion.monstruos
+    if usar_vista:
+        renderizador = RenderizadorVista(mapa, ANCHO_VISTA, ALTO_VISTA)
+    else:
+        renderizador = Renderizador(mapa)
+    simulacion.renderizador = renderizador
+
+    # Posiciones al empezar el ultimo tick, para interpolar el pintado
+    anteriores = {}
+    eventos = []
+
+    def recoger_eventos():
+        """
+        Recoger los eventos del fotograma; se atienden en el primer tick
+        :return:
+        """
+        eventos.extend(pygame.event.get())
+        for event in eventos:
             if event.type == QUIT:
+                if simulacion.perfilador is not None:
+                    simulacion.perfilador.cerrar()
                 pygame.display.quit()
                 pygame.quit()
                 sys.exit()
+            if event.type == KEYDOWN and event.key == K_F3:
+                perfilador = simulacion.perfilador
+                if perfilador is None:
+                    perfilador = Perfilador()
+                    simulacion.asignar_perfilador(perfilador)
+                if not perfilador.alternar():
+                    # Se repinta lo que tapaba la superposicion
+                    renderizador.invalidar()
+                    if perfilador.fichero is None:
+                        simulacion.asignar_perfilador(None)
+
+    def simular():
+        """
+        Avanzar un tick la simulacion
+        :return:
+        """
+        anteriores[jugador] = jugador.posicion
+        for monstruo in monstruos:
+            anteriores[monstruo] = monstruo.posicion
+        simulacion.tick(eventos)
+        eventos.clear()
 
-        # Se actualiza las acciones del jugador en caso de estar vivo
-        if(jugador.vida > 0):
-            jugador.actualizar(events)
-            mapa.mostrar_celda(jugador.posicion, color_mapa.ROJO)
-        else:
-            mapa.mostrar_celda(jugador.posicion, color_mapa.VERDE)
-
-        # Se actualizan los estados de los monstruos vivos
+    def pintar(alfa):
+        """
+        Pintar un fotograma interpolando las entidades entre el tick
+        anterior y el actual
+        :param alfa: Fraccion del tick transcurrida
+        :return:
+        """
+        color = color_mapa.ROJO if jugador.vida > 0 else color_mapa.VERDE
+        entidades = [(interpolar(anteriores.get(jugador, jugador.posicion),
+                                 jugador.posicion, alfa), color)]
         for monstruo in monstruos:
-            monstruo.actualizar()
             color = color_mapa.AZUL
             if(monstruo.estado == Estado.MUERTO):
                 color = color_mapa.MORADO
-            mapa.mostrar_celda(monstruo.posicion, color)
-
-        pygame.display.update()
-        pygame.time.wait(100)
\ No newline at end of file
+            entidades.append((interpolar(
+                anteriores.get(monstruo, monstruo.posicion),
+                monstruo.posicion, alfa), color))
+
+        # Solo se repintan las zonas por donde se mueven las entidades
+        perfilador = simulacion.perfilador
+        if perfilador is None:
+            renderizador.dibujar(entidades, jugador.posicion)
+            return
+        perfilador.medir("pintado", renderizador.dibujar, entidades,
+                         jugador.posicion)
+        rect = perfilador.dibujar(renderizador.pantalla)
+        if rect is not None:
+            pygame.display.update(rect)
+
+    # La simulacion va a ritmo fijo independiente de los fotogramas
+    bucle = BucleJuego(simular, pintar, recoger_eventos,
+                       ticks_por_segundo=TICKS_POR_SEGUNDO)
+    bucle.ejecutar()
@@ -0,0 +1,129 @@
+import os
+from multiprocessing import Pool
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+from mapa import MURO, VACIO, GENERACIONES
+
+# Generaciones que avanza cada franja por su cuenta entre dos
+# intercambios de bordes. Cada franja lleva HALO filas de mas de cada
+# vecina, que se recalculan en las dos
+HALO = 2
+
+# Memoria compartida abierta en cada proceso del pool:
+# nombre del bloque -> (bloque, vista (ancho, alto))
+memoria_proceso = {}
+
+
+def abrir_bloques(nombres, ancho, alto):
+    """
+    Inicializador de cada proceso: abrir los bloques compartidos una
+    sola vez en lugar de en cada tarea
+    :param nombres: Nombres de los bloques de memoria compartida
+    :param ancho: Ancho del mapa
+    :param alto: Alto del mapa
+    :return:
+    """
+    for nombre in nombres:
+        bloque = SharedMemory(name=nombre)
+        memoria_proceso[nombre] = (bloque, np.ndarray(
+            (ancho, alto), dtype=np.uint8, buffer=bloque.buf))
+
+
+def paso_franja(franja):
+    """
+    Aplicar una generacion del automata a una franja de filas con la
+    misma regla que Mapa.paso_automata. Solo cambian las celdas con sus
+    ocho vecinos en la franja; la primera y la ultima fila y columna
+    se quedan igual
+    :param franja: Array (filas, alto) de estados, se cambia en el sitio
+    :return:
+    """
+    muros = (franja == MURO).view(np.uint8)
+    num_muros = (muros[:-2, :-2] + muros[:-2, 1:-1] + muros[:-2, 2:]
+                 + muros[1:-1, :-2] + muros[1:-1, 2:]
+                 + muros[2:, :-2] + muros[2:, 1:-1] + muros[2:, 2:])
+    interior = franja[1:-1, 1:-1]
+    interior[num_muros > 4] = MURO
+    interior[num_muros < 4] = VACIO
+
+
+def generar_franja(tarea):
+    """
+    Avanzar varias generaciones las filas [inicio, final) leyendo el
+    bloque origen con los bordes de las vecinas y escribiendo el
+    resultado en el bloque destino
+    :param tarea: Tupla (origen, destino, inicio, final, generaciones)
+    :return:
+    """
+    (origen, destino, inicio, final, generaciones) = tarea
+    fuente = memoria_proceso[origen][1]
+    ancho = fuente.shape[0]
+    # Cada generacion solo estropea una fila mas desde el corte, asi que
+    # con tantas filas de borde como generaciones las propias son
+    # exactas. Las filas 0 y ancho - 1 son el borde del mapa y nunca
+    # cambian, igual que en Mapa.paso_automata
+    desde = max(inicio - generaciones, 0)
+    hasta = min(final + generaciones, ancho)
+    franja = fuente[desde:hasta].copy()
+    for _ in range(generaciones):
+        paso_franja(franja)
+    memoria_proceso[destino][1][inicio:final] = \
+        franja[inicio - desde:final - desde]
+
+
+def generar_automata_paralelo(mapa, generaciones=None, procesos=None,
+                              halo=HALO):
+    """
+    Aplicar el automata al mapa repartiendo franjas de filas entre
+    procesos. La rejilla se copia a dos bloques de memoria compartida
+    que se alternan como origen y destino, asi que a los procesos solo
+    se les envian los limites de su franja. Tras cada tanda de halo
+    generaciones los procesos leen las filas nuevas de sus vecinas. El
+    resultado es el mismo que el de Mapa.generar_automata
+    :param mapa: Mapa a generar
+    :param generaciones: Numero de generaciones, por defecto GENERACIONES
+    :param procesos: Numero de procesos, por defecto uno por nucleo
+    :param halo: Generaciones entre intercambios de bordes
+    :return:
+    """
+    if generaciones is None:
+        generaciones = GENERACIONES
+    if procesos is None:
+        procesos = os.cpu_count() or 1
+    ancho = mapa.ancho_mapa
+    alto = mapa.alto_mapa
+    franjas = max(1, min(procesos, ancho // max(halo, 1)))
+    cortes = [ancho * k // franjas for k in range(franjas + 1)]
+
+    bloques = [SharedMemory(create=True, size=ancho * alto)
+               for _ in range(2)]
+    try:
+        nombres = [bloque.name for bloque in bloques]
+        np.ndarray((ancho, alto), dtype=np.uint8,
+                   buffer=bloques[0].buf)[:] = mapa.celdas
+        origen = 0
+        hechas = 0
+        with Pool(procesos, initializer=abrir_bloques,
+                  initargs=(nombres, ancho, alto)) as pool:
+            while hechas < generaciones:
+                tanda = min(halo, generaciones - hechas)
+                pool.map(generar_franja, [
+                    (nombres[origen], nombres[1 - origen], cortes[k],
+                     cortes[k + 1], tanda)
+                    for k in range(franjas)])
+                origen = 1 - origen
+                hechas += tanda
+        mapa.celdas[:] = np.ndarray((ancho, alto), dtype=np.uint8,
+                                    buffer=bloques[origen].buf)
+    finally:
+        for bloque in bloques:
+            bloque.close()
+            bloque.unlink()
+
+    mapa.version += 1
+    mapa.calcular_mascaras()
+    mapa.ultima_generacion = generaciones - 1
+    for observador in mapa.observadores:
+        observador(mapa, generaciones - 1)
@@ -0,0 +1,897 @@
+import json
+import os
+import platform
+import random
+import sys
+import time
+import tracemalloc
+
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import numpy as np
+import pygame
+
+import mapa as modulo_mapa
+from mapa import Mapa, MURO, VACIO, PORCENTAJE_MURO, A_ESTRELLA, JPS, \
+    JERARQUICO
+from jerarquico import BuscadorJerarquico
+from regiones import IndiceRegiones
+from vision import CampoVision
+from campo_distancias import CampoDistancias
+from cache_caminos import CacheCaminos
+from Juego import Simulacion, Monstruo
+from enjambre import EnjambreMonstruos
+from automata_paralelo import generar_automata_paralelo
+
+LADO_CELDA = 10
+TAMANOS = [30, 50, 70]
+SEMILLAS = [1, 2, 3]
+CONSULTAS = 10
+TAMANOS_CONSTRUCCION = [100, 1000]
+TAMANOS_GENERACION = [100, 300, 500]
+TAMANOS_JERARQUICO = [100, 300, 500]
+TAMANOS_JPS = [50, 100, 300]
+TAMANO_ENJAMBRE = 300
+NUMEROS_ENJAMBRE = [1000, 10000]
+TICKS_ENJAMBRE = 20
+MONSTRUOS_MEMORIA = 10000
+TAMANOS_PARALELO = [1000, 3000]
+
+# Suite de escenarios: cada combinacion de tamaño, porcentaje de muros
+# y generaciones del automata, con la misma semilla
+TAMANOS_SUITE = [100, 300]
+PORCENTAJES_MURO = [45, 50, 55]
+GENERACIONES = [5, 10]
+SEMILLA = 1
+CONSULTAS_CAMINO = 20
+CONSULTAS_VISION = 2000
+DISTANCIA_VISION = 20
+# Objetivos distintos para los que se recalcula el campo de distancias
+OBJETIVOS_CAMPO = 10
+REPETICIONES_GENERACION = 3
+REPETICIONES_PINTADO = 2
+# Consultas repetidas bajo tracemalloc para medir el pico de memoria
+CONSULTAS_MEMORIA = 3
+# Empeoramiento relativo a partir del cual se avisa al comparar
+TOLERANCIA = 0.10
+
+
+def buscar_camino_lista(mapa, origen, destino):
+    """
+    Implementacion original de A Estrella con listas ordenadas, usada
+    como referencia para comparar tiempos
+    :param mapa: Mapa sobre el que buscar
+    :param origen: Celda origen
+    :param destino: Celda destino
+    :return: Lista de nodos del camino o None si no hay camino
+    """
+    origen = mapa.mapa[origen]
+    destino = mapa.mapa[destino]
+
+    ListaCerrada = list()
+    ListaAbierta = list()
+
+    for w in range(0, mapa.ancho_mapa):
+        for h in range(0, mapa.alto_mapa):
+            mapa.mapa[(w, h)].nodo_padre = None
+            mapa.mapa[(w, h)].F = 0
+            mapa.mapa[(w, h)].G = 0
+            mapa.mapa[(w, h)].H = 0
+
+    ListaAbierta.append(origen)
+
+    while ListaAbierta:
+        ListaAbierta = sorted(ListaAbierta, key=lambda nodo: nodo.F)
+        actual = ListaAbierta.pop(0)
+        ListaCerrada.append(actual)
+        if actual == destino:
+            camino = []
+            while actual != origen:
+                camino.append(actual)
+                actual = actual.nodo_padre
+            return camino[::-1]
+        for vecino in mapa.vecinos((actual.i, actual.j)):
+            if vecino.estado_celda == MURO or vecino in ListaCerrada:
+                continue
+            if vecino in ListaAbierta:
+                nuevaG = mapa.calcular_sucesor(actual, vecino)
+                if vecino.G > nuevaG:
+                    vecino.G = nuevaG
+                    vecino.nodo_padre = actual
+            else:
+                vecino.G = mapa.calcular_sucesor(actual, vecino)
+                vecino.H = mapa.calcular_sucesor(vecino, destino)
+                vecino.F = vecino.G + vecino.H
+                vecino.nodo_padre = actual
+                ListaAbierta.append(vecino)
+    return None
+
+
+def generar_aleatorio_bucle(mapa):
+    """
+    Implementacion original del relleno aleatorio celda a celda
+    :param mapa: Mapa a rellenar
+    :return:
+    """
+    for i in range(1, mapa.ancho_mapa-1):
+        for j in range(1, mapa.alto_mapa-1):
+            if random.randint(0, 100) < PORCENTAJE_MURO:
+                mapa.celdas_planas[i * mapa.alto_mapa + j] = MURO
+    # Cambio masivo de la rejilla: los indices del mapa se rehacen
+    mapa.version += 1
+
+
+def paso_automata_bucle(mapa):
+    """
+    Implementacion original de una generacion del automata celda a
+    celda sobre una copia del mapa
+    :param mapa: Mapa a modificar
+    :return:
+    """
+    alto = mapa.alto_mapa
+    copia = bytes(mapa.celdas_planas)
+    for w in range(1, mapa.ancho_mapa-1):
+        for h in range(1, alto-1):
+            vecinos = [copia[(w + i) * alto + h + j]
+                       for i, j in mapa.offset_vecinos]
+            num_muros = vecinos.count(MURO)
+            num_vacios = vecinos.count(VACIO)
+            celda = w * alto + h
+            if not num_vacios:
+                mapa.celdas_planas[celda] = MURO
+            elif not num_muros:
+                mapa.celdas_planas[celda] = VACIO
+            elif num_vacios > num_muros:
+                mapa.celdas_planas[celda] = VACIO
+            elif num_vacios < num_muros:
+                mapa.celdas_planas[celda] = MURO
+
+
+def medir_generacion(tamano, semilla):
+    """
+    Comparar la generacion original y la vectorizada sobre el mismo
+    relleno inicial
+    :param tamano: Ancho y alto del mapa
+    :param semilla: Semilla del relleno
+    :return: Tupla (segundos original, segundos vectorizado, iguales)
+    """
+    original = Mapa(tamano, tamano, 1, compacto=True, con_pantalla=False)
+    vectorizado = Mapa(tamano, tamano, 1, compacto=True, con_pantalla=False)
+
+    random.seed(semilla)
+    inicio = time.perf_counter()
+    generar_aleatorio_bucle(original)
+    for _ in range(modulo_mapa.GENERACIONES):
+        paso_automata_bucle(original)
+    t_original = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    vectorizado.generar_aleatorio(semilla)
+    t_aleatorio = time.perf_counter() - inicio
+
+    # El automata se compara partiendo del mismo relleno inicial
+    vectorizado.celdas[:] = VACIO
+    random.seed(semilla)
+    generar_aleatorio_bucle(vectorizado)
+    inicio = time.perf_counter()
+    for _ in range(modulo_mapa.GENERACIONES):
+        vectorizado.paso_automata()
+    t_vectorizado = t_aleatorio + time.perf_counter() - inicio
+
+    return (t_original, t_vectorizado,
+            original.celdas_planas == vectorizado.celdas_planas)
+
+
+def medir_automata_paralelo(tamano, semilla, procesos):
+    """
+    Comparar el automata secuencial con el repartido en franjas entre
+    procesos, partiendo del mismo relleno
+    :param tamano: Ancho y alto del mapa
+    :param semilla: Semilla del relleno
+    :param procesos: Numero de procesos
+    :return: Tupla (segundos secuencial, segundos paralelo, iguales)
+    """
+    secuencial = Mapa(tamano, tamano, 1, compacto=True, con_pantalla=False)
+    paralelo = Mapa(tamano, tamano, 1, compacto=True, con_pantalla=False)
+    secuencial.generar_aleatorio(semilla)
+    paralelo.generar_aleatorio(semilla)
+
+    inicio = time.perf_counter()
+    secuencial.generar_automata()
+    t_secuencial = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    generar_automata_paralelo(paralelo, procesos=procesos)
+    t_paralelo = time.perf_counter() - inicio
+
+    return (t_secuencial, t_paralelo,
+            secuencial.celdas_planas == paralelo.celdas_planas)
+
+
+def coste_camino(origen, camino):
+    """
+    Coste de un camino con el coste de paso de A Estrella
+    :param origen: Celda origen
+    :param camino: Lista de nodos del camino
+    :return: Coste total
+    """
+    coste = 0
+    for nodo in camino:
+        coste += abs(nodo.i - origen[0]) + abs(nodo.j - origen[1])
+        origen = (nodo.i, nodo.j)
+    return coste
+
+
+def medir_jerarquico(tamano, semilla):
+    """
+    Comparar A Estrella con la busqueda jerarquica en consultas de un
+    extremo a otro del mapa
+    :param tamano: Ancho y alto del mapa
+    :param semilla: Semilla del mapa y de las consultas
+    :return: Tupla (segundos preproceso, segundos A Estrella, segundos
+    jerarquico, sobrecoste medio del camino jerarquico)
+    """
+    mapa = generar_mapa(tamano, semilla, compacto=True, lado_celda=1)
+    consultas = generar_consultas(mapa, CONSULTAS, semilla)
+    # Se fuerzan consultas entre esquinas opuestas del mapa
+    consultas = [((o[0] % 10, o[1] % 10),
+                  (tamano - 1 - d[0] % 10, tamano - 1 - d[1] % 10))
+                 for o, d in consultas
+                 if mapa[(o[0] % 10, o[1] % 10)] != MURO
+                 and mapa[(tamano - 1 - d[0] % 10,
+                           tamano - 1 - d[1] % 10)] != MURO]
+    mapa.jerarquico = BuscadorJerarquico(mapa)
+    inicio = time.perf_counter()
+    mapa.jerarquico.preprocesar()
+    t_preproceso = time.perf_counter() - inicio
+
+    sobrecostes = []
+    t_estrella = t_jerarquico = 0
+    for origen, destino in consultas:
+        inicio = time.perf_counter()
+        exacto = mapa.buscar_camino(origen, destino)
+        t_estrella += time.perf_counter() - inicio
+        inicio = time.perf_counter()
+        aproximado = mapa.buscar_camino(origen, destino, JERARQUICO)
+        t_jerarquico += time.perf_counter() - inicio
+        if exacto and aproximado:
+            sobrecostes.append(coste_camino(origen, aproximado)
+                               / coste_camino(origen, exacto))
+    media = sum(sobrecostes) / len(sobrecostes) if sobrecostes else 1.0
+    return t_preproceso, t_estrella, t_jerarquico, media
+
+
+def medir_algoritmo(mapa, consultas, algoritmo):
+    """
+    Medir tiempo y nodos expandidos de un algoritmo de busqueda
+    :param mapa: Mapa de las consultas
+    :param consultas: Lista de pares (origen, destino)
+    :param algoritmo: A_ESTRELLA o JPS
+    :return: Tupla (segundos, nodos expandidos)
+    """
+    expansiones = 0
+    inicio = time.perf_counter()
+    for origen, destino in consultas:
+        mapa.buscar_camino(origen, destino, algoritmo)
+        expansiones += mapa.expansiones
+    return time.perf_counter() - inicio, expansiones
+
+
+def medir_enjambre(numero, semilla):
+    """
+    Comparar el tiempo por tick de muchos monstruos como objetos y como
+    enjambre vectorizado, con el jugador quieto
+    :param numero: Numero de monstruos
+    :param semilla: Semilla de la partida y de las posiciones
+    :return: Tupla (ms por tick con objetos, ms por tick con enjambre)
+    """
+    simulacion = Simulacion(TAMANO_ENJAMBRE, TAMANO_ENJAMBRE,
+                            semilla=semilla)
+    generador = random.Random(semilla)
+    libres = [(x, y) for x in range(TAMANO_ENJAMBRE)
+              for y in range(TAMANO_ENJAMBRE)
+              if simulacion.mapa[(x, y)] == VACIO
+              and simulacion.entidades.ocupante((x, y)) is None]
+    posiciones = generador.sample(libres, numero)
+
+    monstruos = []
+    for posicion in posiciones:
+        monstruo = Monstruo(posicion, simulacion)
+        simulacion.entidades.agregar(monstruo)
+        monstruos.append(monstruo)
+    # El primer tick calcula el campo de distancias, no se mide
+    for monstruo in monstruos:
+        monstruo.actualizar()
+    inicio = time.perf_counter()
+    for _ in range(TICKS_ENJAMBRE):
+        for monstruo in monstruos:
+            monstruo.actualizar()
+    t_objetos = (time.perf_counter() - inicio) / TICKS_ENJAMBRE
+
+    for monstruo in monstruos:
+        simulacion.entidades.quitar(monstruo)
+    enjambre = EnjambreMonstruos(simulacion, posiciones, semilla)
+    enjambre.actualizar()
+    inicio = time.perf_counter()
+    for _ in range(TICKS_ENJAMBRE):
+        enjambre.actualizar()
+    t_enjambre = (time.perf_counter() - inicio) / TICKS_ENJAMBRE
+    return t_objetos * 1000, t_enjambre * 1000
+
+
+def medir_memoria_monstruos(numero):
+    """
+    Medir la memoria de muchos monstruos como objetos y como enjambre
+    :param numero: Numero de monstruos
+    :return: Tupla (bytes por monstruo objeto, bytes por monstruo del
+    enjambre, incluida su rejilla de ocupacion)
+    """
+    simulacion = Simulacion(TAMANO_ENJAMBRE, TAMANO_ENJAMBRE, semilla=1)
+    # Las celdas del jugador y de los monstruos de la partida no se usan
+    libres = (divmod(i, TAMANO_ENJAMBRE)
+              for i in range(TAMANO_ENJAMBRE * TAMANO_ENJAMBRE))
+    posiciones = [celda for celda in libres
+                  if simulacion.entidades.ocupante(celda) is None][:numero]
+    tracemalloc.start()
+    monstruos = [Monstruo(posicion, simulacion) for posicion in posiciones]
+    memoria_objetos = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del monstruos
+    # El primer enjambre importa modulos de NumPy, no se mide
+    simulacion.quitar_enjambre(
+        EnjambreMonstruos(simulacion, posiciones[:1]))
+    tracemalloc.start()
+    enjambre = EnjambreMonstruos(simulacion, posiciones)
+    memoria_enjambre = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del enjambre
+    return memoria_objetos / numero, memoria_enjambre / numero
+
+
+def generar_mapa(tamano, semilla, porcentaje=None, generaciones=None,
+                 compacto=False, lado_celda=LADO_CELDA):
+    """
+    Generar sin pantalla un mapa reproducible a partir de una semilla
+    :param tamano: Ancho y alto del mapa
+    :param semilla: Semilla del relleno
+    :param porcentaje: Porcentaje de muros, por defecto PORCENTAJE_MURO
+    :param generaciones: Generaciones del automata, por defecto las del
+    mapa
+    :param compacto: Si se usa el modo compacto del mapa
+    :param lado_celda: Pixeles por celda
+    :return: Mapa generado
+    """
+    mapa = Mapa(tamano, tamano, lado_celda, compacto=compacto,
+                con_pantalla=False)
+    mapa.generar_aleatorio(semilla, porcentaje)
+    mapa.generar_automata(generaciones)
+    return mapa
+
+
+def generar_consultas(mapa, numero, semilla, misma_region=False):
+    """
+    Generar pares origen/destino sobre celdas vacias
+    :param mapa: Mapa de las consultas
+    :param numero: Numero de consultas
+    :param semilla: Semilla del generador aleatorio
+    :param misma_region: Si es cierto solo se sortean celdas de la
+    region mas grande, para que todas las consultas tengan camino
+    :return: Lista de pares (origen, destino)
+    """
+    rnd = random.Random(semilla)
+    vacias = [(int(x), int(y)) for x, y in np.argwhere(mapa.celdas != MURO)]
+    if misma_region:
+        regiones = IndiceRegiones(mapa)
+        if not regiones.tamanos:
+            return []
+        mayor = max(regiones.tamanos, key=regiones.tamanos.get)
+        vacias = [celda for celda in vacias
+                  if regiones.region(celda) == mayor]
+    return [(rnd.choice(vacias), rnd.choice(vacias))
+            for _ in range(numero)]
+
+
+def generar_consultas_vision(mapa, numero, semilla):
+    """
+    Generar pares de celdas cercanas desde celdas vacias, como las que
+    mira un monstruo
+    :param mapa: Mapa de las consultas
+    :param numero: Numero de consultas
+    :param semilla: Semilla del generador aleatorio
+    :return: Lista de pares (origen, destino)
+    """
+    rnd = random.Random(semilla)
+    libres = np.argwhere(mapa.celdas != MURO)
+    consultas = []
+    while libres.size and len(consultas) < numero:
+        (x, y) = libres[rnd.randrange(len(libres))]
+        destino = (
+            min(max(int(x) + rnd.randint(-DISTANCIA_VISION,
+                                         DISTANCIA_VISION), 0),
+                mapa.ancho_mapa - 1),
+            min(max(int(y) + rnd.randint(-DISTANCIA_VISION,
+                                         DISTANCIA_VISION), 0),
+                mapa.alto_mapa - 1))
+        consultas.append(((int(x), int(y)), destino))
+    return consultas
+
+
+def medir(funcion, consultas):
+    """
+    Medir por separado cada consulta
+    :param funcion: Funcion de la consulta (origen, destino)
+    :param consultas: Lista de pares (origen, destino)
+    :return: Tupla (lista de segundos de cada consulta, lista de
+    resultados)
+    """
+    latencias = []
+    resultados = []
+    for origen, destino in consultas:
+        inicio = time.perf_counter()
+        resultados.append(funcion(origen, destino))
+        latencias.append(time.perf_counter() - inicio)
+    return latencias, resultados
+
+
+def medir_construccion(tamano, compacto):
+    """
+    Medir tiempo y memoria de construir un mapa vacio
+    :param tamano: Ancho y alto del mapa
+    :param compacto: Si se usa el modo compacto del mapa
+    :return: Tupla (segundos, bytes reservados)
+    """
+    tracemalloc.start()
+    inicio = time.perf_counter()
+    mapa = Mapa(tamano, tamano, 1, compacto=compacto, con_pantalla=False)
+    segundos = time.perf_counter() - inicio
+    memoria = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del mapa
+    return segundos, memoria
+
+
+def percentil(latencias, porcentaje):
+    """
+    Percentil de una lista de latencias
+    :param latencias: Lista de segundos
+    :param porcentaje: Percentil entre 0 y 100
+    :return: Milisegundos
+    """
+    return float(np.percentile(latencias, porcentaje)) * 1000
+
+
+def pico_memoria(funcion):
+    """
+    Pico de memoria reservada mientras se ejecuta una funcion
+    :param funcion: Funcion sin argumentos
+    :return: Bytes
+    """
+    tracemalloc.start()
+    try:
+        funcion()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def resumen(latencias, memoria, expansiones=None):
+    """
+    Metricas de una prueba a partir de las latencias de cada consulta
+    :param latencias: Lista de segundos por consulta
+    :param memoria: Pico de memoria en bytes
+    :param expansiones: Lista de nodos expandidos por consulta o None
+    :return: Diccionario de metricas
+    """
+    total = sum(latencias)
+    metricas = {
+        "consultas": len(latencias),
+        "segundos": total,
+        "por_segundo": len(latencias) / total if total else 0.0,
+        "p50_ms": percentil(latencias, 50),
+        "p99_ms": percentil(latencias, 99),
+        "memoria_pico": memoria,
+    }
+    if expansiones is not None:
+        metricas["expansiones_medias"] = (sum(expansiones)
+                                          / max(len(expansiones), 1))
+    return metricas
+
+
+def probar_generacion(tamano, porcentaje, generaciones, semilla):
+    """
+    Medir la generacion completa de un mapa
+    :return: Diccionario de metricas
+    """
+    def generar():
+        generar_mapa(tamano, semilla, porcentaje, generaciones,
+                     compacto=True, lado_celda=1)
+    latencias = []
+    for _ in range(REPETICIONES_GENERACION):
+        inicio = time.perf_counter()
+        generar()
+        latencias.append(time.perf_counter() - inicio)
+    return resumen(latencias, pico_memoria(generar))
+
+
+def probar_caminos(mapa, consultas, algoritmo):
+    """
+    Medir un lote de busquedas de camino con Mapa.buscar_camino
+    :param mapa: Mapa generado
+    :param consultas: Lista de pares (origen, destino)
+    :param algoritmo: A_ESTRELLA o JPS
+    :return: Diccionario de metricas
+    """
+    expansiones = []
+
+    def buscar(origen, destino):
+        camino = mapa.buscar_camino(origen, destino, algoritmo)
+        expansiones.append(mapa.expansiones)
+        return camino
+    latencias, _ = medir(buscar, consultas)
+    memoria = pico_memoria(lambda: medir(buscar,
+                                         consultas[:CONSULTAS_MEMORIA]))
+    return resumen(latencias, memoria, expansiones[:len(latencias)])
+
+
+def probar_cache_caminos(mapa, consultas):
+    """
+    Medir la cache de caminos del juego como la usa el jugador: el
+    mismo destino desde un origen que va cambiando, de modo que el
+    planificador D* Lite del destino se reutiliza
+    :param mapa: Mapa generado
+    :param consultas: Lista de pares (origen, destino)
+    :return: Diccionario de metricas
+    """
+    destino = consultas[0][1]
+    destinos = [(origen, destino) for origen, _ in consultas]
+    expansiones = []
+
+    def buscar(cache, origen, destino):
+        antes = cache.expansiones
+        camino = cache.buscar_camino(origen, destino)
+        expansiones.append(cache.expansiones - antes)
+        return camino
+    cache = CacheCaminos(mapa)
+    latencias, _ = medir(
+        lambda o, d: buscar(cache, o, d), destinos)
+    otra = CacheCaminos(mapa)
+    memoria = pico_memoria(lambda: medir(
+        lambda o, d: buscar(otra, o, d), destinos[:CONSULTAS_MEMORIA]))
+    return resumen(latencias, memoria, expansiones[:len(latencias)])
+
+
+def probar_campo_distancias(mapa, consultas):
+    """
+    Medir el recalculo del campo de distancias hacia el jugador, uno
+    por cada objetivo distinto
+    :param mapa: Mapa generado
+    :param consultas: Lista de pares (origen, destino); los destinos
+    son los objetivos
+    :return: Diccionario de metricas
+    """
+    objetivos = [(None, destino)
+                 for _, destino in consultas[:OBJETIVOS_CAMPO]]
+    campo = CampoDistancias(mapa)
+    expansiones = []
+
+    def calcular(_, objetivo):
+        antes = campo.expansiones
+        campo.calcular(objetivo)
+        expansiones.append(campo.expansiones - antes)
+    latencias, _ = medir(calcular, objetivos)
+    memoria = pico_memoria(
+        lambda: medir(calcular, objetivos[:CONSULTAS_MEMORIA]))
+    return resumen(latencias, memoria, expansiones[:len(latencias)])
+
+
+def probar_pasos_campo(mapa, consultas, vision):
+    """
+    Medir los pasos que leen los monstruos del campo de distancias ya
+    calculado, desde los origenes de las consultas de vision
+    :param mapa: Mapa generado
+    :param consultas: Lista de pares (origen, destino) de camino; el
+    primer destino es el objetivo
+    :param vision: Lista de pares (origen, destino) de vision
+    :return: Diccionario de metricas
+    """
+    campo = CampoDistancias(mapa)
+    campo.calcular(consultas[0][1])
+    latencias, _ = medir(lambda origen, _: campo.siguiente_paso(origen),
+                         vision)
+    memoria = pico_memoria(lambda: medir(
+        lambda origen, _: campo.siguiente_paso(origen),
+        vision[:CONSULTAS_MEMORIA]))
+    return resumen(latencias, memoria)
+
+
+def probar_vision(mapa, consultas):
+    """
+    Medir comprobaciones de linea de vision una a una con Mapa.es_visble
+    :param mapa: Mapa generado
+    :param consultas: Lista de pares (origen, destino)
+    :return: Diccionario de metricas
+    """
+    latencias, _ = medir(mapa.es_visble, consultas)
+    memoria = pico_memoria(
+        lambda: medir(mapa.es_visble, consultas[:CONSULTAS_MEMORIA]))
+    return resumen(latencias, memoria)
+
+
+def probar_vision_lote(mapa, consultas):
+    """
+    Medir las mismas comprobaciones de vision en un solo lote
+    :param mapa: Mapa generado
+    :param consultas: Lista de pares (origen, destino)
+    :return: Diccionario de metricas; la latencia es la del lote
+    """
+    origenes = [origen for origen, _ in consultas]
+    destinos = [destino for _, destino in consultas]
+    inicio = time.perf_counter()
+    mapa.son_visibles(origenes, destinos)
+    segundos = time.perf_counter() - inicio
+    memoria = pico_memoria(lambda: mapa.son_visibles(origenes, destinos))
+    metricas = resumen([segundos], memoria)
+    metricas["consultas"] = len(consultas)
+    metricas["por_segundo"] = len(consultas) / segundos if segundos else 0.0
+    return metricas
+
+
+def probar_campo_vision(mapa, consultas):
+    """
+    Medir el campo de vision del juego con la cache vacia al empezar,
+    asi que cuentan tanto los calculos por sombras como los aciertos
+    de la cache cuando se repite un origen
+    :param mapa: Mapa generado
+    :param consultas: Lista de pares (origen, destino)
+    :return: Diccionario de metricas
+    """
+    vision = CampoVision(mapa)
+    latencias, _ = medir(
+        lambda o, d: vision.es_visible(o, d, DISTANCIA_VISION), consultas)
+    otra = CampoVision(mapa)
+    memoria = pico_memoria(lambda: medir(
+        lambda o, d: otra.es_visible(o, d, DISTANCIA_VISION),
+        consultas[:CONSULTAS_MEMORIA]))
+    return resumen(latencias, memoria)
+
+
+def probar_pintado(mapa):
+    """
+    Medir Mapa.mostrar_mapa sobre una superficie fuera de pantalla
+    :param mapa: Mapa generado
+    :return: Diccionario de metricas
+    """
+    mapa.pantalla = pygame.Surface((mapa.alto_mapa * mapa.lado_celda,
+                                    mapa.ancho_mapa * mapa.lado_celda))
+    latencias = []
+    for _ in range(REPETICIONES_PINTADO):
+        inicio = time.perf_counter()
+        mapa.mostrar_mapa()
+        latencias.append(time.perf_counter() - inicio)
+    memoria = pico_memoria(mapa.mostrar_mapa)
+    mapa.pantalla = None
+    return resumen(latencias, memoria)
+
+
+def ejecutar_escenario(tamano, porcentaje, generaciones, semilla=SEMILLA):
+    """
+    Ejecutar todas las pruebas de un escenario
+    :param tamano: Ancho y alto del mapa
+    :param porcentaje: Porcentaje de muros del relleno
+    :param generaciones: Generaciones del automata
+    :param semilla: Semilla del mapa y de las consultas
+    :return: Lista de resultados, uno por prueba
+    """
+    escenario = {"tamano": tamano, "porcentaje_muro": porcentaje,
+                 "generaciones": generaciones, "semilla": semilla}
+    mapa = generar_mapa(tamano, semilla, porcentaje, generaciones,
+                        compacto=True, lado_celda=1)
+    caminos = generar_consultas(mapa, CONSULTAS_CAMINO, semilla,
+                                misma_region=True)
+    vision = generar_consultas_vision(mapa, CONSULTAS_VISION, semilla)
+    pruebas = {
+        "generacion": lambda: probar_generacion(
+            tamano, porcentaje, generaciones, semilla),
+        "camino_a_estrella": lambda: probar_caminos(
+            mapa, caminos, A_ESTRELLA),
+        "camino_jps": lambda: probar_caminos(mapa, caminos, JPS),
+        "cache_caminos": lambda: probar_cache_caminos(mapa, caminos),
+        "campo_distancias": lambda: probar_campo_distancias(mapa, caminos),
+        "campo_pasos": lambda: probar_pasos_campo(mapa, caminos, vision),
+        "vision": lambda: probar_vision(mapa, vision),
+        "vision_lote": lambda: probar_vision_lote(mapa, vision),
+        "campo_vision": lambda: probar_campo_vision(mapa, vision),
+        "pintado": lambda: probar_pintado(mapa),
+    }
+    # Estas pruebas necesitan al menos una consulta de camino
+    con_caminos = ("camino_a_estrella", "camino_jps", "cache_caminos",
+                   "campo_distancias", "campo_pasos")
+    resultados = []
+    for nombre, prueba in pruebas.items():
+        if nombre in con_caminos and not caminos:
+            continue
+        resultado = dict(escenario, prueba=nombre)
+        resultado.update(prueba())
+        resultados.append(resultado)
+    return resultados
+
+
+def ejecutar_suite(tamanos=TAMANOS_SUITE, porcentajes=PORCENTAJES_MURO,
+                   generaciones=GENERACIONES, semilla=SEMILLA):
+    """
+    Ejecutar todos los escenarios
+    :return: Diccionario con el entorno y la lista de resultados
+    """
+    resultados = []
+    for tamano in tamanos:
+        for porcentaje in porcentajes:
+            for numero in generaciones:
+                resultados.extend(
+                    ejecutar_escenario(tamano, porcentaje, numero, semilla))
+    return {
+        "fecha": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "plataforma": platform.platform(),
+        "resultados": resultados,
+    }
+
+
+def clave(resultado):
+    """
+    Identificador de un resultado para comparar ejecuciones
+    :param resultado: Diccionario de un resultado
+    :return: Tupla (prueba, tamano, porcentaje, generaciones, semilla)
+    """
+    return (resultado["prueba"], resultado["tamano"],
+            resultado["porcentaje_muro"], resultado["generaciones"],
+            resultado["semilla"])
+
+
+def comparar(referencia, actual, tolerancia=TOLERANCIA):
+    """
+    Comparar dos ejecuciones de la suite
+    :param referencia: Resultados guardados de una ejecucion anterior
+    :param actual: Resultados de esta ejecucion
+    :param tolerancia: Empeoramiento relativo admitido
+    :return: Lista de tuplas (clave, metrica, antes, ahora) de las
+    metricas que han empeorado mas que la tolerancia
+    """
+    anteriores = {clave(r): r for r in referencia["resultados"]}
+    empeoradas = []
+    for resultado in actual["resultados"]:
+        anterior = anteriores.get(clave(resultado))
+        if anterior is None:
+            continue
+        # En todas estas metricas mas es peor
+        for metrica in ("p50_ms", "p99_ms", "memoria_pico",
+                        "expansiones_medias"):
+            if metrica not in resultado or metrica not in anterior:
+                continue
+            antes = anterior[metrica]
+            ahora = resultado[metrica]
+            if antes and (ahora - antes) / antes > tolerancia:
+                empeoradas.append((clave(resultado), metrica, antes, ahora))
+    return empeoradas
+
+
+def imprimir_suite(informe):
+    """
+    Mostrar los resultados de la suite en forma de tabla
+    :param informe: Diccionario devuelto por ejecutar_suite
+    :return:
+    """
+    print("{:18s} {:>6s} {:>4s} {:>4s} {:>10s} {:>9s} {:>9s} {:>11s} "
+          "{:>10s}".format("prueba", "tamano", "muro", "gen", "consultas/s",
+                           "p50(ms)", "p99(ms)", "expansiones",
+                           "memoria(KB)"))
+    for r in informe["resultados"]:
+        print("{:18s} {:6d} {:4d} {:4d} {:10.1f} {:9.3f} {:9.3f} {:11s} "
+              "{:10.1f}".format(
+                  r["prueba"], r["tamano"], r["porcentaje_muro"],
+                  r["generaciones"], r["por_segundo"], r["p50_ms"],
+                  r["p99_ms"],
+                  "%.1f" % r["expansiones_medias"]
+                  if "expansiones_medias" in r else "-",
+                  r["memoria_pico"] / 1024))
+
+
+def imprimir_comparativas():
+    """
+    Mostrar las tablas que comparan cada optimizacion con la version
+    a la que sustituye
+    :return:
+    """
+    print("tamano semilla  original(s)  monticulo(s)  aceleracion")
+    for tamano in TAMANOS:
+        for semilla in SEMILLAS:
+            mapa = generar_mapa(tamano, semilla)
+            consultas = generar_consultas(mapa, CONSULTAS, semilla)
+            t_original = sum(medir(
+                lambda o, d: buscar_camino_lista(mapa, o, d), consultas)[0])
+            t_nuevo = sum(medir(mapa.buscar_camino, consultas)[0])
+            print("{:6d} {:7d} {:12.4f} {:13.4f} {:11.1f}x".format(
+                tamano, semilla, t_original, t_nuevo,
+                t_original / max(t_nuevo, 1e-9)))
+
+    print()
+    print("tamano  modo      construccion(s)  memoria(MB)  bytes/celda")
+    for tamano in TAMANOS_CONSTRUCCION:
+        for compacto in (False, True):
+            segundos, memoria = medir_construccion(tamano, compacto)
+            print("{:6d}  {:8s} {:16.4f} {:12.2f} {:12.1f}".format(
+                tamano, "compacto" if compacto else "nodos",
+                segundos, memoria / 2**20, memoria / tamano**2))
+
+    print()
+    print("monstruos  objetos(bytes/monstruo)  enjambre(bytes/monstruo)")
+    por_objeto, por_enjambre = medir_memoria_monstruos(MONSTRUOS_MEMORIA)
+    print("{:9d} {:24.1f} {:25.1f}".format(
+        MONSTRUOS_MEMORIA, por_objeto, por_enjambre))
+
+    print()
+    print("tamano  original(s)  vectorizado(s)  iguales")
+    for tamano in TAMANOS_GENERACION:
+        t_original, t_vectorizado, iguales = medir_generacion(tamano, 1)
+        print("{:6d} {:12.4f} {:15.4f}  {}".format(
+            tamano, t_original, t_vectorizado, iguales))
+
+    print()
+    print("tamano  preproceso(s)  a_estrella(s)  jerarquico(s)  sobrecoste")
+    for tamano in TAMANOS_JERARQUICO:
+        t_pre, t_estrella, t_jer, media = medir_jerarquico(tamano, 1)
+        print("{:6d} {:14.4f} {:14.4f} {:14.4f} {:11.3f}".format(
+            tamano, t_pre, t_estrella, t_jer, media))
+
+    print()
+    print("tamano  a_estrella(s)  expandidos  jps(s)  expandidos")
+    for tamano in TAMANOS_JPS:
+        mapa = generar_mapa(tamano, 1)
+        consultas = generar_consultas(mapa, CONSULTAS, 1)
+        t_estrella, e_estrella = medir_algoritmo(mapa, consultas, A_ESTRELLA)
+        t_jps, e_jps = medir_algoritmo(mapa, consultas, JPS)
+        print("{:6d} {:14.4f} {:11d} {:7.4f} {:11d}".format(
+            tamano, t_estrella, e_estrella, t_jps, e_jps))
+
+    print()
+    print("monstruos  objetos(ms/tick)  enjambre(ms/tick)")
+    for numero in NUMEROS_ENJAMBRE:
+        t_objetos, t_enjambre = medir_enjambre(numero, 1)
+        print("{:9d} {:17.2f} {:18.2f}".format(numero, t_objetos, t_enjambre))
+
+    print()
+    print("tamano  procesos  secuencial(s)  paralelo(s)  iguales")
+    procesos = os.cpu_count() or 1
+    for tamano in TAMANOS_PARALELO:
+        t_secuencial, t_paralelo, iguales = medir_automata_paralelo(
+            tamano, 1, procesos)
+        print("{:6d} {:9d} {:14.4f} {:12.4f}  {}".format(
+            tamano, procesos, t_secuencial, t_paralelo, iguales))
+
+
+if __name__ == '__main__':
+    # Uso: python benchmark.py
+    #          tablas comparativas de cada optimizacion
+    #      python benchmark.py suite [salida.json] [referencia.json]
+    #          escenarios con semilla guardados en JSON y comparados con
+    #          una ejecucion anterior
+    if len(sys.argv) < 2 or sys.argv[1] != "suite":
+        imprimir_comparativas()
+        sys.exit()
+
+    salida = sys.argv[2] if len(sys.argv) > 2 else "rendimiento.json"
+    informe = ejecutar_suite()
+    imprimir_suite(informe)
+    with open(salida, "w") as fichero:
+        json.dump(informe, fichero, indent=1)
+    print("Resultados guardados en", salida)
+
+    if len(sys.argv) > 3:
+        with open(sys.argv[3]) as fichero:
+            referencia = json.load(fichero)
+        empeoradas = comparar(referencia, informe)
+        for (prueba, *escenario), metrica, antes, ahora in empeoradas:
+            print("PEOR {} {} {}: {:.3f} -> {:.3f}".format(
+                prueba, escenario, metrica, antes, ahora))
+        if empeoradas:
+            sys.exit(1)
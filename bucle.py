@@ -0,0 +1,133 @@
+import time
+
+TICKS_POR_SEGUNDO = 10
+FOTOGRAMAS_POR_SEGUNDO = 60
+# Maximo de tiempo atrasado que se recupera de una vez, para que un
+# fotograma muy lento no encadene cientos de ticks seguidos
+MAX_ATRASO = 0.25
+
+
+def interpolar(anterior, actual, alfa):
+    """
+    Posicion intermedia entre dos celdas para pintar entre ticks
+    :param anterior: Celda en el tick anterior
+    :param actual: Celda en el tick actual
+    :param alfa: Fraccion del tick transcurrida, entre 0 y 1
+    :return: Tupla de coordenadas reales
+    """
+    return (anterior[0] + (actual[0] - anterior[0]) * alfa,
+            anterior[1] + (actual[1] - anterior[1]) * alfa)
+
+
+class BucleJuego:
+    """
+    Bucle de juego con paso de simulacion fijo. La simulacion avanza a
+    ticks_por_segundo pase lo que pase con el pintado, que se hace a su
+    propio ritmo recibiendo la fraccion de tick transcurrida para
+    interpolar. Sin funcion de pintado los ticks se ejecutan seguidos
+    tan rapido como se pueda
+    """
+    def __init__(self, actualizar, dibujar=None, entrada=None,
+                 ticks_por_segundo=TICKS_POR_SEGUNDO,
+                 fotogramas_por_segundo=FOTOGRAMAS_POR_SEGUNDO,
+                 reloj=time.perf_counter):
+        """
+        Constructor del bucle
+        :param actualizar: Funcion sin argumentos que avanza un tick
+        :param dibujar: Funcion (alfa) que pinta un fotograma o None
+        :param entrada: Funcion sin argumentos llamada una vez por
+        fotograma antes de los ticks, para recoger eventos
+        :param ticks_por_segundo: Ticks de simulacion por segundo
+        :param fotogramas_por_segundo: Limite de fotogramas por segundo,
+        None para no limitar
+        :param reloj: Funcion que devuelve el tiempo en segundos
+        """
+        self.actualizar = actualizar
+        self.dibujar = dibujar
+        self.entrada = entrada
+        self.paso = 1.0 / ticks_por_segundo
+        self.fotogramas_por_segundo = fotogramas_por_segundo
+        self.reloj = reloj
+        self.activo = False
+        self.ticks = 0
+        self.fotogramas = 0
+        self.tiempo_ticks = 0.0
+        self.tiempo_fotogramas = 0.0
+        self.tiempo_total = 0.0
+
+    def detener(self):
+        """
+        Parar el bucle al terminar la iteracion actual
+        :return:
+        """
+        self.activo = False
+
+    def tick(self):
+        """
+        Ejecutar un tick midiendo su duracion
+        :return:
+        """
+        inicio = self.reloj()
+        self.actualizar()
+        self.tiempo_ticks += self.reloj() - inicio
+        self.ticks += 1
+
+    def ejecutar(self, max_ticks=None):
+        """
+        Ejecutar el bucle hasta que se detenga o se llegue a max_ticks
+        :param max_ticks: Numero maximo de ticks, None para no limitar
+        :return:
+        """
+        self.activo = True
+        comienzo = self.reloj()
+        if self.dibujar is None:
+            # Sin pantalla no hay que esperar a nadie
+            while self.activo and (max_ticks is None
+                                   or self.ticks < max_ticks):
+                if self.entrada is not None:
+                    self.entrada()
+                self.tick()
+            self.tiempo_total += self.reloj() - comienzo
+            return
+
+        anterior = comienzo
+        acumulado = 0.0
+        while self.activo and (max_ticks is None or self.ticks < max_ticks):
+            ahora = self.reloj()
+            acumulado += min(ahora - anterior, MAX_ATRASO)
+            anterior = ahora
+            if self.entrada is not None:
+                self.entrada()
+            while acumulado >= self.paso and self.activo and (
+                    max_ticks is None or self.ticks < max_ticks):
+                self.tick()
+                acumulado -= self.paso
+
+            inicio = self.reloj()
+            self.dibujar(acumulado / self.paso)
+            final = self.reloj()
+            self.tiempo_fotogramas += final - inicio
+            self.fotogramas += 1
+
+            if self.fotogramas_por_segundo:
+                espera = 1.0 / self.fotogramas_por_segundo - (final - ahora)
+                if espera > 0:
+                    time.sleep(espera)
+        self.tiempo_total += self.reloj() - comienzo
+
+    def estadisticas(self):
+        """
+        Tiempos y ritmos medidos del bucle
+        :return: Diccionario con ticks, fotogramas, duraciones medias en
+        segundos y ritmos reales por segundo
+        """
+        total = self.tiempo_total or 1e-9
+        return {
+            "ticks": self.ticks,
+            "fotogramas": self.fotogramas,
+            "tiempo_tick": self.tiempo_ticks / max(self.ticks, 1),
+            "tiempo_fotograma": (self.tiempo_fotogramas
+                                 / max(self.fotogramas, 1)),
+            "ticks_por_segundo": self.ticks / total,
+            "fotogramas_por_segundo": self.fotogramas / total,
+        }
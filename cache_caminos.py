@@ -0,0 +1,301 @@
+import heapq
+from array import array
+from collections import OrderedDict
+from mapa import MURO
+
+INFINITO = float('inf')
+MAX_CAMINOS_CACHE = 256
+MAX_PLANIFICADORES = 8
+
+
+class PlanificadorLPA:
+    """
+    Busqueda incremental D* Lite hacia un destino fijo. El arbol se
+    construye desde el destino hacia el origen, asi que se conserva
+    entre consultas aunque el origen avance: si se mueve el origen solo
+    crece el desplazamiento de las claves y si cambia un muro solo se
+    reparan las celdas afectadas, en lugar de buscar desde cero
+    """
+    def __init__(self, mapa, destino):
+        """
+        Constructor del planificador
+        :param mapa: Mapa sobre el que se busca
+        :param destino: Celda destino de todas las busquedas
+        """
+        self.mapa = mapa
+        self.alto = mapa.alto_mapa
+        self.ancho = mapa.ancho_mapa
+        self.offset_costes = [(i, j, abs(i) + abs(j))
+                              for i, j in mapa.offset_vecinos]
+        num_celdas = self.ancho * self.alto
+        # g y rhs son distancias al destino
+        self.g = array('d', [INFINITO]) * num_celdas
+        self.rhs = array('d', [INFINITO]) * num_celdas
+        self.destino = destino[0] * self.alto + destino[1]
+        self.origen = self.destino
+        # Desplazamiento acumulado de las claves por los movimientos
+        # del origen, para no reordenar la cola en cada paso
+        self.km = 0
+        self.version = mapa.version
+        # Cola con borrado perezoso: claves guarda la clave vigente de
+        # cada celda en la cola
+        self.cola = []
+        self.claves = {}
+        self.orden = 0
+        # Celdas expandidas en el ultimo calculo
+        self.expansiones = 0
+        self.rhs[self.destino] = 0
+        self.encolar(self.destino)
+
+    def heuristica(self, indice):
+        """
+        Distancia Manhattan de una celda al origen
+        :param indice: Indice de la celda
+        :return: Distancia estimada
+        """
+        (x, y) = divmod(indice, self.alto)
+        (xo, yo) = divmod(self.origen, self.alto)
+        return abs(x - xo) + abs(y - yo)
+
+    def calcular_clave(self, indice):
+        """
+        Clave de prioridad de una celda
+        :param indice: Indice de la celda
+        :return: Tupla (min(g, rhs) + h + km, min(g, rhs))
+        """
+        minimo = min(self.g[indice], self.rhs[indice])
+        return (minimo + self.heuristica(indice) + self.km, minimo)
+
+    def encolar(self, indice):
+        """
+        Meter o recolocar una celda en la cola con su clave actual
+        :param indice: Indice de la celda
+        :return:
+        """
+        clave = self.calcular_clave(indice)
+        self.claves[indice] = clave
+        self.orden += 1
+        heapq.heappush(self.cola, (clave, self.orden, indice))
+
+    def vecinos(self, indice):
+        """
+        Vecinos de una celda con el coste del paso
+        :param indice: Indice de la celda
+        :return: Generador de tuplas (indice vecino, coste)
+        """
+        (x, y) = divmod(indice, self.alto)
+        for i, j, coste in self.offset_costes:
+            xv = x + i
+            yv = y + j
+            if 0 <= xv < self.ancho and 0 <= yv < self.alto:
+                yield xv * self.alto + yv, coste
+
+    def actualizar_vertice(self, indice):
+        """
+        Recalcular rhs de una celda y meterla en la cola si queda
+        inconsistente
+        :param indice: Indice de la celda
+        :return:
+        """
+        if indice != self.destino:
+            if self.mapa.celdas_planas[indice] == MURO:
+                self.rhs[indice] = INFINITO
+            else:
+                g = self.g
+                self.rhs[indice] = min(g[vecino] + coste
+                                       for vecino, coste
+                                       in self.vecinos(indice))
+        if self.g[indice] != self.rhs[indice]:
+            self.encolar(indice)
+        else:
+            self.claves.pop(indice, None)
+
+    def cambiar_origen(self, origen):
+        """
+        Mover el origen conservando el arbol de busqueda. En lugar de
+        recalcular las claves de la cola se suma a km lo que ha bajado
+        la heuristica, y las claves viejas se corrigen al sacarlas
+        :param origen: Nueva celda origen
+        :return:
+        """
+        origen = origen[0] * self.alto + origen[1]
+        if origen == self.origen:
+            return
+        self.km += self.heuristica(origen)
+        self.origen = origen
+
+    def cambiar_celda(self, celda):
+        """
+        Reparar el arbol tras cambiar el estado de una celda. Solo
+        cambian los costes de los pasos que entran en ella
+        :param celda: Celda cambiada
+        :return:
+        """
+        self.actualizar_vertice(celda[0] * self.alto + celda[1])
+        self.version = self.mapa.version
+
+    def calcular(self):
+        """
+        Expandir celdas hasta que el origen sea consistente y ninguna
+        celda de la cola pueda mejorar su camino
+        :return:
+        """
+        g = self.g
+        rhs = self.rhs
+        cola = self.cola
+        claves = self.claves
+        origen = self.origen
+        expansiones = 0
+        while cola:
+            (clave, _, indice) = cola[0]
+            # Entrada obsoleta
+            if claves.get(indice) != clave:
+                heapq.heappop(cola)
+                continue
+            if (clave >= self.calcular_clave(origen)
+                    and rhs[origen] == g[origen]):
+                break
+            heapq.heappop(cola)
+            # Clave calculada con un km anterior: se recoloca
+            nueva = self.calcular_clave(indice)
+            if clave < nueva:
+                self.encolar(indice)
+                continue
+            del claves[indice]
+            expansiones += 1
+            if g[indice] > rhs[indice]:
+                g[indice] = rhs[indice]
+            else:
+                g[indice] = INFINITO
+                self.actualizar_vertice(indice)
+            for vecino, _ in self.vecinos(indice):
+                self.actualizar_vertice(vecino)
+        self.expansiones = expansiones
+
+    def camino(self):
+        """
+        Reconstruir el camino desde el origen siguiendo el vecino con
+        menor g mas coste del paso
+        :return: Lista de celdas desde el siguiente al origen hasta el
+        destino o None si no hay camino
+        """
+        g = self.g
+        actual = self.origen
+        if g[actual] == INFINITO:
+            return None
+        camino = []
+        while actual != self.destino:
+            actual = min(self.vecinos(actual),
+                         key=lambda vecino: g[vecino[0]] + vecino[1])[0]
+            camino.append(divmod(actual, self.alto))
+        return camino
+
+
+class CacheCaminos:
+    """
+    Cache de caminos con expulsion LRU indexada por origen, destino y
+    version del mapa. Los fallos se resuelven con planificadores D* Lite
+    por destino, que se reutilizan si avanza el origen o cambia algun
+    muro
+    """
+    def __init__(self, mapa, max_caminos=MAX_CAMINOS_CACHE,
+                 max_planificadores=MAX_PLANIFICADORES):
+        """
+        Constructor de la cache
+        :param mapa: Mapa sobre el que se buscan caminos
+        :param max_caminos: Numero maximo de caminos guardados
+        :param max_planificadores: Numero maximo de destinos con arbol
+        de busqueda guardado
+        """
+        self.mapa = mapa
+        self.max_caminos = max_caminos
+        self.max_planificadores = max_planificadores
+        self.caminos = OrderedDict()
+        self.planificadores = OrderedDict()
+        self.aciertos = 0
+        self.fallos = 0
+        self.replanificaciones = 0
+        # Celdas expandidas por los planificadores y longitud de los
+        # caminos devueltos, acumuladas
+        self.expansiones = 0
+        self.longitud_caminos = 0
+        mapa.agregar_observador_celdas(self.cambiar_celda)
+
+    def buscar_camino(self, origen, destino):
+        """
+        Buscar camino con la misma forma de resultado que
+        Mapa.buscar_camino
+        :param origen: Celda origen
+        :param destino: Celda destino
+        :return: Lista de nodos desde el siguiente al origen hasta el
+        destino o None si no hay camino
+        """
+        origen = tuple(origen)
+        destino = tuple(destino)
+        clave = (origen, destino, self.mapa.version)
+        if clave in self.caminos:
+            self.aciertos += 1
+            self.caminos.move_to_end(clave)
+            camino = self.caminos[clave]
+        else:
+            self.fallos += 1
+            camino = self.planificar(origen, destino)
+            self.caminos[clave] = camino
+            if len(self.caminos) > self.max_caminos:
+                self.caminos.popitem(last=False)
+        if camino is None:
+            return None
+        self.longitud_caminos += len(camino)
+        return [self.mapa.nodo(celda) for celda in camino]
+
+    def planificar(self, origen, destino):
+        """
+        Resolver un fallo de la cache reutilizando el planificador del
+        destino si sigue al dia con el mapa
+        :param origen: Celda origen
+        :param destino: Celda destino
+        :return: Lista de celdas del camino o None
+        """
+        if self.mapa[destino] == MURO or \
+                not self.mapa.alcanzable(origen, destino):
+            return None
+        planificador = self.planificadores.get(destino)
+        if (planificador is not None
+                and planificador.version == self.mapa.version):
+            self.replanificaciones += 1
+            self.planificadores.move_to_end(destino)
+        else:
+            planificador = PlanificadorLPA(self.mapa, destino)
+            self.planificadores[destino] = planificador
+            if len(self.planificadores) > self.max_planificadores:
+                self.planificadores.popitem(last=False)
+        planificador.cambiar_origen(origen)
+        planificador.calcular()
+        self.expansiones += planificador.expansiones
+        return planificador.camino()
+
+    def cambiar_celda(self, mapa, celda):
+        """
+        Observador de cambios de celda: repara los planificadores que
+        estaban al dia antes del cambio
+        :param mapa: Mapa cambiado
+        :param celda: Celda cambiada
+        :return:
+        """
+        for planificador in self.planificadores.values():
+            if planificador.version == mapa.version - 1:
+                planificador.cambiar_celda(celda)
+
+    def estadisticas(self):
+        """
+        Contadores de uso de la cache
+        :return: Diccionario con aciertos, fallos, replanificaciones,
+        celdas expandidas y longitud total de los caminos
+        """
+        return {
+            "aciertos": self.aciertos,
+            "fallos": self.fallos,
+            "replanificaciones": self.replanificaciones,
+            "expansiones": self.expansiones,
+            "longitud_caminos": self.longitud_caminos,
+        }
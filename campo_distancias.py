@@ -0,0 +1,152 @@
+from array import array
+from mapa import MURO
+
+INALCANZABLE = -1
+
+
+class CampoDistancias:
+    """
+    Mapa de distancias hasta un objetivo calculado con Dijkstra inverso
+    desde el objetivo. Se comparte entre todos los que buscan el mismo
+    objetivo: cada uno lee su siguiente paso sin hacer una busqueda
+    """
+    def __init__(self, mapa, max_distancia=None):
+        """
+        Constructor del campo de distancias
+        :param mapa: Mapa sobre el que se calculan las distancias
+        :param max_distancia: Distancia a partir de la cual se deja de
+        expandir. Si es None se recorre toda la region del objetivo
+        """
+        self.mapa = mapa
+        self.max_distancia = max_distancia
+        self.objetivo = None
+        self.version = None
+        self.distancias = None
+        # Contadores acumulados de recalculos y de celdas expandidas
+        self.calculos = 0
+        self.expansiones = 0
+        # Offsets de los vecinos con su coste, igual que en A Estrella
+        self.offset_costes = [(i, j, abs(i) + abs(j))
+                              for i, j in mapa.offset_vecinos]
+
+    def actualizar(self, objetivo):
+        """
+        Recalcular las distancias solo si ha cambiado el objetivo o
+        algun muro del mapa
+        :param objetivo: Celda objetivo
+        :return:
+        """
+        if objetivo != self.objetivo or self.version != self.mapa.version:
+            self.calcular(objetivo)
+
+    def calcular(self, objetivo):
+        """
+        Calcular la distancia de cada celda al objetivo. Como los costes
+        son enteros pequeños se usa una cola de cubetas por distancia
+        :param objetivo: Celda objetivo
+        :return:
+        """
+        mapa = self.mapa
+        alto = mapa.alto_mapa
+        mascaras = mapa.mascaras_vecinos()
+        pasos_mascara = mapa.pasos_mascara
+        max_distancia = self.max_distancia
+        distancias = array('i', [INALCANZABLE]) * (mapa.ancho_mapa * alto)
+
+        inicio = objetivo[0] * alto + objetivo[1]
+        distancias[inicio] = 0
+        cubetas = [[inicio]]
+        d = 0
+        expansiones = 0
+        while d < len(cubetas):
+            for actual in cubetas[d]:
+                # Entrada obsoleta de un nodo que mejoro despues
+                if distancias[actual] != d:
+                    continue
+                expansiones += 1
+                for desplazamiento, _, _, coste \
+                        in pasos_mascara[mascaras[actual]]:
+                    vecino = actual + desplazamiento
+                    nueva = d + coste
+                    if max_distancia is not None and nueva > max_distancia:
+                        continue
+                    anterior = distancias[vecino]
+                    if anterior == INALCANZABLE or nueva < anterior:
+                        distancias[vecino] = nueva
+                        while len(cubetas) <= nueva:
+                            cubetas.append([])
+                        cubetas[nueva].append(vecino)
+            d += 1
+
+        self.distancias = distancias
+        self.calculos += 1
+        self.expansiones += expansiones
+        self.objetivo = tuple(objetivo)
+        self.version = mapa.version
+
+    def distancia(self, celda):
+        """
+        Distancia de una celda al objetivo
+        :param celda: Celda a consultar
+        :return: Distancia o INALCANZABLE
+        """
+        return self.distancias[celda[0] * self.mapa.alto_mapa + celda[1]]
+
+    def siguiente_paso(self, celda):
+        """
+        Siguiente celda hacia el objetivo siguiendo un camino minimo
+        :param celda: Celda actual
+        :return: Celda vecina o None si no hay camino o ya esta en el
+        objetivo
+        """
+        mapa = self.mapa
+        ancho = mapa.ancho_mapa
+        alto = mapa.alto_mapa
+        distancias = self.distancias
+        (x, y) = celda
+        actual = distancias[x * alto + y]
+        if actual == INALCANZABLE or actual == 0:
+            return None
+        # El primer vecino por el que pasa un camino minimo
+        for i, j, coste in self.offset_costes:
+            xv = x + i
+            yv = y + j
+            if xv < 0 or xv >= ancho or yv < 0 or yv >= alto:
+                continue
+            d = distancias[xv * alto + yv]
+            if d != INALCANZABLE and d + coste == actual:
+                return (xv, yv)
+        return None
+
+    def paso_alejandose(self, celda):
+        """
+        Vecino libre que mas se aleja del objetivo. Las celdas fuera
+        del alcance del campo cuentan como las mas lejanas
+        :param celda: Celda actual
+        :return: Celda vecina o None si ningun vecino esta mas lejos
+        """
+        mapa = self.mapa
+        ancho = mapa.ancho_mapa
+        alto = mapa.alto_mapa
+        celdas = mapa.celdas_planas
+        distancias = self.distancias
+        (x, y) = celda
+        mejor = None
+        mejor_distancia = distancias[x * alto + y]
+        if mejor_distancia == INALCANZABLE:
+            return None
+        for i, j in mapa.offset_vecinos:
+            xv = x + i
+            yv = y + j
+            if xv < 0 or xv >= ancho or yv < 0 or yv >= alto:
+                continue
+            vecino = xv * alto + yv
+            if celdas[vecino] == MURO:
+                continue
+            d = distancias[vecino]
+            if d == INALCANZABLE:
+                return (xv, yv)
+            if d > mejor_distancia:
+                mejor = (xv, yv)
+                mejor_distancia = d
+        return mejor
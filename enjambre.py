@@ -0,0 +1,339 @@
+import numpy as np
+from Juego import Estado, Monstruo
+from campo_distancias import INALCANZABLE
+from linea import lineas
+from mapa import MURO, VACIO
+
+LIBRE = -1
+
+
+class EnjambreMonstruos:
+    """
+    Muchos monstruos guardados como estructura de arrays. Posiciones,
+    atributos y estados van en arrays NumPy y cada tick la percepcion,
+    los cambios de estado, los ataques y los movimientos se calculan
+    para todos a la vez, con la misma maquina de estados que Monstruo.
+    Comparte mapa, jugador, vision y campo de distancias con la
+    Simulacion y lleva su propia rejilla de ocupacion. Al crearlo se
+    agrega a la Simulacion, que lo actualiza cada tick, le pasa los
+    golpes del jugador, lo cuenta para el final de la partida y marca
+    sus celdas como ocupadas en el indice de entidades.
+
+    Diferencias con actualizar monstruo a monstruo: los sorteos salen de
+    un generador NumPy propio, y una celda que deja libre un monstruo no
+    la puede ocupar otro hasta el tick siguiente
+    """
+    def __init__(self, simulacion, posiciones, semilla=None, **atributos):
+        """
+        Constructor del enjambre
+        :param simulacion: Simulacion con el mapa y el jugador
+        :param posiciones: Celdas iniciales, distintas y sin otras
+        entidades
+        :param semilla: Semilla de los sorteos del enjambre
+        :param atributos: Valores de vida, armadura, fuerza, lentitud,
+        max_dist_olfato o max_dist_vista distintos de los de Monstruo
+        """
+        self.simulacion = simulacion
+        self.mapa = simulacion.mapa
+        self.aleatorio = np.random.default_rng(semilla)
+        posiciones = np.asarray(posiciones, dtype=np.int64).reshape(-1, 2)
+        self.numero = len(posiciones)
+        self.x = posiciones[:, 0].copy()
+        self.y = posiciones[:, 1].copy()
+
+        # Los valores por defecto son los de un Monstruo normal
+        prototipo = Monstruo((0, 0), simulacion)
+        for nombre in ("vida", "armadura", "fuerza", "lentitud", "turno",
+                       "max_dist_olfato", "max_dist_vista"):
+            valor = atributos.get(nombre, getattr(prototipo, nombre))
+            setattr(self, nombre,
+                    np.full(self.numero, valor, dtype=np.int32))
+        self.estado = np.full(self.numero, prototipo.estado.value,
+                              dtype=np.int8)
+
+        (i, j) = np.array(self.mapa.offset_vecinos).T
+        self.offset_x = i
+        self.offset_y = j
+        self.costes = np.abs(i) + np.abs(j)
+
+        # Indice del monstruo vivo de cada celda o LIBRE
+        self.ocupacion = np.full(self.mapa.ancho_mapa * self.mapa.alto_mapa,
+                                 LIBRE, dtype=np.int32)
+        planos = self.plano(self.x, self.y)
+        if len(np.unique(planos)) != self.numero:
+            raise ValueError("Dos monstruos comparten celda")
+        if np.isin(planos, self.planos_entidades()).any():
+            raise ValueError("Un monstruo ocupa la celda de otra entidad")
+        self.ocupacion[planos] = np.arange(self.numero)
+        simulacion.agregar_enjambre(self)
+
+    def plano(self, x, y):
+        """
+        Indices en la rejilla plana del mapa
+        :param x: Array de coordenadas x
+        :param y: Array de coordenadas y
+        :return: Array de x * alto_mapa + y
+        """
+        return x * self.mapa.alto_mapa + y
+
+    def planos_entidades(self):
+        """
+        Celdas ocupadas por las entidades del indice de la Simulacion,
+        el jugador incluido
+        :return: Array de indices de la rejilla plana
+        """
+        alto = self.mapa.alto_mapa
+        return np.fromiter((x * alto + y for x, y
+                            in self.simulacion.entidades.ocupadas),
+                           dtype=np.int64)
+
+    def ocupada(self, celda):
+        """
+        Comprobar si un monstruo vivo del enjambre esta en una celda,
+        para el indice de entidades
+        :param celda: Celda a consultar
+        :return: Booleano si esta ocupada
+        """
+        (x, y) = celda
+        alto = self.mapa.alto_mapa
+        if not (0 <= x < self.mapa.ancho_mapa and 0 <= y < alto):
+            return False
+        return bool(self.ocupacion[x * alto + y] != LIBRE)
+
+    def vivos(self):
+        """
+        Mascara de monstruos vivos
+        :return: Array booleano
+        """
+        return self.estado != Estado.MUERTO.value
+
+    def vecinos(self, celda):
+        """
+        Monstruos vivos en las celdas vecinas de una celda
+        :param celda: Celda central
+        :return: Array de indices de monstruos
+        """
+        x = celda[0] + self.offset_x
+        y = celda[1] + self.offset_y
+        dentro = ((x >= 0) & (x < self.mapa.ancho_mapa)
+                  & (y >= 0) & (y < self.mapa.alto_mapa))
+        indices = self.ocupacion[self.plano(x[dentro], y[dentro])]
+        return indices[indices != LIBRE]
+
+    def defender(self, indices, ataques):
+        """
+        Recibir ataques, igual que Monstruo.defender para cada indice
+        :param indices: Array de indices de los monstruos atacados
+        :param ataques: Array con el daño de cada ataque
+        :return:
+        """
+        indices = np.asarray(indices, dtype=np.int64)
+        ataques = np.asarray(ataques, dtype=np.int64)
+        danos = np.where(self.armadura[indices] < ataques,
+                         ataques - self.armadura[indices], 0)
+        np.subtract.at(self.vida, indices, danos)
+        muertos = indices[self.vida[indices] <= 0]
+        self.estado[muertos] = Estado.MUERTO.value
+        # El cuerpo ya no ocupa su celda
+        planos = self.plano(self.x[muertos], self.y[muertos])
+        planos = planos[self.ocupacion[planos] == muertos]
+        self.ocupacion[planos] = LIBRE
+
+    def recibir_golpe(self, jugador):
+        """
+        Ataque del jugador a todos los monstruos de su alrededor, como
+        Jugador.golpear
+        :param jugador: Jugador que ataca
+        :return:
+        """
+        indices = self.vecinos(jugador.posicion)
+        ataques = [jugador.atacar() for _ in indices]
+        self.defender(indices, ataques)
+
+    def percibir(self, activos):
+        """
+        Percepcion, ataques al jugador y cambio de estado de los
+        monstruos activos, como Monstruo.percibir seguido de
+        Monstruo.luchar monstruo a monstruo
+        :param activos: Array ordenado de indices de monstruos activos
+        :return:
+        """
+        jugador = self.simulacion.jugador
+        (jx, jy) = jugador.posicion
+        dx = np.abs(self.x[activos] - jx)
+        dy = np.abs(self.y[activos] - jy)
+        distancias = dx + dy
+        huele = distancias <= self.max_dist_olfato[activos]
+
+        # Solo los que no huelen y estan dentro del radio de vision
+        # necesitan el campo de vision
+        ve = np.zeros(len(activos), dtype=bool)
+        vision = self.simulacion.vision
+        dudosos = np.flatnonzero(
+            ~huele & (distancias <= self.max_dist_vista[activos]))
+        for k in dudosos:
+            i = activos[k]
+            ve[k] = vision.es_visible(
+                (int(self.x[i]), int(self.y[i])), (jx, jy),
+                int(self.max_dist_vista[i]))
+
+        # Los ataques no dependen de la vida, pero cada monstruo compara
+        # su vida con la del jugador tras los ataques de los anteriores
+        percibe = huele | ve
+        atacantes = np.flatnonzero(percibe & (np.maximum(dx, dy) == 1))
+        vida_jugador = np.full(len(activos), jugador.vida, dtype=np.int64)
+        for k in atacantes:
+            vida_jugador[k + 1:] -= jugador.vida
+            jugador.defender(int(self.aleatorio.integers(
+                0, self.fuerza[activos[k]] + 1)))
+            vida_jugador[k + 1:] += jugador.vida
+
+        mas_fuerte = self.vida[activos] > vida_jugador
+        self.estado[activos] = np.where(
+            huele,
+            np.where(mas_fuerte, Estado.RASTREAR.value, Estado.HUIR.value),
+            np.where(ve,
+                     np.where(mas_fuerte, Estado.BUSCAR.value,
+                              Estado.HUIR.value),
+                     Estado.PATRULLAR.value))
+
+    def vecindario(self, indices):
+        """
+        Celdas vecinas de varios monstruos
+        :param indices: Array de indices de monstruos
+        :return: Tupla (x, y, dentro) de arrays (n, 8) con las celdas en
+        el orden de Mapa.offset_vecinos y si estan dentro del mapa
+        """
+        x = self.x[indices, None] + self.offset_x[None, :]
+        y = self.y[indices, None] + self.offset_y[None, :]
+        dentro = ((x >= 0) & (x < self.mapa.ancho_mapa)
+                  & (y >= 0) & (y < self.mapa.alto_mapa))
+        return np.where(dentro, x, 0), np.where(dentro, y, 0), dentro
+
+    def patrullar(self, indices):
+        """
+        Paso aleatorio a una celda vacia, como Monstruo.patrullar
+        :param indices: Array de indices de monstruos
+        :return: Tupla (indices, x, y) de los pasos pedidos
+        """
+        paso = self.aleatorio.integers(-1, 2, size=(2, len(indices)))
+        x = self.x[indices] + paso[0]
+        y = self.y[indices] + paso[1]
+        dentro = ((x >= 0) & (x < self.mapa.ancho_mapa)
+                  & (y >= 0) & (y < self.mapa.alto_mapa))
+        indices, x, y = indices[dentro], x[dentro], y[dentro]
+        vacio = self.mapa.celdas[x, y] == VACIO
+        return indices[vacio], x[vacio], y[vacio]
+
+    def buscar(self, indices):
+        """
+        Paso por la linea recta hacia el jugador, como Monstruo.buscar
+        :param indices: Array de indices de monstruos
+        :return: Tupla (indices, x, y) de los pasos pedidos
+        """
+        jugador = self.simulacion.jugador.posicion
+        destinos = np.stack([self.x[indices], self.y[indices]], axis=1)
+        celdas, longitudes = lineas([jugador] * len(indices), destinos)
+        validos = longitudes >= 2
+        indices = indices[validos]
+        filas = np.flatnonzero(validos)
+        siguientes = celdas[filas, longitudes[validos] - 2]
+        x = siguientes[:, 0]
+        y = siguientes[:, 1]
+        vacio = self.mapa.celdas[x, y] == VACIO
+        return indices[vacio], x[vacio], y[vacio]
+
+    def rastrear(self, indices, distancias):
+        """
+        Paso por un camino minimo hacia el jugador, como
+        CampoDistancias.siguiente_paso
+        :param indices: Array de indices de monstruos
+        :param distancias: Distancias al jugador de la rejilla plana
+        :return: Tupla (indices, x, y) de los pasos pedidos
+        """
+        actual = distancias[self.plano(self.x[indices], self.y[indices])]
+        x, y, dentro = self.vecindario(indices)
+        d = np.where(dentro, distancias[self.plano(x, y)], INALCANZABLE)
+        candidatos = ((d != INALCANZABLE)
+                      & (d + self.costes[None, :] == actual[:, None]))
+        validos = ((actual != INALCANZABLE) & (actual != 0)
+                   & candidatos.any(axis=1))
+        primero = candidatos.argmax(axis=1)
+        filas = np.flatnonzero(validos)
+        return (indices[validos], x[filas, primero[validos]],
+                y[filas, primero[validos]])
+
+    def huir(self, indices, distancias):
+        """
+        Paso al vecino libre mas alejado del jugador, como
+        CampoDistancias.paso_alejandose
+        :param indices: Array de indices de monstruos
+        :param distancias: Distancias al jugador de la rejilla plana
+        :return: Tupla (indices, x, y) de los pasos pedidos
+        """
+        actual = distancias[self.plano(self.x[indices], self.y[indices])]
+        x, y, dentro = self.vecindario(indices)
+        planos = self.plano(x, y)
+        libres = dentro & (self.mapa.celdas.ravel()[planos] != MURO)
+        d = distancias[planos]
+        # Un vecino fuera del alcance del campo gana a cualquier otro
+        fuera = libres & (d == INALCANZABLE)
+        d = np.where(fuera, np.iinfo(np.int64).max,
+                     np.where(libres, d, INALCANZABLE))
+        mejor = d.argmax(axis=1)
+        filas = np.arange(len(indices))
+        validos = ((actual != INALCANZABLE)
+                   & (d[filas, mejor] > actual))
+        return (indices[validos], x[filas, mejor][validos],
+                y[filas, mejor][validos])
+
+    def mover(self, indices, x, y):
+        """
+        Mover monstruos a celdas libres. Si varios quieren la misma
+        celda se la queda el de menor indice
+        :param indices: Array ordenado de indices de monstruos
+        :param x: Array de coordenadas x destino
+        :param y: Array de coordenadas y destino
+        :return:
+        """
+        planos = self.plano(x, y)
+        # Ni el jugador ni las demas entidades del indice se pisan
+        libres = ((self.ocupacion[planos] == LIBRE)
+                  & ~np.isin(planos, self.planos_entidades()))
+        indices, planos = indices[libres], planos[libres]
+        planos, primeros = np.unique(planos, return_index=True)
+        indices = indices[primeros]
+        self.ocupacion[self.plano(self.x[indices], self.y[indices])] = LIBRE
+        self.ocupacion[planos] = indices
+        (self.x[indices], self.y[indices]) = np.divmod(
+            planos, self.mapa.alto_mapa)
+
+    def actualizar(self):
+        """
+        Avanzar un tick todos los monstruos, como Monstruo.actualizar
+        para cada uno en orden
+        :return:
+        """
+        activos = np.flatnonzero(self.turno % self.lentitud == 0)
+        self.turno += 1
+        vivos = activos[self.estado[activos] != Estado.MUERTO.value]
+        if len(vivos) == 0:
+            return
+        self.percibir(vivos)
+
+        estados = self.estado[vivos]
+        pasos = [self.patrullar(vivos[estados == Estado.PATRULLAR.value]),
+                 self.buscar(vivos[estados == Estado.BUSCAR.value])]
+        persiguen = vivos[estados == Estado.RASTREAR.value]
+        huyen = vivos[estados == Estado.HUIR.value]
+        if len(persiguen) or len(huyen):
+            campo = self.simulacion.campo_jugador
+            campo.actualizar(self.simulacion.jugador.posicion)
+            distancias = np.frombuffer(campo.distancias, dtype=np.intc)
+            pasos.append(self.rastrear(persiguen, distancias))
+            pasos.append(self.huir(huyen, distancias))
+
+        # Los pasos se resuelven juntos en el orden de los monstruos
+        (indices, x, y) = (np.concatenate(partes) for partes in zip(*pasos))
+        orden = np.argsort(indices, kind="stable")
+        self.mover(indices[orden], x[orden], y[orden])
@@ -0,0 +1,181 @@
+TAM_CUBO = 8
+
+
+class IndiceEntidades:
+    """
+    Indice espacial de las entidades del mapa. Cada celda ocupada
+    guarda su entidad, asi que no puede haber dos en la misma celda, y
+    las entidades se reparten en cubos cuadrados de celdas para buscar
+    las cercanas a una celda sin recorrer la lista entera. Cada clase
+    de entidad tiene sus propios cubos, asi que buscar a los pocos
+    jugadores no recorre a los muchos monstruos
+    """
+    def __init__(self, offset_vecinos, tam_cubo=TAM_CUBO):
+        """
+        Constructor del indice
+        :param offset_vecinos: Desplazamientos de las celdas vecinas,
+        los mismos que Mapa.offset_vecinos
+        :param tam_cubo: Lado de cada cubo en celdas
+        """
+        self.offset_vecinos = offset_vecinos
+        self.tam_cubo = tam_cubo
+        # Entidad de cada celda ocupada
+        self.ocupadas = {}
+        # Por clase de entidad, conjunto de entidades de cada cubo no
+        # vacio
+        self.capas = {}
+        # Grupos de entidades que llevan su propia ocupacion, como los
+        # enjambres; sus celdas tambien cuentan como ocupadas
+        self.externos = []
+
+    def agregar_externo(self, grupo):
+        """
+        Tener en cuenta las celdas ocupadas por un grupo de entidades
+        guardado fuera del indice
+        :param grupo: Objeto con un metodo ocupada(celda) que devuelve
+        si alguna de sus entidades esta en esa celda
+        :return:
+        """
+        self.externos.append(grupo)
+
+    def quitar_externo(self, grupo):
+        """
+        Dejar de tener en cuenta un grupo externo
+        :param grupo: Grupo agregado antes
+        :return:
+        """
+        self.externos.remove(grupo)
+
+    def ocupada(self, celda):
+        """
+        Comprobar si hay alguna entidad en una celda, del indice o de
+        los grupos externos
+        :param celda: Celda a consultar
+        :return: Booleano si esta ocupada
+        """
+        celda = tuple(celda)
+        return celda in self.ocupadas or any(
+            grupo.ocupada(celda) for grupo in self.externos)
+
+    def cubo(self, celda):
+        """
+        Cubo al que pertenece una celda
+        :param celda: Celda
+        :return: Tupla (cx, cy) del cubo
+        """
+        return (celda[0] // self.tam_cubo, celda[1] // self.tam_cubo)
+
+    def agregar(self, entidad):
+        """
+        Meter una entidad en el indice en su posicion actual
+        :param entidad: Entidad con atributo posicion
+        :return: Booleano si se ha podido, falso si la celda esta ocupada
+        """
+        celda = tuple(entidad.posicion)
+        if self.ocupada(celda):
+            return False
+        self.ocupadas[celda] = entidad
+        cubos = self.capas.setdefault(type(entidad), {})
+        cubos.setdefault(self.cubo(celda), set()).add(entidad)
+        return True
+
+    def quitar(self, entidad):
+        """
+        Sacar una entidad del indice
+        :param entidad: Entidad a sacar
+        :return:
+        """
+        celda = tuple(entidad.posicion)
+        if self.ocupadas.get(celda) is not entidad:
+            return
+        del self.ocupadas[celda]
+        cubos = self.capas[type(entidad)]
+        cubo = self.cubo(celda)
+        cubos[cubo].discard(entidad)
+        if not cubos[cubo]:
+            del cubos[cubo]
+
+    def mover(self, entidad, destino):
+        """
+        Cambiar la posicion de una entidad si la celda destino esta libre
+        :param entidad: Entidad a mover, debe estar en el indice
+        :param destino: Celda destino
+        :return: Booleano si se ha movido
+        """
+        destino = tuple(destino)
+        ocupante = self.ocupadas.get(destino)
+        if ocupante is not None:
+            return ocupante is entidad
+        if self.externos and any(grupo.ocupada(destino)
+                                 for grupo in self.externos):
+            return False
+        origen = tuple(entidad.posicion)
+        del self.ocupadas[origen]
+        self.ocupadas[destino] = entidad
+        cubo_origen = self.cubo(origen)
+        cubo_destino = self.cubo(destino)
+        if cubo_origen != cubo_destino:
+            cubos = self.capas[type(entidad)]
+            cubos[cubo_origen].discard(entidad)
+            if not cubos[cubo_origen]:
+                del cubos[cubo_origen]
+            cubos.setdefault(cubo_destino, set()).add(entidad)
+        entidad.posicion = destino
+        return True
+
+    def ocupante(self, celda):
+        """
+        Entidad que hay en una celda
+        :param celda: Celda a consultar
+        :return: Entidad o None si esta libre
+        """
+        return self.ocupadas.get(tuple(celda))
+
+    def vecinos(self, celda, tipo=None):
+        """
+        Entidades en las celdas vecinas de una celda
+        :param celda: Celda central
+        :param tipo: Clase de las entidades buscadas o None para todas
+        :return: Lista de entidades
+        """
+        (x, y) = celda
+        encontradas = []
+        for i, j in self.offset_vecinos:
+            entidad = self.ocupadas.get((x + i, y + j))
+            if entidad is not None and \
+                    (tipo is None or isinstance(entidad, tipo)):
+                encontradas.append(entidad)
+        return encontradas
+
+    def en_radio(self, celda, radio, tipo=None):
+        """
+        Entidades a distancia Manhattan menor o igual que un radio
+        :param celda: Celda central
+        :param radio: Distancia maxima
+        :param tipo: Clase de las entidades buscadas o None para todas
+        :return: Lista de entidades
+        """
+        (x, y) = celda
+        (cx0, cy0) = self.cubo((x - radio, y - radio))
+        (cx1, cy1) = self.cubo((x + radio, y + radio))
+        area = (cx1 - cx0 + 1) * (cy1 - cy0 + 1)
+        encontradas = []
+        for clase, cubos in self.capas.items():
+            if tipo is not None and not issubclass(clase, tipo):
+                continue
+            if area > len(cubos):
+                # Radio grande: sale mas barato recorrer los cubos no
+                # vacios
+                elegidos = [entidades for (cx, cy), entidades
+                            in cubos.items()
+                            if cx0 <= cx <= cx1 and cy0 <= cy <= cy1]
+            else:
+                elegidos = [cubos.get((cx, cy), ())
+                            for cx in range(cx0, cx1 + 1)
+                            for cy in range(cy0, cy1 + 1)]
+            for entidades in elegidos:
+                for entidad in entidades:
+                    (ex, ey) = entidad.posicion
+                    if abs(ex - x) + abs(ey - y) <= radio:
+                        encontradas.append(entidad)
+        return encontradas
@@ -0,0 +1,209 @@
+import mmap
+import struct
+
+import numpy as np
+
+from mapa import Mapa, MURO, LADO_CELDA
+from regiones import IndiceRegiones
+from campo_distancias import CampoDistancias
+
+# Formato del fichero, todo en little endian:
+#   cabecera
+#   tabla con una entrada por seccion
+#   secciones, cada una alineada a ALINEACION bytes
+# Las secciones son "celdas" (obligatoria, un byte por celda o un bit
+# si va empaquetada), "mascaras" (un byte por celda), "regiones" (un
+# entero de 32 bits por celda), "tamanos" (pares etiqueta, celdas de 64
+# bits) y "distancias" (un entero de 32 bits por celda, tantas como
+# campos se guarden). Todas indexadas por x * alto + y como la rejilla
+MAGICO = b"MAPA"
+VERSION_FORMATO = 1
+# magico, version, opciones, ancho, alto, semilla, numero de secciones
+CABECERA = struct.Struct("<4sHHIIQI4x")
+# nombre, tres parametros, desplazamiento, tamaño en bytes. En
+# "distancias" los parametros son el objetivo y la distancia maxima
+SECCION = struct.Struct("<16siiiQQ")
+ALINEACION = 64
+
+CON_SEMILLA = 1
+EMPAQUETADO = 2
+SIN_LIMITE = -1
+
+
+def alinear(posicion):
+    """
+    Siguiente posicion alineada
+    :param posicion: Posicion en bytes
+    :return: Posicion multiplo de ALINEACION
+    """
+    return -(-posicion // ALINEACION) * ALINEACION
+
+
+def guardar_mapa(mapa, ruta, empaquetar=False, mascaras=True,
+                 regiones=True, campos=()):
+    """
+    Guardar un mapa en formato binario
+    :param mapa: Mapa a guardar
+    :param ruta: Ruta del fichero
+    :param empaquetar: Si es cierto cada celda ocupa un bit. El
+    fichero es ocho veces menor pero al cargarlo hay que desempaquetar
+    en lugar de proyectar en memoria
+    :param mascaras: Si se guardan las mascaras de vecinos
+    :param regiones: Si se guarda el indice de regiones del mapa, si
+    tiene
+    :param campos: CampoDistancias del mapa a guardar
+    :return:
+    """
+    celdas = np.frombuffer(mapa.celdas_planas, dtype=np.uint8)
+    opciones = 0
+    if mapa.semilla is not None and 0 <= mapa.semilla < 2 ** 64:
+        opciones |= CON_SEMILLA
+    if empaquetar:
+        if np.any(celdas > MURO):
+            raise ValueError("Solo se empaquetan mapas de muros y vacios")
+        opciones |= EMPAQUETADO
+        secciones = [("celdas", (0, 0, 0), np.packbits(celdas))]
+    else:
+        secciones = [("celdas", (0, 0, 0), celdas)]
+    if mascaras:
+        secciones.append(("mascaras", (0, 0, 0), np.frombuffer(
+            mapa.mascaras_vecinos(), dtype=np.uint8)))
+    if regiones and mapa.regiones is not None:
+        indice = mapa.regiones
+        indice.actualizar()
+        pares = np.array(sorted(indice.tamanos.items()),
+                         dtype=np.int64).reshape(-1)
+        secciones.append(("regiones", (0, 0, 0), np.frombuffer(
+            indice.etiquetas, dtype=np.intc)))
+        secciones.append(("tamanos", (0, 0, 0), pares))
+    for campo in campos:
+        campo.actualizar(campo.objetivo)
+        limite = SIN_LIMITE if campo.max_distancia is None \
+            else campo.max_distancia
+        secciones.append(("distancias",
+                          (campo.objetivo[0], campo.objetivo[1], limite),
+                          np.frombuffer(campo.distancias, dtype=np.intc)))
+
+    posicion = alinear(CABECERA.size + SECCION.size * len(secciones))
+    tabla = []
+    for nombre, parametros, datos in secciones:
+        tabla.append(SECCION.pack(nombre.encode(), *parametros, posicion,
+                                  datos.nbytes))
+        posicion = alinear(posicion + datos.nbytes)
+
+    with open(ruta, "wb") as fichero:
+        fichero.write(CABECERA.pack(
+            MAGICO, VERSION_FORMATO, opciones, mapa.ancho_mapa,
+            mapa.alto_mapa, mapa.semilla if opciones & CON_SEMILLA else 0,
+            len(secciones)))
+        fichero.write(b"".join(tabla))
+        for datos in secciones:
+            fichero.write(bytes(alinear(fichero.tell()) - fichero.tell()))
+            fichero.write(memoryview(datos[2]).cast("B"))
+
+
+def leer_cabecera(memoria):
+    """
+    Leer la cabecera y la tabla de secciones
+    :param memoria: Contenido del fichero
+    :return: Tupla (ancho, alto, semilla, opciones, secciones), donde
+    secciones es una lista de tuplas (nombre, parametros,
+    desplazamiento, tamaño)
+    """
+    if len(memoria) < CABECERA.size:
+        raise ValueError("Fichero de mapa truncado")
+    (magico, version, opciones, ancho, alto, semilla,
+     numero) = CABECERA.unpack_from(memoria, 0)
+    if magico != MAGICO:
+        raise ValueError("No es un fichero de mapa")
+    if version != VERSION_FORMATO:
+        raise ValueError("Version de formato %d no soportada" % version)
+    secciones = []
+    for k in range(numero):
+        (nombre, a, b, c, desplazamiento, tamano) = SECCION.unpack_from(
+            memoria, CABECERA.size + k * SECCION.size)
+        if desplazamiento + tamano > len(memoria):
+            raise ValueError("Fichero de mapa truncado")
+        secciones.append((nombre.rstrip(b"\0").decode(), (a, b, c),
+                          desplazamiento, tamano))
+    if not opciones & CON_SEMILLA:
+        semilla = None
+    return ancho, alto, semilla, opciones, secciones
+
+
+def proyectar(ruta):
+    """
+    Proyectar un fichero de mapa en memoria. Es una copia privada: las
+    paginas se leen del fichero al usarse y se comparten entre todos
+    los procesos que lo abren mientras nadie las escribe, y las
+    escrituras no llegan al fichero
+    :param ruta: Ruta del fichero
+    :return: memoryview escribible del fichero
+    """
+    with open(ruta, "rb") as fichero:
+        memoria = mmap.mmap(fichero.fileno(), 0, access=mmap.ACCESS_COPY)
+    return memoryview(memoria)
+
+
+def cargar_mapa(ruta, lado_celda=LADO_CELDA, compacto=True,
+                con_pantalla=False):
+    """
+    Abrir un mapa guardado con guardar_mapa. La rejilla, las mascaras
+    y las regiones se usan directamente desde el fichero proyectado en
+    memoria, asi que abrir el mapa no depende de su tamaño salvo que
+    este empaquetado o falten las mascaras
+    :param ruta: Ruta del fichero
+    :param lado_celda: Pixeles por celda
+    :param compacto: Igual que en Mapa
+    :param con_pantalla: Igual que en Mapa
+    :return: Mapa, con el indice de regiones si estaba guardado
+    """
+    memoria = proyectar(ruta)
+    (ancho, alto, semilla, opciones, secciones) = leer_cabecera(memoria)
+    datos = {nombre: memoria[desplazamiento:desplazamiento + tamano]
+             for nombre, _, desplazamiento, tamano in secciones
+             if nombre != "distancias"}
+    if "celdas" not in datos:
+        raise ValueError("Fichero de mapa sin celdas")
+    celdas = datos["celdas"]
+    if opciones & EMPAQUETADO:
+        celdas = bytearray(np.unpackbits(
+            np.frombuffer(celdas, dtype=np.uint8), count=ancho * alto))
+
+    mapa = Mapa(ancho, alto, lado_celda, compacto=compacto,
+                con_pantalla=con_pantalla, celdas=celdas,
+                mascaras=datos.get("mascaras"))
+    mapa.semilla = semilla
+    if "regiones" in datos:
+        tamanos = None
+        if "tamanos" in datos:
+            pares = np.frombuffer(datos["tamanos"], dtype=np.int64)
+            tamanos = dict(zip(pares[0::2].tolist(), pares[1::2].tolist()))
+        mapa.regiones = IndiceRegiones(
+            mapa, datos["regiones"].cast("i"), tamanos)
+    return mapa
+
+
+def cargar_campos(ruta, mapa):
+    """
+    Abrir los campos de distancias guardados junto a un mapa
+    :param ruta: Ruta del fichero
+    :param mapa: Mapa cargado del mismo fichero y sin cambios
+    :return: Diccionario {objetivo: CampoDistancias}
+    """
+    memoria = proyectar(ruta)
+    (ancho, alto, _, _, secciones) = leer_cabecera(memoria)
+    if (ancho, alto) != (mapa.ancho_mapa, mapa.alto_mapa):
+        raise ValueError("El mapa no es el del fichero")
+    campos = {}
+    for nombre, (x, y, limite), desplazamiento, tamano in secciones:
+        if nombre != "distancias":
+            continue
+        campo = CampoDistancias(
+            mapa, None if limite == SIN_LIMITE else limite)
+        campo.distancias = memoria[
+            desplazamiento:desplazamiento + tamano].cast("i")
+        campo.objetivo = (x, y)
+        campo.version = mapa.version
+        campos[(x, y)] = campo
+    return campos
@@ -0,0 +1,352 @@
+import heapq
+from mapa import MURO
+
+TAM_CLUSTER = 16
+# Las entradas mas largas que esto tienen dos transiciones, una en cada
+# extremo; las cortas una sola en el centro
+MAX_ENTRADA_SIMPLE = 6
+# Distancia Manhattan a partir de la cual Mapa.buscar_camino con
+# JERARQUICO usa este buscador; mas cerca A Estrella ya es rapido y da
+# el camino optimo
+DISTANCIA_MINIMA = 2 * TAM_CLUSTER
+
+
+class BuscadorJerarquico:
+    """
+    Busqueda jerarquica de caminos (HPA*). El mapa se divide en
+    clusters cuadrados; tras generar el mapa se calculan las entradas
+    entre clusters vecinos y las distancias entre las entradas de cada
+    cluster. Las consultas se resuelven en ese grafo abstracto y solo
+    se refinan con busquedas locales los tramos del camino elegido.
+    Asignado a mapa.jerarquico, Mapa.buscar_camino lo usa para las
+    consultas largas con el algoritmo JERARQUICO
+    """
+    def __init__(self, mapa, tam_cluster=TAM_CLUSTER,
+                 distancia_minima=DISTANCIA_MINIMA):
+        """
+        Constructor del buscador. El grafo abstracto se rehace al acabar
+        cada generacion del mapa y, si el mapa cambia de otra forma, en
+        la siguiente consulta
+        :param mapa: Mapa sobre el que se busca
+        :param tam_cluster: Lado de cada cluster en celdas
+        :param distancia_minima: Distancia a partir de la cual lo usa
+        Mapa.buscar_camino
+        """
+        self.mapa = mapa
+        self.tam_cluster = tam_cluster
+        self.distancia_minima = distancia_minima
+        self.offset_costes = [(i, j, abs(i) + abs(j))
+                              for i, j in mapa.offset_vecinos]
+        self.version = None
+        self.grafo = {}
+        self.nodos_cluster = {}
+        mapa.agregar_observador(self.al_generar)
+
+    def al_generar(self, mapa, generacion):
+        """
+        Observador de la generacion: rehacer el grafo abstracto tras la
+        ultima generacion para que la primera consulta no lo pague
+        :param mapa: Mapa generado
+        :param generacion: Numero de la generacion aplicada
+        :return:
+        """
+        if generacion == mapa.ultima_generacion:
+            self.preprocesar()
+
+    def cluster(self, indice):
+        """
+        Cluster al que pertenece una celda
+        :param indice: Indice de la celda
+        :return: Tupla (cx, cy) del cluster
+        """
+        (x, y) = divmod(indice, self.mapa.alto_mapa)
+        return (x // self.tam_cluster, y // self.tam_cluster)
+
+    def limites(self, cluster):
+        """
+        Rectangulo de celdas de un cluster
+        :param cluster: Tupla (cx, cy) del cluster
+        :return: Tupla (x0, y0, x1, y1) con x1 e y1 excluidos
+        """
+        (cx, cy) = cluster
+        x0 = cx * self.tam_cluster
+        y0 = cy * self.tam_cluster
+        return (x0, y0,
+                min(x0 + self.tam_cluster, self.mapa.ancho_mapa),
+                min(y0 + self.tam_cluster, self.mapa.alto_mapa))
+
+    def preprocesar(self):
+        """
+        Construir el grafo abstracto: entradas entre clusters y
+        distancias entre las entradas de cada cluster
+        :return:
+        """
+        mapa = self.mapa
+        self.grafo = {}
+        self.nodos_cluster = {}
+        alto = mapa.alto_mapa
+        tam = self.tam_cluster
+
+        # Entradas en las fronteras verticales (entre x-1 y x) y
+        # horizontales (entre y-1 e y)
+        for x in range(tam, mapa.ancho_mapa, tam):
+            self.agregar_entradas(
+                [((x - 1) * alto + y, x * alto + y)
+                 for y in range(alto)])
+        for y in range(tam, alto, tam):
+            self.agregar_entradas(
+                [(x * alto + y - 1, x * alto + y)
+                 for x in range(mapa.ancho_mapa)])
+        # Pasos en diagonal a traves de las fronteras
+        for x in range(tam, mapa.ancho_mapa, tam):
+            for y in range(alto):
+                for dy in (-1, 1):
+                    if 0 <= y + dy < alto:
+                        self.agregar_diagonal((x - 1, y + dy), (x, y))
+        for y in range(tam, alto, tam):
+            for x in range(mapa.ancho_mapa):
+                for dx in (-1, 1):
+                    if 0 <= x + dx < mapa.ancho_mapa:
+                        self.agregar_diagonal((x + dx, y - 1), (x, y))
+
+        # Distancias dentro de cada cluster entre sus nodos
+        for cluster, nodos in self.nodos_cluster.items():
+            limites = self.limites(cluster)
+            for nodo in nodos:
+                distancias, _ = self.dijkstra_local(
+                    nodo, limites, set(nodos))
+                for otro in nodos:
+                    if otro != nodo and otro in distancias:
+                        self.grafo[nodo].append((otro, distancias[otro]))
+        self.version = mapa.version
+
+    def agregar_entradas(self, frontera):
+        """
+        Recorrer una frontera entre clusters agrupando en entradas los
+        tramos de pares de celdas libres a ambos lados
+        :param frontera: Lista de pares (celda a un lado, celda al otro)
+        :return:
+        """
+        celdas = self.mapa.celdas_planas
+        tramo = []
+        for par in frontera + [None]:
+            libre = (par is not None and celdas[par[0]] != MURO
+                     and celdas[par[1]] != MURO)
+            # Un tramo no puede pasar de un cluster al siguiente
+            if libre and tramo and \
+                    self.cluster(par[0]) == self.cluster(tramo[0][0]):
+                tramo.append(par)
+                continue
+            if tramo:
+                if len(tramo) > MAX_ENTRADA_SIMPLE:
+                    transiciones = [tramo[0], tramo[-1]]
+                else:
+                    transiciones = [tramo[len(tramo) // 2]]
+                for a, b in transiciones:
+                    self.agregar_nodo(a)
+                    self.agregar_nodo(b)
+                    self.grafo[a].append((b, 1))
+                    self.grafo[b].append((a, 1))
+            tramo = [par] if libre else []
+
+    def agregar_diagonal(self, a, b):
+        """
+        Agregar como entrada un paso en diagonal entre dos celdas de
+        clusters distintos. Solo hace falta si las dos celdas de las
+        otras esquinas son muro: si alguna esta libre las dos celdas ya
+        se unen por una entrada recta
+        :param a: Celda a un lado de la frontera
+        :param b: Celda en diagonal al otro lado
+        :return:
+        """
+        alto = self.mapa.alto_mapa
+        celdas = self.mapa.celdas_planas
+        ia = a[0] * alto + a[1]
+        ib = b[0] * alto + b[1]
+        if celdas[ia] == MURO or celdas[ib] == MURO or \
+                celdas[a[0] * alto + b[1]] != MURO or \
+                celdas[b[0] * alto + a[1]] != MURO:
+            return
+        self.agregar_nodo(ia)
+        self.agregar_nodo(ib)
+        self.grafo[ia].append((ib, 2))
+        self.grafo[ib].append((ia, 2))
+
+    def agregar_nodo(self, indice):
+        """
+        Agregar una celda como nodo del grafo abstracto
+        :param indice: Indice de la celda
+        :return:
+        """
+        if indice not in self.grafo:
+            self.grafo[indice] = []
+            self.nodos_cluster.setdefault(
+                self.cluster(indice), []).append(indice)
+
+    def dijkstra_local(self, inicio, limites, objetivos=None):
+        """
+        Dijkstra restringido a un rectangulo del mapa
+        :param inicio: Indice de la celda inicial
+        :param limites: Rectangulo (x0, y0, x1, y1) permitido
+        :param objetivos: Conjunto de indices; se para al alcanzarlos
+        todos. Si es None se recorre todo el rectangulo
+        :return: Tupla (distancias, padres) como diccionarios
+        """
+        (x0, y0, x1, y1) = limites
+        alto = self.mapa.alto_mapa
+        celdas = self.mapa.celdas_planas
+        distancias = {inicio: 0}
+        padres = {inicio: None}
+        pendientes = None if objetivos is None else set(objetivos)
+        cerrados = set()
+        cola = [(0, inicio)]
+        while cola:
+            (d, actual) = heapq.heappop(cola)
+            if actual in cerrados:
+                continue
+            cerrados.add(actual)
+            if pendientes is not None:
+                pendientes.discard(actual)
+                if not pendientes:
+                    break
+            (x, y) = divmod(actual, alto)
+            for i, j, coste in self.offset_costes:
+                xv = x + i
+                yv = y + j
+                if xv < x0 or xv >= x1 or yv < y0 or yv >= y1:
+                    continue
+                vecino = xv * alto + yv
+                if celdas[vecino] == MURO or vecino in cerrados:
+                    continue
+                nueva = d + coste
+                if nueva < distancias.get(vecino, nueva + 1):
+                    distancias[vecino] = nueva
+                    padres[vecino] = actual
+                    heapq.heappush(cola, (nueva, vecino))
+        return distancias, padres
+
+    def camino_local(self, inicio, fin, limites):
+        """
+        Camino dentro de un rectangulo entre dos celdas
+        :param inicio: Indice de la celda inicial
+        :param fin: Indice de la celda final
+        :param limites: Rectangulo (x0, y0, x1, y1) permitido
+        :return: Lista de indices sin inicio y con fin, o None
+        """
+        _, padres = self.dijkstra_local(inicio, limites, {fin})
+        if fin not in padres:
+            return None
+        camino = []
+        actual = fin
+        while actual != inicio:
+            camino.append(actual)
+            actual = padres[actual]
+        return camino[::-1]
+
+    def buscar_camino(self, origen, destino):
+        """
+        Buscar camino con la misma forma de resultado que
+        Mapa.buscar_camino. El camino es casi optimo: pasa por las
+        entradas elegidas entre clusters
+        :param origen: Celda origen
+        :param destino: Celda destino
+        :return: Lista de nodos desde el siguiente al origen hasta el
+        destino o None si no hay camino
+        """
+        mapa = self.mapa
+        if self.version != mapa.version:
+            self.preprocesar()
+        alto = mapa.alto_mapa
+        inicio = origen[0] * alto + origen[1]
+        fin = destino[0] * alto + destino[1]
+        if mapa.celdas_planas[fin] == MURO or \
+                not mapa.alcanzable(origen, destino):
+            return None
+
+        # Si estan en el mismo cluster se prueba primero dentro de el
+        if self.cluster(inicio) == self.cluster(fin):
+            camino = self.camino_local(
+                inicio, fin, self.limites(self.cluster(inicio)))
+            if camino is not None:
+                return [mapa.nodo(divmod(c, alto)) for c in camino]
+
+        # Si el destino es alcanzable pero el grafo abstracto no lo une,
+        # se busca con A Estrella en lugar de responder que no hay camino
+        abstracto = self.buscar_abstracto(inicio, fin)
+        if abstracto is None:
+            return mapa.buscar_camino_a_estrella(origen, destino)
+
+        # Refinar cada tramo del camino abstracto
+        camino = []
+        for a, b in zip(abstracto, abstracto[1:]):
+            if self.cluster(a) == self.cluster(b):
+                tramo = self.camino_local(a, b, self.limites(self.cluster(a)))
+                if tramo is None:
+                    return mapa.buscar_camino_a_estrella(origen, destino)
+            else:
+                tramo = [b]
+            camino.extend(tramo)
+        return [mapa.nodo(divmod(c, alto)) for c in camino]
+
+    def enlaces_temporales(self, indice):
+        """
+        Distancias de una celda a los nodos abstractos de su cluster
+        :param indice: Indice de la celda
+        :return: Lista de tuplas (nodo, coste)
+        """
+        cluster = self.cluster(indice)
+        nodos = self.nodos_cluster.get(cluster, [])
+        distancias, _ = self.dijkstra_local(
+            indice, self.limites(cluster), set(nodos))
+        return [(nodo, distancias[nodo]) for nodo in nodos
+                if nodo in distancias]
+
+    def buscar_abstracto(self, inicio, fin):
+        """
+        A Estrella sobre el grafo abstracto con el origen y el destino
+        enlazados temporalmente a los nodos de sus clusters
+        :param inicio: Indice de la celda origen
+        :param fin: Indice de la celda destino
+        :return: Lista de indices de nodos abstractos de inicio a fin
+        o None
+        """
+        alto = self.mapa.alto_mapa
+        (xf, yf) = divmod(fin, alto)
+        salidas = self.enlaces_temporales(inicio)
+        # Enlaces hacia el destino desde los nodos de su cluster
+        llegadas = {nodo: coste for nodo, coste
+                    in self.enlaces_temporales(fin)}
+
+        def heuristica(indice):
+            (x, y) = divmod(indice, alto)
+            return abs(x - xf) + abs(y - yf)
+
+        pesos_g = {inicio: 0}
+        padres = {inicio: None}
+        cerrados = set()
+        cola = [(heuristica(inicio), 0, inicio)]
+        while cola:
+            (_, g, actual) = heapq.heappop(cola)
+            if actual in cerrados:
+                continue
+            cerrados.add(actual)
+            if actual == fin:
+                camino = []
+                while actual is not None:
+                    camino.append(actual)
+                    actual = padres[actual]
+                return camino[::-1]
+            vecinos = self.grafo.get(actual, [])
+            if actual == inicio:
+                vecinos = vecinos + salidas
+            if actual in llegadas:
+                vecinos = vecinos + [(fin, llegadas[actual])]
+            for vecino, coste in vecinos:
+                nueva = g + coste
+                if vecino not in cerrados and \
+                        nueva < pesos_g.get(vecino, nueva + 1):
+                    pesos_g[vecino] = nueva
+                    padres[vecino] = actual
+                    heapq.heappush(
+                        cola, (nueva + heuristica(vecino), nueva, vecino))
+        return None
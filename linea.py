@@ -0,0 +1,63 @@
+import numpy as np
+
+
+def linea(origen, destino):
+    """
+    Rasterizar la linea recta entre dos celdas usando solo enteros
+    (Bresenham). En cada paso se avanza una celda en el eje mayor y en
+    el eje menor se redondea k * d / n, con los empates hacia el destino
+    :param origen: Celda origen
+    :param destino: Celda destino
+    :return: Lista de celdas de origen a destino, ambas incluidas
+    """
+    (x0, y0) = origen
+    (x1, y1) = destino
+    dx = x1 - x0
+    dy = y1 - y0
+    sx = (dx > 0) - (dx < 0)
+    sy = (dy > 0) - (dy < 0)
+    ax = abs(dx)
+    ay = abs(dy)
+    n = max(ax, ay)
+    if n == 0:
+        return [(x0, y0)]
+    dos_n = 2 * n
+    # Numeradores del desplazamiento en cada eje, 2 * k * |d| + n
+    ex = n
+    ey = n
+    celdas = []
+    for _ in range(n + 1):
+        celdas.append((x0 + sx * (ex // dos_n), y0 + sy * (ey // dos_n)))
+        ex += 2 * ax
+        ey += 2 * ay
+    return celdas
+
+
+def lineas(origenes, destinos):
+    """
+    Rasterizar a la vez muchas lineas con la misma regla que linea
+    :param origenes: Secuencia de celdas origen
+    :param destinos: Secuencia de celdas destino
+    :return: Tupla (celdas, longitudes). celdas es un array (n, L, 2)
+    con las celdas de cada linea, rellenado con el destino a partir de
+    su longitud, y longitudes el numero de celdas de cada linea
+    """
+    origenes = np.asarray(origenes, dtype=np.int64).reshape(-1, 2)
+    destinos = np.asarray(destinos, dtype=np.int64).reshape(-1, 2)
+    delta = destinos - origenes
+    absoluto = np.abs(delta)
+    n = absoluto.max(axis=1)
+    longitudes = n + 1
+    if len(n) == 0:
+        return np.empty((0, 0, 2), dtype=np.int64), longitudes
+
+    pasos = np.arange(longitudes.max())[None, :, None]
+    n_seguro = np.maximum(n, 1)[:, None, None]
+    desplazamiento = ((2 * pasos * absoluto[:, None, :] + n_seguro)
+                      // (2 * n_seguro))
+    celdas = (origenes[:, None, :]
+              + np.sign(delta)[:, None, :] * desplazamiento)
+    # Los pasos mas alla de la longitud de cada linea repiten el destino
+    fuera = pasos >= longitudes[:, None, None]
+    celdas = np.where(fuera, destinos[:, None, :], celdas)
+    return celdas, longitudes
@@ -1,7 +1,10 @@
 import pygame
 import random
+import heapq
+from array import array
 import color_mapa
 import numpy as np
+from linea import linea, lineas
 
 VACIO = 0
 MURO = 1
@@ -14,12 +17,66 @@ ALTO_MAPA = 100
 
 GENERACIONES = 10
 
+# Vecinos de una celda; el bit k de la mascara de vecinos de una celda
+# indica si el vecino OFFSET_VECINOS[k] esta dentro del mapa y no es muro
+OFFSET_VECINOS = [
+    (-1, 0), (1, 0),
+    (0, 1), (0, -1),
+    (-1, -1), (-1, 1),
+    (1, 1), (1, -1)]
+BIT_VECINO = {offset: 1 << k for k, offset in enumerate(OFFSET_VECINOS)}
+# Numero de vecinos libres de cada mascara
+VECINOS_MASCARA = np.array([bin(m).count("1") for m in range(256)],
+                           dtype=np.uint8)
+
+# Algoritmos de busqueda de caminos de Mapa.buscar_camino
+A_ESTRELLA = "a_estrella"
+JPS = "jps"
+# Jerarquico (HPA*) para las consultas largas si el mapa tiene buscador
+# jerarquico y A Estrella para las cortas
+JERARQUICO = "jerarquico"
+
 colores_mapa = {
                 VACIO: color_mapa.NEGRO,
                 MURO: color_mapa.MARRON,
             }
 
 
+def animar_generacion(mapa, generacion):
+    """
+    Observador de la generacion que pinta el mapa tras cada paso del
+    autómata y espera un momento para poder verlo
+    :param mapa: Mapa que se esta generando
+    :param generacion: Numero de la generacion aplicada
+    :return:
+    """
+    mapa.mostrar_mapa()
+    pygame.display.update()
+    pygame.time.wait(100)
+
+
+# Pasos de cada mascara ya calculados, por alto del mapa
+PASOS_MASCARA = {}
+
+
+def calcular_pasos_mascara(alto_mapa):
+    """
+    Para cada mascara, tupla de pasos (desplazamiento del indice, i, j,
+    coste) a sus vecinos libres, en el orden de los offsets. Solo
+    depende del alto del mapa, asi que se comparte entre mapas
+    :param alto_mapa: Alto del mapa
+    :return: Lista de 256 tuplas de pasos
+    """
+    pasos = PASOS_MASCARA.get(alto_mapa)
+    if pasos is None:
+        pasos = [tuple((i * alto_mapa + j, i, j, abs(i) + abs(j))
+                       for k, (i, j) in enumerate(OFFSET_VECINOS)
+                       if m & (1 << k))
+                 for m in range(256)]
+        PASOS_MASCARA[alto_mapa] = pasos
+    return pasos
+
+
 def distancia(a, b):
     """
     Distancia Manhattan entre dos posiciones
@@ -31,19 +88,32 @@ def distancia(a, b):
 
 
 class Nodo:
+    # Puede haber un nodo por celda: sin diccionario por instancia ni
+    # listas de vecinos, que se calculan al pedirlas con Mapa.vecinos
+    __slots__ = ("i", "j", "F", "G", "H", "mapa", "nodo_padre")
 
-    def __init__(self, celda):
+    def __init__(self, celda, mapa):
         (x, y) = celda
         self.i = x
         self.j = y
         self.F = 0
         self.G = 0
         self.H = 0
-        self.estado_celda = VACIO
-        self.vecinos = []
-        self.nodos_vecinos = []
+        self.mapa = mapa
         self.nodo_padre = None
 
+    @property
+    def estado_celda(self):
+        """
+        Estado de la celda, guardado en la rejilla del mapa
+        :return: Estado de la celda
+        """
+        return self.mapa.celdas_planas[self.i * self.mapa.alto_mapa + self.j]
+
+    @estado_celda.setter
+    def estado_celda(self, estado):
+        self.mapa[(self.i, self.j)] = estado
+
     def setEstado(self, estado):
         """
         Setear estado de la celda a Muro o Vacio
@@ -57,31 +127,118 @@ class Mapa:
     """
     Clase mapa del juego
     """
-    def __init__(self, ancho_mapa, alto_mapa, lado_celda):
+    def __init__(self, ancho_mapa, alto_mapa, lado_celda, compacto=False,
+                 con_pantalla=True, celdas=None, mascaras=None):
         """
         Constructor que inciliza todos los parametros del mapa
-        y establece los vecinos de cada celda
         :param ancho_mapa: Ancho del mapa
         :param alto_mapa: Alto del mapa
         :param lado_celda: Ancho y alto de celda
+        :param compacto: Si es cierto no se crea un Nodo por celda y el
+        estado solo se guarda en la rejilla de bytes
+        :param con_pantalla: Si es falso no se abre ninguna ventana ni se
+        anima la generacion, para generar mapas sin pantalla
+        :param celdas: Buffer escribible de un byte por celda con el
+        estado inicial, por ejemplo un fichero proyectado en memoria.
+        Si no se da el mapa empieza vacio
+        :param mascaras: Buffer escribible con las mascaras de vecinos
+        ya calculadas para celdas. Si no se da se calculan
         """
         self.ancho_mapa = ancho_mapa
         self.alto_mapa = alto_mapa
         self.lado_celda = lado_celda
-        self.mapa = {(x, y): Nodo((x, y))
-                     for x in range(self.ancho_mapa)
-                     for y in range(self.alto_mapa)}
-        self.pantalla = pygame.display.set_mode(
-            (self.ancho_mapa * self.lado_celda,
-             self.alto_mapa * self.lado_celda))
-        self.offset_vecinos = [
-            (-1, 0), (1, 0),
-            (0, 1), (0, -1),
-            (-1, -1), (-1, 1),
-            (1, 1), (1, -1)]
-        for i in range(1, self.ancho_mapa-1):
-            for j in range(1, self.alto_mapa-1):
-                self.mapa[(i, j)].vecinos = self.vecinos((i, j))
+        self.compacto = compacto
+        num_celdas = self.ancho_mapa * self.alto_mapa
+        if celdas is None:
+            celdas = bytearray(num_celdas)
+        elif len(celdas) != num_celdas:
+            raise ValueError("La rejilla tiene %d celdas y no %d"
+                             % (len(celdas), num_celdas))
+        # Estado de todas las celdas en una rejilla de un byte por celda
+        # indexada por x * alto_mapa + y. celdas es una vista NumPy
+        # (ancho, alto) sobre la misma memoria.
+        self.celdas_planas = celdas
+        self.celdas = np.frombuffer(
+            self.celdas_planas, dtype=np.uint8).reshape(
+                (self.ancho_mapa, self.alto_mapa))
+        # Se incrementa cada vez que cambia algun muro para que las
+        # caches sobre el mapa sepan que deben invalidarse
+        self.version = 0
+        # Semilla del ultimo relleno aleatorio, None si no se ha generado
+        self.semilla = None
+        if compacto:
+            self.mapa = None
+        else:
+            self.mapa = {(x, y): Nodo((x, y), self)
+                         for x in range(self.ancho_mapa)
+                         for y in range(self.alto_mapa)}
+        # Funciones (mapa, generacion) llamadas tras cada generacion
+        self.observadores = []
+        # Funciones (mapa, celda) llamadas cuando se cambia una celda
+        self.observadores_celdas = []
+        # Indice de regiones conexas opcional (regiones.IndiceRegiones)
+        # para descartar sin buscar los destinos inalcanzables
+        self.regiones = None
+        # Buscador jerarquico opcional (jerarquico.BuscadorJerarquico)
+        # para las consultas largas con el algoritmo JERARQUICO
+        self.jerarquico = None
+        # Numero de la ultima generacion de la generacion en curso, para
+        # que los observadores sepan cuando ha terminado
+        self.ultima_generacion = None
+        self.pantalla = None
+        if con_pantalla:
+            self.pantalla = pygame.display.set_mode(
+                (self.ancho_mapa * self.lado_celda,
+                 self.alto_mapa * self.lado_celda))
+            self.agregar_observador(animar_generacion)
+        self.offset_vecinos = OFFSET_VECINOS
+        # Mascara de vecinos libres de cada celda indexada igual que la
+        # rejilla. Se rehace tras los cambios masivos y se actualiza en
+        # cada __setitem__; version_mascaras dice con que version del
+        # mapa coincide
+        self.mascaras = mascaras
+        self.version_mascaras = None
+        # Para cada mascara, tupla de pasos (desplazamiento del indice,
+        # i, j, coste) a sus vecinos libres, en el orden de los offsets
+        self.pasos_mascara = calcular_pasos_mascara(alto_mapa)
+        if mascaras is None:
+            self.mascaras = bytearray(num_celdas)
+            self.calcular_mascaras()
+        elif len(mascaras) != num_celdas:
+            raise ValueError("Hay %d mascaras y no %d"
+                             % (len(mascaras), num_celdas))
+        else:
+            self.version_mascaras = self.version
+
+        # Memoria de trabajo de las busquedas indexada igual que la
+        # rejilla, reservada en la primera busqueda. Los sellos evitan
+        # reiniciar todo el mapa antes de cada busqueda: un valor solo
+        # es valido si su sello coincide con el numero de la busqueda
+        # actual.
+        self.busqueda_actual = 0
+        # Nodos expandidos en la ultima busqueda
+        self.expansiones = 0
+        # Contadores acumulados de todas las busquedas
+        self.busquedas = 0
+        self.caminos_fallidos = 0
+        self.expansiones_totales = 0
+        self.longitud_caminos = 0
+        self.sello_abierto = None
+        self.sello_cerrado = None
+        self.pesos_g = None
+        self.padres = None
+
+    def reservar_memoria_busqueda(self):
+        """
+        Reservar la memoria de trabajo de A Estrella: 16 bytes por
+        celda que no hacen falta si el mapa no se usa para buscar
+        :return:
+        """
+        num_celdas = self.ancho_mapa * self.alto_mapa
+        self.sello_abierto = array('I', bytes(4 * num_celdas))
+        self.sello_cerrado = array('I', bytes(4 * num_celdas))
+        self.pesos_g = array('i', bytes(4 * num_celdas))
+        self.padres = array('i', bytes(4 * num_celdas))
 
     def heuristica(self, nodoA, nodoB):
         """
@@ -93,60 +250,137 @@ class Mapa:
         dist = distancia([nodoA.i, nodoA.j], [nodoB.i, nodoB.j])
         return dist
 
-    def generar_aleatorio(self):
+    def nodo(self, celda):
+        """
+        Conseguir el nodo de una celda. En modo compacto se crea un
+        nodo nuevo que lee el estado de la rejilla
+        :param celda: Celda a consultar
+        :return: Nodo de la celda
+        """
+        if self.mapa is None:
+            return Nodo(celda, self)
+        return self.mapa[celda]
+
+    def generar_aleatorio(self, semilla=None, porcentaje=None):
         """
         Llenar aleatoriamente el mapa de juego de muros
         siguiendo un porcentaje
+        :param semilla: Semilla del sorteo. Si no se indica se saca del
+        modulo random para que random.seed siga fijando el mapa
+        :param porcentaje: Porcentaje de muros, por defecto
+        PORCENTAJE_MURO
         :return:
         """
-        for i in range(1, self.ancho_mapa-1):
-            for j in range(1, self.alto_mapa-1):
-                if random.randint(0, 100) < PORCENTAJE_MURO:
-                    self.mapa[(i, j)].estado_celda = MURO
-
-    def generar_automata(self):
+        if semilla is None:
+            semilla = random.getrandbits(64)
+        self.semilla = semilla
+        if porcentaje is None:
+            porcentaje = PORCENTAJE_MURO
+        generador = np.random.default_rng(semilla)
+        # Un unico sorteo para todo el interior del mapa
+        sorteo = generador.integers(
+            0, 101, size=(self.ancho_mapa - 2, self.alto_mapa - 2))
+        interior = self.celdas[1:-1, 1:-1]
+        interior[sorteo < porcentaje] = MURO
+        self.version += 1
+        self.calcular_mascaras()
+
+    def generar_automata(self, generaciones=None):
         """
         Aplicación del autómata al mapa para redondear y llenar huecos
+        :param generaciones: Numero de generaciones, por defecto
+        GENERACIONES
+        :return:
+        """
+        if generaciones is None:
+            generaciones = GENERACIONES
+        self.ultima_generacion = generaciones - 1
+        for gen in range(0, generaciones):
+            self.paso_automata()
+            for observador in self.observadores:
+                observador(self, gen)
+
+    def agregar_observador(self, observador):
+        """
+        Agregar una funcion que se llama tras cada generacion del
+        autómata, por ejemplo para pintar el mapa
+        :param observador: Funcion (mapa, generacion)
         :return:
         """
-        for gen in range(0, GENERACIONES):
-            self.crear_copia_mapa() # Se crea copia del mapa para no sobrescribir
-            # Iterar por todas las celdas del mapa
-            for w in range(1, self.ancho_mapa-1):
-                for h in range(1, self.alto_mapa-1):
-                    celda = (w, h)
-                    # Conseguir los vecinos de la celda
-                    vecinos = self.vecinos_aux(celda)
-                    # Contar cuantos son muro de los vecinos
-                    num_muros = vecinos.count(MURO)
-                    # Contar cuantos son vacios de los vecinos
-                    num_vacios = vecinos.count(VACIO)
-
-                    # Si todos los vecinos son muro ponemos la celda actual a muro
-                    if not num_vacios:
-                        self.mapa[celda].estado_celda = MURO
-                    # Si todos los vecinos son vacios ponemos la celda actual a vacia
-                    elif not num_muros:
-                        self.mapa[celda].estado_celda = VACIO
-                    # Si hay mas vacios que muros ponemos la celda a vacio
-                    elif num_vacios > num_muros:
-                        self.mapa[celda].estado_celda = VACIO
-                    # Si hay mas muros que vacios ponemos la celda a muro
-                    elif num_vacios < num_muros:
-                        self.mapa[celda].estado_celda = MURO
-            self.mostrar_mapa()
-            pygame.display.update()
-            pygame.time.wait(100)
-
-    def crear_copia_mapa(self):
-        """
-        Crear una copia del mapa para poder manejar una copia que
-        no se pueda sobrescribir
+        self.observadores.append(observador)
+
+    def quitar_observador(self, observador):
+        """
+        Quitar un observador de la generacion
+        :param observador: Funcion agregada antes
         :return:
         """
-        self.mapa_aux = {(x, y): self.mapa[(x, y)].estado_celda
-                         for x in range(self.ancho_mapa)
-                         for y in range(self.alto_mapa)}
+        self.observadores.remove(observador)
+
+    def agregar_observador_celdas(self, observador):
+        """
+        Agregar una funcion que se llama cada vez que se cambia una
+        celda con __setitem__, para actualizar indices sobre el mapa
+        sin rehacerlos. Los cambios masivos de la generacion solo
+        incrementan la version del mapa
+        :param observador: Funcion (mapa, celda)
+        :return:
+        """
+        self.observadores_celdas.append(observador)
+
+    def quitar_observador_celdas(self, observador):
+        """
+        Quitar un observador de cambios de celda
+        :param observador: Funcion agregada antes
+        :return:
+        """
+        self.observadores_celdas.remove(observador)
+
+    def paso_automata(self):
+        """
+        Aplicar una generacion del autómata a todo el mapa a la vez
+        :return:
+        """
+        mascaras = np.frombuffer(
+            self.mascaras_vecinos(), dtype=np.uint8).reshape(
+                (self.ancho_mapa, self.alto_mapa))
+        # Las celdas interiores tienen sus 8 vecinos dentro del mapa, asi
+        # que los muros vecinos son los que faltan en la mascara
+        num_muros = 8 - VECINOS_MASCARA[mascaras[1:-1, 1:-1]]
+        # Con 8 vecinos, mas muros que vacios es 5 o mas y mas vacios
+        # que muros es 3 o menos. Con 4 y 4 la celda no cambia.
+        interior = self.celdas[1:-1, 1:-1]
+        interior[num_muros > 4] = MURO
+        interior[num_muros < 4] = VACIO
+        self.version += 1
+        self.calcular_mascaras()
+
+    def calcular_mascaras(self):
+        """
+        Calcular la mascara de vecinos libres de todas las celdas
+        :return:
+        """
+        ancho = self.ancho_mapa
+        alto = self.alto_mapa
+        # Se rodea el mapa de muros para no salirse al desplazar
+        libres = np.zeros((ancho + 2, alto + 2), dtype=np.uint8)
+        np.not_equal(self.celdas, MURO, out=libres[1:-1, 1:-1])
+        mascaras = np.frombuffer(self.mascaras, dtype=np.uint8).reshape(
+            (ancho, alto))
+        mascaras[:] = 0
+        for k, (i, j) in enumerate(OFFSET_VECINOS):
+            mascaras |= libres[1 + i:ancho + 1 + i, 1 + j:alto + 1 + j] << k
+        self.version_mascaras = self.version
+
+    def mascaras_vecinos(self):
+        """
+        Mascaras de vecinos libres al dia con el mapa. Si se ha cambiado
+        la rejilla directamente se recalculan
+        :return: bytearray con una mascara por celda
+        """
+        if self.version_mascaras != self.version:
+            self.calcular_mascaras()
+        return self.mascaras
 
     def __getitem__(self, celda):
         """
@@ -154,7 +388,40 @@ class Mapa:
         :param celda: Celda a consultar
         :return: Estado de esa celda
         """
-        return self.mapa[celda].estado_celda
+        (x, y) = celda
+        # Sin comprobarlo una celda de fuera leeria otra de la rejilla
+        if not (0 <= x < self.ancho_mapa and 0 <= y < self.alto_mapa):
+            raise IndexError("Celda fuera del mapa: %r" % (celda,))
+        return self.celdas_planas[x * self.alto_mapa + y]
+
+    def __setitem__(self, celda, estado):
+        """
+        Cambiar el estado de una celda
+        :param celda: Celda a modificar
+        :param estado: Nuevo estado de la celda
+        :return:
+        """
+        (x, y) = celda
+        alto = self.alto_mapa
+        if not (0 <= x < self.ancho_mapa and 0 <= y < alto):
+            raise IndexError("Celda fuera del mapa: %r" % (celda,))
+        self.celdas_planas[x * alto + y] = estado
+        if self.version_mascaras == self.version:
+            # Solo cambia el bit que apunta a esta celda en cada vecino
+            mascaras = self.mascaras
+            for i, j in OFFSET_VECINOS:
+                xv = x + i
+                yv = y + j
+                if 0 <= xv < self.ancho_mapa and 0 <= yv < alto:
+                    bit = BIT_VECINO[(-i, -j)]
+                    if estado == MURO:
+                        mascaras[xv * alto + yv] &= ~bit
+                    else:
+                        mascaras[xv * alto + yv] |= bit
+            self.version_mascaras = self.version + 1
+        self.version += 1
+        for observador in self.observadores_celdas:
+            observador(self, celda)
 
     def esta_dentro(self, celda):
         """
@@ -178,23 +445,7 @@ class Mapa:
             celda_vecina = (x + i, y + j)
             if not self.esta_dentro(celda_vecina):
                 continue
-            vecinos.append(self.mapa[celda_vecina])
-        return vecinos
-
-    def vecinos_aux(self, celda):
-        """
-        Funcion que devuelve vecinos de una celda
-        en el mapa de copia
-        :param celda:
-        :return:
-        """
-        (x, y) = celda
-        vecinos = []
-        for i, j in self.offset_vecinos:
-            celda_vecina = (x + i, y + j)
-            if not self.esta_dentro(celda_vecina):
-                continue
-            vecinos.append(self.mapa_aux[celda_vecina])
+            vecinos.append(self.nodo(celda_vecina))
         return vecinos
 
     def es_vecino(self, pos1, pos2):
@@ -202,60 +453,22 @@ class Mapa:
         Comprueba si una celda es vecina de otra
         :param pos1: Primera posicion
         :param pos2: Segunda posicion
-        :return:
+        :return: Booleano si pos2 esta a un paso de pos1
         """
-        (x1, y1) = pos1
-        (x2, y2) = pos2
-        esVecino = False
-        for i, j in self.offset_vecinos:
-            x_aux = x1 + i
-            y_aux = y1 + j
-            if x_aux == x2 and y_aux == y2:
-                esVecino = True
-                break
-        return esVecino
+        for celda in (pos1, pos2):
+            if not self.esta_dentro(celda):
+                raise IndexError("Celda fuera del mapa: %r" % (celda,))
+        return (pos2[0] - pos1[0], pos2[1] - pos1[1]) in BIT_VECINO
 
     def buscar_camino_recto(self, origen, destino):
         """
         Busca camino recto entre dos celdas
         :param origen: Celda origen
         :param destino: Celda destino
-        :return: Camino recto encontrado
+        :return: Nodos de la linea recta desde el origen, incluido,
+        hasta el destino, sin incluir
         """
-        camino = []
-        origenIndex = origen
-        destinoIndex = destino
-        origen = self.mapa[origen]
-        destino = self.mapa[destino]
-
-        # Se consigue la distancia entre el origen y el destino
-        distan = distancia(origenIndex, destinoIndex)
-        orig = np.array([origen.i, origen.j])
-        dest = np.array([destino.i, destino.j])
-        # Se construye el vector director del origen al destino
-        direct = dest - orig
-        # Se normaliza el vector
-        direct = direct / np.linalg.norm(direct)
-
-        actual = origen
-        contador = 0
-        # Hasta que no se llegue al destino y el contador sea
-        # menor a la distancia
-        while actual != destino and contador < distan:
-            # Desplazarse una unidad en dirección al destino
-            x = origen.i + contador * direct[0]
-            x = int(x + (0.5 if x > 0 else -0.5))
-            y = origen.j + contador * direct[1]
-            y = int(y + (0.5 if y > 0 else -0.5))
-
-            coords = (x, y)
-            # Se comprueba que la posicion esté dentro del mapa
-            if self.esta_dentro(coords):
-                actual = self.mapa[coords]
-                # Se agrega nodo al camino
-                camino.append(actual)
-            contador += 1
-        return camino
+        return [self.nodo(celda) for celda in linea(origen, destino)[:-1]]
 
     def es_visble(self, origen, destino):
         """
@@ -264,40 +477,29 @@ class Mapa:
         :param destino: Celda destino
         :return: Si el camino es visible o no
         """
-        origenIndex = origen
-        destinoIndex = destino
-        origen = self.mapa[origen]
-        destino = self.mapa[destino]
-
-        # Se consigue la distancia entre el origen y el destino
-        distan = distancia(origenIndex, destinoIndex)
-        orig = np.array([origen.i, origen.j])
-        dest = np.array([destino.i, destino.j])
-        # Se construye el vector director del origen al destino
-        direct = dest - orig
-        # Se normaliza el vector
-        direct = direct / np.linalg.norm(direct)
-
-        actual = origen
-        contador = 0
-        # Hasta que no se llegue al destino y el contador sea
-        # menor a la distancia
-        while actual != destino and contador < distan:
-            x = origen.i + contador * direct[0]
-            x = int(x + (0.5 if x > 0 else -0.5))
-            y = origen.j + contador * direct[1]
-            y = int(y + (0.5 if y > 0 else -0.5))
-
-            coords = (x, y)
-            # Si se choca con un muro devuelve falso
-            if self.mapa[(x, y)].estado_celda == MURO:
+        celdas = self.celdas_planas
+        alto = self.alto_mapa
+        # Si se choca con un muro antes del destino no es visible
+        for (x, y) in linea(origen, destino)[:-1]:
+            if celdas[x * alto + y] == MURO:
                 return False
-            # Se comprueba que la posicion esté dentro del mapa
-            if self.esta_dentro(coords):
-                actual = self.mapa[coords]
-            contador += 1
         return True
 
+    def son_visibles(self, origenes, destinos):
+        """
+        Comprueba a la vez la visibilidad de muchos pares de celdas con
+        la misma regla que es_visble
+        :param origenes: Secuencia de celdas origen
+        :param destinos: Secuencia de celdas destino
+        :return: Array de booleanos con la visibilidad de cada par
+        """
+        celdas, longitudes = lineas(origenes, destinos)
+        estados = self.celdas[celdas[..., 0], celdas[..., 1]]
+        # Solo cuentan las celdas anteriores al destino de cada linea
+        pasos = np.arange(celdas.shape[1])[None, :]
+        antes_destino = pasos < (longitudes - 1)[:, None]
+        return ~np.any((estados == MURO) & antes_destino, axis=1)
+
     def calcular_sucesor(self, actual, vecino):
         """
         Calculo de nuevo peso teniendo en cueta el peso G calculado y
@@ -308,79 +510,276 @@ class Mapa:
         """
         return actual.G + self.heuristica(actual, vecino)
 
-    def buscar_camino(self, origen, destino):
+    def alcanzable(self, origen, destino):
         """
-        Buscar camino utilizando el algoritmo A Estrella
-        :param origen:
-        :param destino:
-        :return:
+        Comprobacion rapida de si puede haber camino entre dos celdas
+        usando el indice de regiones si lo hay
+        :param origen: Celda origen
+        :param destino: Celda destino
+        :return: Falso si seguro que no hay camino
         """
-        origen = self.mapa[origen]
-        destino = self.mapa[destino]
-
-        ListaCerrada = list()
-        ListaAbierta = list()
+        if self.regiones is None or self[origen] == MURO:
+            return True
+        return self.regiones.misma_region(origen, destino)
 
-        # Se inicializan los pesos
-        for w in range(0, self.ancho_mapa):
-            for h in range(0, self.alto_mapa):
-                self.mapa[(w, h)].nodo_padre = None
-                self.mapa[(w, h)].F = 0
-                self.mapa[(w, h)].G = 0
-                self.mapa[(w, h)].H = 0
-                self.mapa[(w, h)].vecinos = []
+    def buscar_camino(self, origen, destino, algoritmo=A_ESTRELLA):
+        """
+        Buscar camino entre dos celdas
+        :param origen: Celda origen
+        :param destino: Celda destino
+        :param algoritmo: A_ESTRELLA, JPS (Jump Point Search) o
+        JERARQUICO. Con JERARQUICO las consultas a partir de la distancia
+        minima del buscador jerarquico del mapa se resuelven con HPA*,
+        con un camino casi optimo, y el resto con A Estrella
+        :return: Lista de nodos desde el siguiente al origen hasta el
+        destino o None si no hay camino
+        """
+        self.expansiones = 0
+        self.busquedas += 1
+        if not self.alcanzable(origen, destino):
+            camino = None
+        elif algoritmo == JERARQUICO and self.jerarquico is not None and \
+                distancia(origen, destino) >= \
+                self.jerarquico.distancia_minima:
+            camino = self.jerarquico.buscar_camino(origen, destino)
+        elif algoritmo == JPS:
+            camino = self.buscar_camino_jps(origen, destino)
+        else:
+            camino = self.buscar_camino_a_estrella(origen, destino)
+        self.expansiones_totales += self.expansiones
+        if camino is None:
+            self.caminos_fallidos += 1
+        else:
+            self.longitud_caminos += len(camino)
+        return camino
 
-        ListaAbierta.append(origen)
+    def buscar_camino_a_estrella(self, origen, destino):
+        """
+        Buscar camino utilizando el algoritmo A Estrella con un monticulo
+        binario como lista abierta y sellos por busqueda como listas
+        abierta y cerrada
+        :param origen: Celda origen
+        :param destino: Celda destino
+        :return: Lista de nodos desde el siguiente al origen hasta el
+        destino o None si no hay camino
+        """
+        alto = self.alto_mapa
+        (xd, yd) = destino
+        indice_origen = origen[0] * alto + origen[1]
+        indice_destino = xd * alto + yd
+
+        if self.sello_abierto is None:
+            self.reservar_memoria_busqueda()
+        self.busqueda_actual += 1
+        sello = self.busqueda_actual
+        sello_abierto = self.sello_abierto
+        sello_cerrado = self.sello_cerrado
+        pesos_g = self.pesos_g
+        padres = self.padres
+        mascaras = self.mascaras_vecinos()
+        pasos_mascara = self.pasos_mascara
+
+        pesos_g[indice_origen] = 0
+        padres[indice_origen] = -1
+        sello_abierto[indice_origen] = sello
+        # Las entradas son (F, orden de llegada, G, indice); el orden de
+        # llegada desempata igual que la ordenacion estable original
+        orden = 0
+        ListaAbierta = [(distancia(origen, destino), orden, 0, indice_origen)]
 
         # Mientras que la lista abierta tenga nodos
         while ListaAbierta:
-            # Ordenar lista abierta segun el peso F
-            ListaAbierta = sorted(ListaAbierta, key=lambda nodo: nodo.F)
-            # Sacar prime elemento de lista abierta
-            actual = ListaAbierta.pop(0)
+            # Sacar el nodo con menor peso F
+            (_, _, g, actual) = heapq.heappop(ListaAbierta)
+            # Descartar entradas obsoletas o ya cerradas
+            if sello_cerrado[actual] == sello or g > pesos_g[actual]:
+                continue
             # Meter ese nodo en lista cerrada
-            ListaCerrada.append(actual)
+            sello_cerrado[actual] = sello
+            self.expansiones += 1
             # Si se ha llegado al destino
-            if actual == destino:
-                print("CAMINO ENCONTRADO")
+            if actual == indice_destino:
                 camino = []
                 # Recorrer camino de forma inversa guardando los nodos
-                while actual != origen:
-                    camino.append(actual)
-                    actual = actual.nodo_padre
+                while actual != indice_origen:
+                    camino.append(self.nodo(divmod(actual, alto)))
+                    actual = padres[actual]
                 # Invertir camino para secuencia correcta
                 return camino[::-1]
-            # Se consiguen los vecinos del nodo actual
-            vecinos = self.vecinos((actual.i, actual.j))
-            # para cada vecino
-            for vecino in vecinos:
-                # Pasar al siguiente vecino si el vecino actual
-                # a procesar es muro o si ya esta en lista cerrada
-                if vecino.estado_celda == MURO or vecino in ListaCerrada:
+            (x, y) = divmod(actual, alto)
+            # para cada vecino libre segun la mascara de la celda
+            for desplazamiento, i, j, coste in pasos_mascara[mascaras[actual]]:
+                vecino = actual + desplazamiento
+                # Pasar al siguiente vecino si esta cerrado
+                if sello_cerrado[vecino] == sello:
+                    continue
+                # El coste de un paso es la distancia Manhattan
+                nuevaG = g + coste
+                # Se ignora si ya esta abierto con un peso G mejor o igual
+                if sello_abierto[vecino] == sello and \
+                        pesos_g[vecino] <= nuevaG:
+                    continue
+                sello_abierto[vecino] = sello
+                pesos_g[vecino] = nuevaG
+                padres[vecino] = actual
+                orden += 1
+                nuevaF = nuevaG + abs(xd - x - i) + abs(yd - y - j)
+                heapq.heappush(ListaAbierta, (nuevaF, orden, nuevaG, vecino))
+
+        return None
+
+    def saltar(self, x, y, dx, dy, destino):
+        """
+        Avanzar en una direccion desde una celda hasta encontrar un punto
+        de salto: el destino o una celda con vecinos forzados
+        :param x: Coordenada x de partida
+        :param y: Coordenada y de partida
+        :param dx: Direccion en x
+        :param dy: Direccion en y
+        :param destino: Celda destino
+        :return: Celda del punto de salto o None si se choca con un muro
+        """
+        alto = self.alto_mapa
+        mascaras = self.mascaras_vecinos()
+        avance = BIT_VECINO[(dx, dy)]
+        # Hay vecino forzado si un lado esta bloqueado y la celda de
+        # delante de ese lado esta libre
+        if dx and dy:
+            (bloqueo1, salida1) = (BIT_VECINO[(-dx, 0)], BIT_VECINO[(-dx, dy)])
+            (bloqueo2, salida2) = (BIT_VECINO[(0, -dy)], BIT_VECINO[(dx, -dy)])
+        elif dx:
+            (bloqueo1, salida1) = (BIT_VECINO[(0, 1)], BIT_VECINO[(dx, 1)])
+            (bloqueo2, salida2) = (BIT_VECINO[(0, -1)], BIT_VECINO[(dx, -1)])
+        else:
+            (bloqueo1, salida1) = (BIT_VECINO[(1, 0)], BIT_VECINO[(1, dy)])
+            (bloqueo2, salida2) = (BIT_VECINO[(-1, 0)], BIT_VECINO[(-1, dy)])
+
+        while True:
+            if not mascaras[x * alto + y] & avance:
+                return None
+            x += dx
+            y += dy
+            if (x, y) == destino:
+                return (x, y)
+            mascara = mascaras[x * alto + y]
+            if ((not mascara & bloqueo1 and mascara & salida1)
+                    or (not mascara & bloqueo2 and mascara & salida2)):
+                return (x, y)
+            # En diagonal hay que mirar tambien en linea recta
+            if dx and dy and (
+                    self.saltar(x, y, dx, 0, destino) is not None
+                    or self.saltar(x, y, 0, dy, destino) is not None):
+                return (x, y)
+
+    def direcciones_jps(self, x, y, dx, dy):
+        """
+        Direcciones a explorar desde un punto de salto segun la direccion
+        por la que se llego: las naturales y las de vecinos forzados
+        :param x: Coordenada x del punto
+        :param y: Coordenada y del punto
+        :param dx: Direccion de llegada en x
+        :param dy: Direccion de llegada en y
+        :return: Lista de direcciones (dx, dy)
+        """
+        if dx == 0 and dy == 0:
+            return self.offset_vecinos
+        mascara = self.mascaras_vecinos()[x * self.alto_mapa + y]
+        if dx and dy:
+            direcciones = [(dx, 0), (0, dy), (dx, dy)]
+            if not mascara & BIT_VECINO[(-dx, 0)]:
+                direcciones.append((-dx, dy))
+            if not mascara & BIT_VECINO[(0, -dy)]:
+                direcciones.append((dx, -dy))
+        elif dx:
+            direcciones = [(dx, 0)]
+            if not mascara & BIT_VECINO[(0, 1)]:
+                direcciones.append((dx, 1))
+            if not mascara & BIT_VECINO[(0, -1)]:
+                direcciones.append((dx, -1))
+        else:
+            direcciones = [(0, dy)]
+            if not mascara & BIT_VECINO[(1, 0)]:
+                direcciones.append((1, dy))
+            if not mascara & BIT_VECINO[(-1, 0)]:
+                direcciones.append((-1, dy))
+        return direcciones
+
+    def buscar_camino_jps(self, origen, destino):
+        """
+        Buscar camino con Jump Point Search: A Estrella que solo expande
+        los puntos de salto, aprovechando que todas las direcciones
+        del mapa tienen el mismo coste en todas las celdas
+        :param origen: Celda origen
+        :param destino: Celda destino
+        :return: Lista de nodos desde el siguiente al origen hasta el
+        destino o None si no hay camino
+        """
+        origen = (origen[0], origen[1])
+        destino = (destino[0], destino[1])
+        if self[destino] == MURO:
+            return None
+        # Con pasos diagonales de coste 2 hay muchos empates, y los
+        # sucesores de un punto dependen de la direccion de llegada, asi
+        # que los estados son (celda, direccion) y no solo la celda
+        inicio = (origen, (0, 0))
+        pesos_g = {inicio: 0}
+        padres = {inicio: None}
+        cerrados = set()
+        orden = 0
+        ListaAbierta = [(distancia(origen, destino), orden, 0, inicio)]
+        while ListaAbierta:
+            (_, _, g, estado) = heapq.heappop(ListaAbierta)
+            if estado in cerrados:
+                continue
+            cerrados.add(estado)
+            self.expansiones += 1
+            (actual, (dx, dy)) = estado
+            if actual == destino:
+                return self.camino_jps(padres, estado)
+            (x, y) = actual
+            for i, j in self.direcciones_jps(x, y, dx, dy):
+                salto = self.saltar(x, y, i, j, destino)
+                if salto is None:
+                    continue
+                siguiente = (salto, (i, j))
+                if siguiente in cerrados:
                     continue
-                # Si vecino esta en lista abierta
-                if vecino in ListaAbierta:
-                    # Se calcula nueva G
-                    nuevaG = self.calcular_sucesor(actual, vecino)
-                    # Se actualiza la G del vecino si es necesario
-                    if vecino.G > nuevaG:
-                        vecino.G = nuevaG
-                        vecino.nodo_padre = actual
-                else:
-                    # Si no esta en lista abierta se calcula nueva G
-                    vecino.G = self.calcular_sucesor(actual, vecino)
-                    # Se calcula nueva H
-                    vecino.H = self.calcular_sucesor(vecino, destino)
-                    # Se actualiza la F del vecino
-                    vecino.F = vecino.G + vecino.H
-                    # Se pone al nodo actual como padre del vecino
-                    vecino.nodo_padre = actual
-                    # Se mete vecino en lista abierta
-                    ListaAbierta.append(vecino)
-
-        print("NO CAMINO ENCONTRADO")
+                # Los saltos son rectos o diagonales: su coste es la
+                # distancia Manhattan entre los dos puntos
+                nuevaG = g + distancia(actual, salto)
+                if nuevaG < pesos_g.get(siguiente, nuevaG + 1):
+                    pesos_g[siguiente] = nuevaG
+                    padres[siguiente] = estado
+                    orden += 1
+                    heapq.heappush(ListaAbierta, (
+                        nuevaG + distancia(salto, destino), orden,
+                        nuevaG, siguiente))
         return None
 
+    def camino_jps(self, padres, final):
+        """
+        Rellenar las celdas entre los puntos de salto del camino
+        :param padres: Diccionario de padres de cada estado
+        :param final: Estado (celda, direccion) del destino
+        :return: Lista de nodos desde el siguiente al origen hasta el
+        destino
+        """
+        camino = []
+        estado = final
+        while padres[estado] is not None:
+            anterior = padres[estado]
+            actual = estado[0]
+            padre = anterior[0]
+            dx = (padre[0] > actual[0]) - (padre[0] < actual[0])
+            dy = (padre[1] > actual[1]) - (padre[1] < actual[1])
+            (x, y) = actual
+            while (x, y) != padre:
+                camino.append(self.nodo((x, y)))
+                x += dx
+                y += dy
+            estado = anterior
+        return camino[::-1]
+
     def mostrar_mapa(self):
         """
         Mostrar mapa
@@ -389,7 +788,7 @@ class Mapa:
         for y in range(self.alto_mapa):
             for x in range(self.ancho_mapa):
                 self.mostrar_celda(
-                    (x, y), colores_mapa[self.mapa[(x, y)].estado_celda])
+                    (x, y), colores_mapa[self[(x, y)]])
 
     def mostrar_celda(self, celda, color):
         """
@@ -418,14 +817,24 @@ class Mapa:
 
 
 if __name__ == '__main__':
+    import sys
+    from jerarquico import BuscadorJerarquico
 
+    # Con "python mapa.py jerarquico" el camino largo se busca con HPA*,
+    # mas rapido pero no siempre optimo; por defecto con A Estrella
+    algoritmo = A_ESTRELLA
     mapa = Mapa(ANCHO_MAPA, ALTO_MAPA, LADO_CELDA)
+    if len(sys.argv) > 1 and sys.argv[1] == JERARQUICO:
+        algoritmo = JERARQUICO
+        # El grafo de clusters se rehace al acabar la generacion
+        mapa.jerarquico = BuscadorJerarquico(mapa)
 
     mapa.generar_aleatorio()
     mapa.generar_automata()
 
     mapa.mostrar_mapa()
-    pasos = mapa.buscar_camino((0, 0), (ANCHO_MAPA-1, ALTO_MAPA-1))
+    pasos = mapa.buscar_camino((0, 0), (ANCHO_MAPA-1, ALTO_MAPA-1),
+                               algoritmo)
 
     camino_recorrido = []
     for paso in pasos:
@@ -0,0 +1,521 @@
+import os
+import shutil
+import sys
+import tempfile
+from collections import OrderedDict
+
+import numpy as np
+import pygame
+
+import color_mapa
+from mapa import Mapa, MURO, VACIO, A_ESTRELLA, PORCENTAJE_MURO, \
+    GENERACIONES, LADO_CELDA
+from linea import linea
+from regiones import IndiceRegiones
+from vision import CampoVision
+
+# Lado en celdas de cada trozo del mundo
+TAM_TROZO = 64
+# Lado en trozos de la ventana cargada como Mapa, impar para que el
+# trozo del foco quede en el centro
+TROZOS_VENTANA = 3
+# Trozos que se mantienen en memoria; el resto se guarda en disco
+MAX_TROZOS = 64
+# Trozos como maximo de la zona de una busqueda fuera de la ventana
+MAX_TROZOS_BUSQUEDA = 256
+
+
+def zigzag(n):
+    """
+    Entero no negativo distinto para cada entero, para poder sembrar el
+    generador con coordenadas negativas
+    :param n: Entero
+    :return: Entero no negativo
+    """
+    return 2 * n if n >= 0 else -2 * n - 1
+
+
+class Mundo:
+    """
+    Mundo infinito dividido en trozos cuadrados que se generan al
+    pedirlos. El relleno aleatorio de cada trozo depende solo de la
+    semilla del mundo y de sus coordenadas, y el automata se aplica
+    sobre el trozo con un margen de los vecinos tan ancho como las
+    generaciones, asi que cada trozo sale igual que si se hubiera
+    generado el mundo entero de una vez y los bordes casan. Los trozos
+    usados hace mas tiempo se expulsan a disco.
+
+    Para buscar caminos, ver y pintar se usa una ventana: un Mapa de
+    TROZOS_VENTANA x TROZOS_VENTANA trozos alrededor del foco que se
+    vuelve a copiar cuando el foco se acerca a su borde. Las
+    coordenadas de Mundo son globales y las de la ventana locales
+    """
+    def __init__(self, semilla, tam_trozo=TAM_TROZO,
+                 trozos_ventana=TROZOS_VENTANA, max_trozos=MAX_TROZOS,
+                 directorio=None, porcentaje=PORCENTAJE_MURO,
+                 generaciones=GENERACIONES, lado_celda=LADO_CELDA):
+        """
+        Constructor del mundo
+        :param semilla: Semilla del mundo, entero no negativo
+        :param tam_trozo: Lado de cada trozo en celdas
+        :param trozos_ventana: Lado de la ventana en trozos, impar
+        :param max_trozos: Trozos como maximo en memoria
+        :param directorio: Carpeta donde se guardan los trozos
+        expulsados; si no se da se crea una temporal al necesitarla que
+        se borra al cerrar el mundo
+        :param porcentaje: Porcentaje de muros del relleno
+        :param generaciones: Generaciones del automata
+        :param lado_celda: Pixeles por celda de la ventana
+        """
+        if trozos_ventana % 2 == 0:
+            raise ValueError("La ventana debe tener un numero impar de "
+                             "trozos de lado")
+        self.semilla = semilla
+        self.tam_trozo = tam_trozo
+        self.trozos_ventana = trozos_ventana
+        self.max_trozos = max_trozos
+        self.directorio = directorio
+        # La carpeta temporal es del mundo y se borra al cerrarlo
+        self.temporal = directorio is None
+        self.porcentaje = porcentaje
+        self.generaciones = generaciones
+        # Trozos en memoria en orden de uso: (cx, cy) -> bytearray de
+        # tam_trozo * tam_trozo celdas indexadas por x * tam_trozo + y
+        self.trozos = OrderedDict()
+        # Trozos en memoria cambiados desde que se leyeron
+        self.modificados = set()
+        # Ultimos rellenos calculados, que se usan tambien como margen
+        # de los trozos vecinos
+        self.rellenos = OrderedDict()
+        self.generados = 0
+        self.leidos = 0
+        self.escritos = 0
+
+        lado = tam_trozo * trozos_ventana
+        self.mapa = Mapa(lado, lado, lado_celda, compacto=True,
+                         con_pantalla=False)
+        self.mapa.regiones = IndiceRegiones(self.mapa)
+        self.vision = CampoVision(self.mapa)
+        # Celda global de la celda (0, 0) de la ventana
+        self.origen = None
+        self.mapa.agregar_observador_celdas(self.cambiar_celda)
+
+    def coordenadas(self, celda):
+        """
+        Trozo de una celda y posicion dentro de el
+        :param celda: Celda global
+        :return: Tupla (trozo, indice dentro del trozo)
+        """
+        tam = self.tam_trozo
+        (x, y) = celda
+        return (x // tam, y // tam), (x % tam) * tam + y % tam
+
+    def ruta_trozo(self, trozo):
+        """
+        Fichero de un trozo en disco
+        :param trozo: Coordenadas (cx, cy) del trozo
+        :return: Ruta del fichero
+        """
+        if self.directorio is None:
+            self.directorio = tempfile.mkdtemp(prefix="mundo_")
+        return os.path.join(self.directorio, "%d_%d.trozo" % trozo)
+
+    def relleno(self, trozo):
+        """
+        Relleno aleatorio de muros de un trozo antes del automata
+        :param trozo: Coordenadas (cx, cy) del trozo
+        :return: Array (tam_trozo, tam_trozo) de estados
+        """
+        relleno = self.rellenos.get(trozo)
+        if relleno is not None:
+            self.rellenos.move_to_end(trozo)
+            return relleno
+        generador = np.random.default_rng(
+            [self.semilla, zigzag(trozo[0]), zigzag(trozo[1])])
+        sorteo = generador.integers(
+            0, 101, size=(self.tam_trozo, self.tam_trozo))
+        relleno = np.where(sorteo < self.porcentaje, MURO,
+                           VACIO).astype(np.uint8)
+        self.rellenos[trozo] = relleno
+        if len(self.rellenos) > self.max_trozos:
+            self.rellenos.popitem(last=False)
+        return relleno
+
+    def generar_trozo(self, trozo):
+        """
+        Generar un trozo aplicando el automata a su relleno rodeado de
+        un margen del relleno de los vecinos. Cada generacion solo
+        deja de ser exacta una celda mas hacia dentro desde el borde,
+        asi que con tantas celdas de margen como generaciones el trozo
+        es exacto
+        :param trozo: Coordenadas (cx, cy) del trozo
+        :return: bytearray con las celdas del trozo
+        """
+        tam = self.tam_trozo
+        margen = self.generaciones
+        vecinos = -(-margen // tam)
+        lado = (2 * vecinos + 1) * tam
+        relleno = np.empty((lado, lado), dtype=np.uint8)
+        for i in range(-vecinos, vecinos + 1):
+            for j in range(-vecinos, vecinos + 1):
+                x = (i + vecinos) * tam
+                y = (j + vecinos) * tam
+                relleno[x:x + tam, y:y + tam] = self.relleno(
+                    (trozo[0] + i, trozo[1] + j))
+        inicio = vecinos * tam - margen
+        final = (vecinos + 1) * tam + margen
+        zona = Mapa(tam + 2 * margen, tam + 2 * margen, 1, compacto=True,
+                    con_pantalla=False, celdas=bytearray(
+                        relleno[inicio:final, inicio:final].tobytes()))
+        zona.generar_automata(margen)
+        self.generados += 1
+        return bytearray(
+            zona.celdas[margen:margen + tam, margen:margen + tam].tobytes())
+
+    def trozo(self, trozo):
+        """
+        Celdas de un trozo, leyendolo de disco o generandolo si no esta
+        en memoria
+        :param trozo: Coordenadas (cx, cy) del trozo
+        :return: bytearray con las celdas del trozo
+        """
+        celdas = self.trozos.get(trozo)
+        if celdas is not None:
+            self.trozos.move_to_end(trozo)
+            return celdas
+        ruta = self.ruta_trozo(trozo) if self.directorio else None
+        if ruta is not None and os.path.exists(ruta):
+            with open(ruta, "rb") as fichero:
+                celdas = bytearray(fichero.read())
+            self.leidos += 1
+        else:
+            celdas = self.generar_trozo(trozo)
+        self.trozos[trozo] = celdas
+        while len(self.trozos) > self.max_trozos:
+            self.expulsar()
+        return celdas
+
+    def escribir(self, trozo, celdas):
+        """
+        Guardar un trozo en disco
+        :param trozo: Coordenadas (cx, cy) del trozo
+        :param celdas: Celdas del trozo
+        :return:
+        """
+        with open(self.ruta_trozo(trozo), "wb") as fichero:
+            fichero.write(celdas)
+        self.escritos += 1
+
+    def expulsar(self):
+        """
+        Sacar de memoria el trozo usado hace mas tiempo, escribiendolo
+        si ha cambiado o todavia no esta en disco
+        :return:
+        """
+        (trozo, celdas) = self.trozos.popitem(last=False)
+        if trozo in self.modificados or \
+                not os.path.exists(self.ruta_trozo(trozo)):
+            self.escribir(trozo, celdas)
+        self.modificados.discard(trozo)
+
+    def guardar(self):
+        """
+        Escribir en disco los trozos en memoria que han cambiado
+        :return:
+        """
+        for trozo in self.modificados:
+            self.escribir(trozo, self.trozos[trozo])
+        self.modificados.clear()
+
+    def cerrar(self):
+        """
+        Terminar con el mundo: la carpeta temporal se borra con todos
+        sus trozos y en una carpeta dada se guardan los trozos
+        cambiados. Despues el mundo no se puede seguir usando
+        :return:
+        """
+        if self.temporal:
+            if self.directorio is not None:
+                shutil.rmtree(self.directorio, ignore_errors=True)
+                self.directorio = None
+        else:
+            self.guardar()
+        self.trozos.clear()
+        self.modificados.clear()
+
+    def __enter__(self):
+        """
+        Usar el mundo en un bloque with que lo cierra al salir
+        :return: El propio mundo
+        """
+        return self
+
+    def __exit__(self, tipo, valor, traza):
+        """
+        Cerrar el mundo al salir del bloque with
+        :return: Falso para no ocultar excepciones
+        """
+        self.cerrar()
+        return False
+
+    def __getitem__(self, celda):
+        """
+        Estado de una celda del mundo
+        :param celda: Celda global
+        :return: Estado de esa celda
+        """
+        (trozo, indice) = self.coordenadas(celda)
+        return self.trozo(trozo)[indice]
+
+    def __setitem__(self, celda, estado):
+        """
+        Cambiar el estado de una celda del mundo. Si esta en la ventana
+        se cambia a traves de ella para que sus indices se actualicen
+        :param celda: Celda global
+        :param estado: Nuevo estado de la celda
+        :return:
+        """
+        if self.en_ventana(celda):
+            self.mapa[self.a_local(celda)] = estado
+            return
+        (trozo, indice) = self.coordenadas(celda)
+        self.trozo(trozo)[indice] = estado
+        self.modificados.add(trozo)
+
+    def cambiar_celda(self, mapa, celda):
+        """
+        Observador de cambios de celda de la ventana: lleva el cambio a
+        su trozo
+        :param mapa: Ventana cambiada
+        :param celda: Celda local cambiada
+        :return:
+        """
+        (trozo, indice) = self.coordenadas(self.a_global(celda))
+        self.trozo(trozo)[indice] = mapa[celda]
+        self.modificados.add(trozo)
+
+    def a_local(self, celda):
+        """
+        Celda de la ventana que corresponde a una celda global
+        :param celda: Celda global
+        :return: Celda local
+        """
+        return (celda[0] - self.origen[0], celda[1] - self.origen[1])
+
+    def a_global(self, celda):
+        """
+        Celda global que corresponde a una celda de la ventana
+        :param celda: Celda local
+        :return: Celda global
+        """
+        return (celda[0] + self.origen[0], celda[1] + self.origen[1])
+
+    def en_ventana(self, celda):
+        """
+        Comprobar si una celda global esta dentro de la ventana
+        :param celda: Celda global
+        :return: Booleano
+        """
+        return self.origen is not None and \
+            self.mapa.esta_dentro(self.a_local(celda))
+
+    def copiar_trozos(self, destino, trozo_inicial):
+        """
+        Copiar trozos consecutivos en una rejilla
+        :param destino: Array (ancho, alto) a rellenar, multiplos del
+        tamaño del trozo
+        :param trozo_inicial: Trozo de la esquina (0, 0) del destino
+        :return:
+        """
+        tam = self.tam_trozo
+        (ancho, alto) = destino.shape
+        for i in range(ancho // tam):
+            for j in range(alto // tam):
+                celdas = self.trozo((trozo_inicial[0] + i,
+                                     trozo_inicial[1] + j))
+                destino[i * tam:(i + 1) * tam, j * tam:(j + 1) * tam] = \
+                    np.frombuffer(celdas, dtype=np.uint8).reshape(tam, tam)
+
+    def centrar(self, celda):
+        """
+        Mover la ventana para que el trozo de una celda quede en el
+        centro si la celda esta a menos de medio trozo del borde. Las
+        estructuras de la ventana se recalculan solas al cambiar su
+        version
+        :param celda: Celda global del foco, por ejemplo el jugador
+        :return: Booleano si la ventana se ha movido
+        """
+        tam = self.tam_trozo
+        if self.origen is not None:
+            (x, y) = self.a_local(celda)
+            lado = self.mapa.ancho_mapa
+            if tam // 2 <= x < lado - tam // 2 and \
+                    tam // 2 <= y < lado - tam // 2:
+                return False
+        ((cx, cy), _) = self.coordenadas(celda)
+        mitad = self.trozos_ventana // 2
+        inicial = (cx - mitad, cy - mitad)
+        self.copiar_trozos(self.mapa.celdas, inicial)
+        self.origen = (inicial[0] * tam, inicial[1] * tam)
+        self.mapa.version += 1
+        return True
+
+    def zona(self, origen, destino):
+        """
+        Mapa temporal con los trozos que cubren dos celdas y un trozo
+        mas alrededor
+        :param origen: Celda global
+        :param destino: Celda global
+        :return: Tupla (mapa, celda global de su celda (0, 0))
+        """
+        tam = self.tam_trozo
+        ((cx0, cy0), _) = self.coordenadas(origen)
+        ((cx1, cy1), _) = self.coordenadas(destino)
+        inicial = (min(cx0, cx1) - 1, min(cy0, cy1) - 1)
+        ancho = abs(cx1 - cx0) + 3
+        alto = abs(cy1 - cy0) + 3
+        if ancho * alto > MAX_TROZOS_BUSQUEDA:
+            raise ValueError("Zona de busqueda de %d trozos, el maximo es "
+                             "%d" % (ancho * alto, MAX_TROZOS_BUSQUEDA))
+        mapa = Mapa(ancho * tam, alto * tam, 1, compacto=True,
+                    con_pantalla=False)
+        self.copiar_trozos(mapa.celdas, inicial)
+        mapa.version += 1
+        return mapa, (inicial[0] * tam, inicial[1] * tam)
+
+    def buscar_camino(self, origen, destino, algoritmo=A_ESTRELLA):
+        """
+        Buscar camino entre dos celdas del mundo. Si las dos estan en la
+        ventana se busca en ella; si no, en un mapa temporal con los
+        trozos que las cubren y un trozo de margen. En ambos casos el
+        camino no sale de ese mapa
+        :param origen: Celda global origen
+        :param destino: Celda global destino
+        :param algoritmo: A_ESTRELLA o JPS
+        :return: Lista de celdas globales desde la siguiente al origen
+        hasta el destino o None si no hay camino
+        """
+        if self.en_ventana(origen) and self.en_ventana(destino):
+            mapa = self.mapa
+            base = self.origen
+        else:
+            (mapa, base) = self.zona(origen, destino)
+        camino = mapa.buscar_camino(
+            (origen[0] - base[0], origen[1] - base[1]),
+            (destino[0] - base[0], destino[1] - base[1]), algoritmo)
+        if camino is None:
+            return None
+        return [(base[0] + nodo.i, base[1] + nodo.j) for nodo in camino]
+
+    def es_visble(self, origen, destino):
+        """
+        Comprueba que haya visibilidad en camino recto, con la misma
+        regla que Mapa.es_visble y en cualquier parte del mundo
+        :param origen: Celda global origen
+        :param destino: Celda global destino
+        :return: Si el camino es visible o no
+        """
+        for celda in linea(origen, destino)[:-1]:
+            if self[celda] == MURO:
+                return False
+        return True
+
+    def es_visible(self, origen, destino, radio):
+        """
+        Comprueba con el campo de vision si destino es visible desde
+        origen dentro del radio. Si el radio alrededor del origen no
+        cabe en la ventana se comprueba la linea recta
+        :param origen: Celda global desde la que se mira
+        :param destino: Celda global que se quiere ver
+        :param radio: Distancia Manhattan maxima de vision
+        :return: Si destino es visible o no
+        """
+        if abs(destino[0] - origen[0]) + abs(destino[1] - origen[1]) > radio:
+            return False
+        (x, y) = origen
+        if self.en_ventana((x - radio, y - radio)) and \
+                self.en_ventana((x + radio, y + radio)):
+            return self.vision.es_visible(self.a_local(origen),
+                                          self.a_local(destino), radio)
+        return self.es_visble(origen, destino)
+
+    def celda_libre(self, celda):
+        """
+        Celda libre mas cercana a una celda, buscando en anillos
+        :param celda: Celda global
+        :return: Celda global libre
+        """
+        (x, y) = celda
+        radio = 0
+        while True:
+            for i in range(-radio, radio + 1):
+                for j in (-radio, radio) if abs(i) != radio \
+                        else range(-radio, radio + 1):
+                    if self[(x + i, y + j)] != MURO:
+                        return (x + i, y + j)
+            radio += 1
+
+
+if __name__ == '__main__':
+    from bucle import BucleJuego
+    from render import RenderizadorVista
+    from pygame.locals import QUIT, KEYDOWN, MOUSEBUTTONDOWN, K_RIGHT, \
+        K_LEFT, K_UP, K_DOWN
+
+    # Paseo por un mundo infinito: flechas para moverse y click para ir
+    pygame.init()
+    mundo = Mundo(int(sys.argv[1]) if len(sys.argv) > 1 else 0)
+    jugador = [mundo.celda_libre((0, 0))]
+    movimientos = []
+    mundo.centrar(jugador[0])
+    lado = mundo.tam_trozo * mundo.trozos_ventana // 2
+    renderizador = RenderizadorVista(mundo.mapa, lado, lado)
+    pasos = {K_RIGHT: (0, 1), K_LEFT: (0, -1), K_UP: (-1, 0),
+             K_DOWN: (1, 0)}
+    bucle = None
+
+    def recoger_eventos():
+        """
+        Atender el teclado y el raton
+        :return:
+        """
+        for event in pygame.event.get():
+            if event.type == QUIT:
+                bucle.detener()
+            elif event.type == KEYDOWN and event.key in pasos:
+                movimientos.clear()
+                (dx, dy) = pasos[event.key]
+                siguiente = (jugador[0][0] + dx, jugador[0][1] + dy)
+                if mundo[siguiente] != MURO:
+                    movimientos.append(siguiente)
+            elif event.type == MOUSEBUTTONDOWN:
+                destino = mundo.a_global(
+                    renderizador.celda_en_pantalla(event.pos))
+                camino = mundo.buscar_camino(jugador[0], destino)
+                movimientos[:] = camino or []
+
+    def simular():
+        """
+        Avanzar un paso del camino y mover la ventana si hace falta
+        :return:
+        """
+        if movimientos:
+            jugador[0] = movimientos.pop(0)
+            mundo.centrar(jugador[0])
+
+    def pintar(alfa):
+        """
+        Pintar la vista centrada en el jugador
+        :param alfa: Sin uso
+        :return:
+        """
+        local = mundo.a_local(jugador[0])
+        renderizador.dibujar([(local, color_mapa.ROJO)], local)
+
+    bucle = BucleJuego(simular, pintar, recoger_eventos,
+                       ticks_por_segundo=20)
+    try:
+        bucle.ejecutar()
+    finally:
+        mundo.cerrar()
+    pygame.quit()
@@ -0,0 +1,175 @@
+import json
+import time
+
+import pygame
+
+import color_mapa
+
+# Lineas de la superposicion en pantalla, las mas costosas primero
+LINEAS_SUPERPOSICION = 12
+TAMANO_LETRA = 18
+
+
+class Perfilador:
+    """
+    Medicion por tick del bucle de juego. Acumula el tiempo de cada
+    subsistema y de cada estado de los monstruos durante el tick, lee
+    los contadores acumulados de las busquedas de camino y al cerrar el
+    tick guarda un registro que se puede pintar encima del juego o
+    volcar como una linea JSON. Sin perfilador las entidades no miden
+    nada, asi que solo cuesta cuando se usa
+    """
+    def __init__(self, fichero=None, reloj=time.perf_counter):
+        """
+        Constructor del perfilador
+        :param fichero: Ruta del volcado en lineas JSON o None para no
+        volcar
+        :param reloj: Funcion que devuelve el tiempo en segundos
+        """
+        self.reloj = reloj
+        self.fichero = open(fichero, "w") if fichero is not None else None
+        # Segundos de cada medida desde el ultimo tick cerrado
+        self.tiempos = {}
+        # Listas [nombre, objeto, atributo, valor al cerrar el tick
+        # anterior] de los contadores acumulados que se vigilan
+        self.vigilados = []
+        # Segundos totales, llamadas y maximo por tick de cada medida
+        self.totales = {}
+        self.llamadas = {}
+        self.maximos = {}
+        self.inicio_tick = None
+        self.ultimo = None
+        self.visible = False
+        self.fuente = None
+
+    def medir(self, nombre, funcion, *args):
+        """
+        Llamar a una funcion sumando su duracion a una medida del tick
+        :param nombre: Nombre de la medida
+        :param funcion: Funcion a llamar
+        :param args: Argumentos de la funcion
+        :return: Lo que devuelva la funcion
+        """
+        inicio = self.reloj()
+        resultado = funcion(*args)
+        tiempos = self.tiempos
+        tiempos[nombre] = tiempos.get(nombre, 0.0) + self.reloj() - inicio
+        self.llamadas[nombre] = self.llamadas.get(nombre, 0) + 1
+        return resultado
+
+    def vigilar(self, nombre, objeto, atributo):
+        """
+        Registrar un contador acumulado de otro objeto; cada tick se
+        guarda lo que ha crecido
+        :param nombre: Nombre del contador en los registros
+        :param objeto: Objeto que lleva la cuenta
+        :param atributo: Atributo entero del objeto
+        :return:
+        """
+        self.vigilados.append([nombre, objeto, atributo,
+                               getattr(objeto, atributo)])
+
+    def empezar_tick(self):
+        """
+        Marcar el comienzo de un tick
+        :return:
+        """
+        self.inicio_tick = self.reloj()
+
+    def terminar_tick(self, tick):
+        """
+        Cerrar el registro del tick con sus medidas y contadores. Las
+        medidas hechas entre ticks, como el pintado, van en el registro
+        del tick siguiente
+        :param tick: Numero del tick
+        :return: Diccionario con el registro
+        """
+        if self.inicio_tick is not None:
+            self.tiempos["tick"] = self.reloj() - self.inicio_tick
+            self.llamadas["tick"] = self.llamadas.get("tick", 0) + 1
+            self.inicio_tick = None
+        contadores = {}
+        for vigilado in self.vigilados:
+            (nombre, objeto, atributo, anterior) = vigilado
+            valor = getattr(objeto, atributo)
+            contadores[nombre] = valor - anterior
+            vigilado[3] = valor
+        for nombre, segundos in self.tiempos.items():
+            self.totales[nombre] = self.totales.get(nombre, 0.0) + segundos
+            if segundos > self.maximos.get(nombre, 0.0):
+                self.maximos[nombre] = segundos
+        self.ultimo = {
+            "tick": tick,
+            "tiempos_ms": {nombre: segundos * 1000
+                           for nombre, segundos in self.tiempos.items()},
+            "contadores": contadores,
+        }
+        if self.fichero is not None:
+            self.fichero.write(json.dumps(self.ultimo) + "\n")
+        self.tiempos = {}
+        return self.ultimo
+
+    def resumen(self):
+        """
+        Estadisticas de todas las medidas desde que se creo
+        :return: Diccionario {medida: {total_ms, llamadas, maximo_ms}}
+        """
+        return {nombre: {"total_ms": segundos * 1000,
+                         "llamadas": self.llamadas.get(nombre, 0),
+                         "maximo_ms": self.maximos.get(nombre, 0.0) * 1000}
+                for nombre, segundos in self.totales.items()}
+
+    def alternar(self):
+        """
+        Mostrar u ocultar la superposicion en pantalla
+        :return: Booleano si queda visible
+        """
+        self.visible = not self.visible
+        return self.visible
+
+    def lineas(self):
+        """
+        Texto de la superposicion con el ultimo tick cerrado
+        :return: Lista de cadenas
+        """
+        if self.ultimo is None:
+            return ["sin ticks"]
+        tiempos = self.ultimo["tiempos_ms"]
+        lineas = ["tick %d" % self.ultimo["tick"]]
+        for nombre in sorted(tiempos, key=tiempos.get, reverse=True):
+            lineas.append("%-18s %7.3f ms" % (nombre, tiempos[nombre]))
+        for nombre, valor in self.ultimo["contadores"].items():
+            if valor:
+                lineas.append("%-18s %7d" % (nombre, valor))
+        return lineas[:LINEAS_SUPERPOSICION]
+
+    def dibujar(self, pantalla):
+        """
+        Pintar la superposicion en la esquina de la pantalla si esta
+        visible
+        :param pantalla: Superficie donde pintar
+        :return: Rectangulo pintado o None
+        """
+        if not self.visible:
+            return None
+        if self.fuente is None:
+            pygame.font.init()
+            self.fuente = pygame.font.Font(None, TAMANO_LETRA)
+        textos = [self.fuente.render(linea, True, color_mapa.BLANCO)
+                  for linea in self.lineas()]
+        alto_linea = self.fuente.get_linesize()
+        rect = pygame.Rect(0, 0, max(texto.get_width() for texto in textos)
+                           + 8, alto_linea * len(textos) + 8)
+        pantalla.fill(color_mapa.NEGRO, rect)
+        for numero, texto in enumerate(textos):
+            pantalla.blit(texto, (4, 4 + numero * alto_linea))
+        return rect
+
+    def cerrar(self):
+        """
+        Cerrar el volcado
+        :return:
+        """
+        if self.fichero is not None:
+            self.fichero.close()
+            self.fichero = None
@@ -0,0 +1,203 @@
+import random
+from array import array
+from collections import deque
+import numpy as np
+from mapa import MURO
+
+SIN_REGION = -1
+
+
+class IndiceRegiones:
+    """
+    Indice de regiones conexas del mapa. Cada celda libre lleva la
+    etiqueta de su componente con conectividad de 8 vecinos, asi que
+    saber si dos celdas se pueden unir por un camino es O(1). Se
+    calcula entero tras la generacion y se actualiza con cada cambio
+    de celda
+    """
+    def __init__(self, mapa, etiquetas=None, tamanos=None):
+        """
+        Constructor del indice
+        :param mapa: Mapa a etiquetar
+        :param etiquetas: Etiquetas ya calculadas para el estado actual
+        del mapa, un buffer escribible de enteros por celda. Si no se
+        dan se etiqueta el mapa
+        :param tamanos: Diccionario {etiqueta: celdas} de esas
+        etiquetas; si no se da se cuentan
+        """
+        self.mapa = mapa
+        self.etiquetas = None
+        self.tamanos = {}
+        self.siguiente = 0
+        self.version = None
+        if etiquetas is None:
+            self.etiquetar()
+        else:
+            self.etiquetas = etiquetas
+            if tamanos is None:
+                valores = np.frombuffer(etiquetas, dtype=np.intc)
+                cuentas = np.bincount(valores[valores != SIN_REGION])
+                tamanos = {int(etiqueta): int(cuentas[etiqueta])
+                           for etiqueta in np.flatnonzero(cuentas)}
+            self.tamanos = dict(tamanos)
+            self.siguiente = max(self.tamanos, default=-1) + 1
+            self.version = mapa.version
+        mapa.agregar_observador_celdas(self.cambiar_celda)
+
+    def actualizar(self):
+        """
+        Recalcular todas las etiquetas si el mapa ha cambiado sin avisar
+        celda a celda, por ejemplo al generarse
+        :return:
+        """
+        if self.version != self.mapa.version:
+            self.etiquetar()
+
+    def etiquetar(self):
+        """
+        Etiquetar todas las regiones del mapa
+        :return:
+        """
+        mapa = self.mapa
+        celdas = mapa.celdas_planas
+        self.etiquetas = array('i', [SIN_REGION]) * len(celdas)
+        self.tamanos = {}
+        self.siguiente = 0
+        for indice in range(len(celdas)):
+            if celdas[indice] != MURO and \
+                    self.etiquetas[indice] == SIN_REGION:
+                self.inundar(indice, self.nueva_etiqueta())
+        self.version = mapa.version
+
+    def nueva_etiqueta(self):
+        """
+        Reservar una etiqueta sin usar
+        :return: Etiqueta nueva
+        """
+        etiqueta = self.siguiente
+        self.siguiente += 1
+        self.tamanos[etiqueta] = 0
+        return etiqueta
+
+    def vecinos_libres(self, indice):
+        """
+        Vecinos libres de una celda
+        :param indice: Indice de la celda
+        :return: Generador de indices vecinos que no son muro
+        """
+        mapa = self.mapa
+        for desplazamiento, _, _, _ in \
+                mapa.pasos_mascara[mapa.mascaras_vecinos()[indice]]:
+            yield indice + desplazamiento
+
+    def inundar(self, inicio, etiqueta):
+        """
+        Poner una etiqueta a toda la region libre de una celda
+        :param inicio: Indice de la celda inicial
+        :param etiqueta: Etiqueta a poner
+        :return:
+        """
+        etiquetas = self.etiquetas
+        anterior = etiquetas[inicio]
+        if anterior != SIN_REGION:
+            self.quitar_celdas(anterior, 1)
+        etiquetas[inicio] = etiqueta
+        self.tamanos[etiqueta] += 1
+        pendientes = deque([inicio])
+        while pendientes:
+            actual = pendientes.popleft()
+            for vecino in self.vecinos_libres(actual):
+                anterior = etiquetas[vecino]
+                if anterior != etiqueta:
+                    if anterior != SIN_REGION:
+                        self.quitar_celdas(anterior, 1)
+                    etiquetas[vecino] = etiqueta
+                    self.tamanos[etiqueta] += 1
+                    pendientes.append(vecino)
+
+    def quitar_celdas(self, etiqueta, numero):
+        """
+        Descontar celdas de una region y olvidarla si queda vacia
+        :param etiqueta: Etiqueta de la region
+        :param numero: Numero de celdas a descontar
+        :return:
+        """
+        self.tamanos[etiqueta] -= numero
+        if self.tamanos[etiqueta] <= 0:
+            del self.tamanos[etiqueta]
+
+    def cambiar_celda(self, mapa, celda):
+        """
+        Observador de cambios de celda. Al abrir una celda se unen las
+        regiones vecinas reetiquetando las mas pequeñas; al cerrarla se
+        reetiqueta su region por si se ha partido
+        :param mapa: Mapa cambiado
+        :param celda: Celda cambiada
+        :return:
+        """
+        if self.version != mapa.version - 1:
+            return
+        self.version = mapa.version
+        indice = celda[0] * mapa.alto_mapa + celda[1]
+        etiquetas = self.etiquetas
+        anterior = etiquetas[indice]
+
+        if mapa.celdas_planas[indice] == MURO:
+            if anterior == SIN_REGION:
+                return
+            etiquetas[indice] = SIN_REGION
+            self.quitar_celdas(anterior, 1)
+            # Cada vecino que siga con la etiqueta vieja inicia una
+            # region nueva; los que ya se reetiquetaron estan unidos
+            for vecino in self.vecinos_libres(indice):
+                if etiquetas[vecino] == anterior:
+                    self.inundar(vecino, self.nueva_etiqueta())
+        else:
+            if anterior != SIN_REGION:
+                return
+            vecinas = {etiquetas[vecino]
+                       for vecino in self.vecinos_libres(indice)}
+            if not vecinas:
+                etiqueta = self.nueva_etiqueta()
+            else:
+                # Se conserva la region mas grande
+                etiqueta = max(vecinas, key=lambda e: self.tamanos[e])
+            etiquetas[indice] = etiqueta
+            self.tamanos[etiqueta] += 1
+            for vecino in self.vecinos_libres(indice):
+                if etiquetas[vecino] != etiqueta:
+                    self.inundar(vecino, etiqueta)
+
+    def region(self, celda):
+        """
+        Etiqueta de la region de una celda
+        :param celda: Celda a consultar
+        :return: Etiqueta o SIN_REGION si es muro
+        """
+        self.actualizar()
+        return self.etiquetas[celda[0] * self.mapa.alto_mapa + celda[1]]
+
+    def misma_region(self, origen, destino):
+        """
+        Comprueba si existe camino entre dos celdas libres
+        :param origen: Celda origen
+        :param destino: Celda destino
+        :return: Si estan en la misma region
+        """
+        region = self.region(destino)
+        return region != SIN_REGION and region == self.region(origen)
+
+    def celda_aleatoria(self, region, generador=random):
+        """
+        Elegir al azar una celda de una region
+        :param region: Etiqueta de la region
+        :param generador: Generador aleatorio a usar
+        :return: Celda elegida o None si la region no existe
+        """
+        self.actualizar()
+        indices = np.flatnonzero(
+            np.frombuffer(self.etiquetas, dtype=np.intc) == region)
+        if len(indices) == 0:
+            return None
+        indice = int(indices[generador.randrange(len(indices))])
+        return divmod(indice, self.mapa.alto_mapa)
@@ -0,0 +1,224 @@
+import numpy as np
+import pygame
+from mapa import colores_mapa
+
+
+class Renderizador:
+    """
+    Pintado del mapa por rectangulos sucios. El terreno se pinta una vez
+    en una superficie aparte que solo se rehace cuando cambian celdas, y
+    en cada fotograma solo se repintan las celdas cuyos ocupantes han
+    cambiado, actualizando en pantalla solo esos rectangulos. Las
+    entidades se pintan en su posicion en pixeles, asi que al
+    interpolar entre ticks se desplazan suavemente entre celdas
+    """
+    def __init__(self, mapa):
+        """
+        Constructor del renderizador
+        :param mapa: Mapa a pintar, con pantalla
+        """
+        self.mapa = mapa
+        self.pantalla = mapa.pantalla
+        self.terreno = pygame.Surface(self.pantalla.get_size())
+        self.version = None
+        # Tuplas (rectangulo, color) de las entidades pintadas en el
+        # ultimo fotograma, en orden de pintado
+        self.pintadas = []
+        # Celdas de terreno cambiadas pendientes de llevar a pantalla
+        self.sucias = set()
+        mapa.agregar_observador_celdas(self.cambiar_celda)
+
+    def rect_celda(self, celda):
+        """
+        Rectangulo en pantalla de una celda, con la misma disposicion
+        que Mapa.mostrar_celda
+        :param celda: Celda, puede tener coordenadas reales
+        :return: pygame.Rect de la celda redondeado al pixel
+        """
+        (x, y) = celda
+        lado = self.mapa.lado_celda
+        return pygame.Rect(round(y * lado), round(x * lado), lado, lado)
+
+    def pintar_terreno(self):
+        """
+        Pintar todo el terreno en la superficie de terreno
+        :return:
+        """
+        mapa = self.mapa
+        for x in range(mapa.ancho_mapa):
+            for y in range(mapa.alto_mapa):
+                pygame.draw.rect(self.terreno, colores_mapa[mapa[(x, y)]],
+                                 self.rect_celda((x, y)))
+        self.version = mapa.version
+
+    def cambiar_celda(self, mapa, celda):
+        """
+        Observador de cambios de celda: repinta solo esa celda del
+        terreno y la marca como sucia
+        :param mapa: Mapa cambiado
+        :param celda: Celda cambiada
+        :return:
+        """
+        if self.version != mapa.version - 1:
+            return
+        pygame.draw.rect(self.terreno, colores_mapa[mapa[celda]],
+                         self.rect_celda(celda))
+        self.sucias.add(tuple(celda))
+        self.version = mapa.version
+
+    def invalidar(self):
+        """
+        Forzar que el proximo fotograma se pinte entero, por ejemplo
+        despues de pintar otra cosa encima
+        :return:
+        """
+        self.version = None
+
+    def celda_en_pantalla(self, posicion):
+        """
+        Celda que hay bajo un punto de la pantalla
+        :param posicion: Posicion (x, y) en pixeles
+        :return: Celda del mapa
+        """
+        lado = self.mapa.lado_celda
+        return (posicion[1] // lado, posicion[0] // lado)
+
+    def dibujar(self, entidades, centro=None):
+        """
+        Pintar un fotograma y actualizar solo las zonas que cambian: los
+        rectangulos que dejan y ocupan las entidades que se mueven y las
+        celdas de terreno cambiadas
+        :param entidades: Lista de tuplas (celda, color) en orden de
+        pintado; la celda puede tener coordenadas reales si se
+        interpola entre ticks
+        :param centro: Sin uso, se pinta el mapa entero
+        :return: Lista de rectangulos actualizados
+        """
+        pintadas = [(tuple(self.rect_celda(celda)), color)
+                    for celda, color in entidades]
+
+        if self.version != self.mapa.version:
+            # Cambio masivo del mapa: se rehace y se vuelca entero
+            self.pintar_terreno()
+            self.pantalla.blit(self.terreno, (0, 0))
+            for rect, color in pintadas:
+                pygame.draw.rect(self.pantalla, color, rect)
+            self.pintadas = pintadas
+            self.sucias.clear()
+            pygame.display.update()
+            return [self.pantalla.get_rect()]
+
+        anteriores = set(self.pintadas)
+        nuevas = set(pintadas)
+        # Se devuelve el terreno donde ya no hay entidad o ha cambiado
+        borradas = [pygame.Rect(rect) for rect, color in self.pintadas
+                    if (rect, color) not in nuevas]
+        borradas.extend(self.rect_celda(celda) for celda in self.sucias)
+        for rect in borradas:
+            self.pantalla.blit(self.terreno, rect, rect)
+        rects = borradas + [pygame.Rect(rect) for rect, color in pintadas
+                            if (rect, color) not in anteriores]
+        if rects:
+            # Se repintan en orden las entidades que tocan algo cambiado
+            # para que los solapes queden igual que al pintar todo
+            for rect, color in pintadas:
+                if pygame.Rect(rect).collidelist(rects) != -1:
+                    pygame.draw.rect(self.pantalla, color, rect)
+            pygame.display.update(rects)
+        self.pintadas = pintadas
+        self.sucias = set()
+        return rects
+
+
+class RenderizadorVista:
+    """
+    Pintado de una ventana del mapa centrada en una celda. El estado de
+    las celdas visibles se convierte a colores con una paleta en una
+    sola operacion NumPy y se escala a la pantalla de una vez, asi que
+    el coste depende del tamaño de la ventana y no del mapa
+    """
+    def __init__(self, mapa, ancho_vista, alto_vista, lado_celda=None,
+                 pantalla=None):
+        """
+        Constructor del renderizador
+        :param mapa: Mapa a pintar, puede no tener pantalla
+        :param ancho_vista: Celdas visibles en el eje x del mapa
+        :param alto_vista: Celdas visibles en el eje y del mapa
+        :param lado_celda: Pixeles por celda, por defecto los del mapa
+        :param pantalla: Superficie donde pintar; si no se da se abre
+        una ventana del tamaño de la vista
+        """
+        self.mapa = mapa
+        self.lado_celda = lado_celda or mapa.lado_celda
+        self.ancho_vista = min(ancho_vista, mapa.ancho_mapa)
+        self.alto_vista = min(alto_vista, mapa.alto_mapa)
+        # Igual que en Mapa.mostrar_celda, x va en vertical e y en
+        # horizontal
+        tamano = (self.alto_vista * self.lado_celda,
+                  self.ancho_vista * self.lado_celda)
+        if pantalla is None:
+            pantalla = pygame.display.set_mode(tamano)
+        self.pantalla = pantalla
+        self.pequena = pygame.Surface((self.alto_vista, self.ancho_vista))
+        self.paleta = np.zeros((256, 3), dtype=np.uint8)
+        for estado, color in colores_mapa.items():
+            self.paleta[estado] = color
+        self.origen = (0, 0)
+
+    def centrar(self, centro):
+        """
+        Colocar la vista centrada en una celda sin salirse del mapa
+        :param centro: Celda central
+        :return:
+        """
+        x0 = centro[0] - self.ancho_vista // 2
+        y0 = centro[1] - self.alto_vista // 2
+        x0 = max(0, min(x0, self.mapa.ancho_mapa - self.ancho_vista))
+        y0 = max(0, min(y0, self.mapa.alto_mapa - self.alto_vista))
+        self.origen = (x0, y0)
+
+    def invalidar(self):
+        """
+        Nada que hacer: cada fotograma se pinta entero
+        :return:
+        """
+        pass
+
+    def celda_en_pantalla(self, posicion):
+        """
+        Celda que hay bajo un punto de la pantalla
+        :param posicion: Posicion (x, y) en pixeles
+        :return: Celda del mapa
+        """
+        lado = self.lado_celda
+        return (self.origen[0] + posicion[1] // lado,
+                self.origen[1] + posicion[0] // lado)
+
+    def dibujar(self, entidades, centro=None):
+        """
+        Pintar un fotograma de la vista
+        :param entidades: Lista de tuplas (celda, color) en orden de
+        pintado; la celda puede tener coordenadas reales si se
+        interpola entre ticks
+        :param centro: Celda en la que centrar la vista
+        :return: Lista con el rectangulo actualizado
+        """
+        if centro is not None:
+            self.centrar(centro)
+        (x0, y0) = self.origen
+        vista = self.mapa.celdas[x0:x0 + self.ancho_vista,
+                                 y0:y0 + self.alto_vista]
+        # surfarray indexa por (pixel x, pixel y), es decir (y, x)
+        pygame.surfarray.blit_array(self.pequena, self.paleta[vista.T])
+        pygame.transform.scale(self.pequena, self.pantalla.get_size(),
+                               self.pantalla)
+
+        lado = self.lado_celda
+        for (x, y), color in entidades:
+            if (x0 - 1 < x < x0 + self.ancho_vista
+                    and y0 - 1 < y < y0 + self.alto_vista):
+                pygame.draw.rect(self.pantalla, color,
+                                 (round((y - y0) * lado),
+                                  round((x - x0) * lado), lado, lado))
+        pygame.display.update()
+        return [self.pantalla.get_rect()]
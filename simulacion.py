@@ -0,0 +1,120 @@
+import os
+import sys
+import time
+from functools import partial
+from multiprocessing import Pool
+
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+from Juego import Simulacion, Estado, Monstruo
+from mapa import distancia
+
+MAX_TICKS = 2000
+PARTIDAS = 200
+# Partidas que se envian juntas a cada proceso
+PARTIDAS_POR_ENVIO = 8
+
+
+def politica_aleatoria(simulacion):
+    """
+    Jugador que ataca si tiene un monstruo al lado y si no da un paso
+    al azar
+    :param simulacion: Partida en curso
+    :return:
+    """
+    jugador = simulacion.jugador
+    if simulacion.entidades.vecinos(jugador.posicion, Monstruo):
+        jugador.golpear()
+        return
+    jugador.mover(simulacion.aleatorio.choice(
+        [(0, 1), (0, -1), (1, 0), (-1, 0)]))
+
+
+def politica_cazadora(simulacion):
+    """
+    Jugador que ataca si tiene un monstruo al lado y si no va a por el
+    monstruo vivo mas cercano
+    :param simulacion: Partida en curso
+    :return:
+    """
+    jugador = simulacion.jugador
+    if simulacion.entidades.vecinos(jugador.posicion, Monstruo):
+        jugador.golpear()
+        return
+    vivos = [monstruo for monstruo in simulacion.monstruos
+             if monstruo.estado != Estado.MUERTO]
+    if vivos and not jugador.movimientos:
+        objetivo = min(vivos, key=lambda monstruo: distancia(
+            jugador.posicion, monstruo.posicion))
+        jugador.ir_a(objetivo.posicion)
+
+
+POLITICAS = {
+    "aleatoria": politica_aleatoria,
+    "cazadora": politica_cazadora,
+}
+
+
+def jugar_partida(semilla, max_ticks=MAX_TICKS, politica="aleatoria",
+                  **opciones):
+    """
+    Jugar una partida completa sin pantalla
+    :param semilla: Semilla de la partida
+    :param max_ticks: Numero maximo de ticks
+    :param politica: Nombre de la politica del jugador en POLITICAS
+    :param opciones: Resto de argumentos de Simulacion
+    :return: Diccionario con el resultado y la semilla
+    """
+    simulacion = Simulacion(semilla=semilla, politica=POLITICAS[politica],
+                            **opciones)
+    resultado = simulacion.ejecutar(max_ticks)
+    resultado["semilla"] = semilla
+    return resultado
+
+
+def jugar_partidas(semillas, procesos=None, **opciones):
+    """
+    Jugar muchas partidas independientes repartidas en procesos. Cada
+    partida depende solo de su semilla, asi que el resultado no cambia
+    con el numero de procesos
+    :param semillas: Semillas de las partidas
+    :param procesos: Numero de procesos, por defecto uno por nucleo
+    :param opciones: Argumentos de jugar_partida
+    :return: Lista de resultados en el orden de las semillas
+    """
+    with Pool(procesos) as pool:
+        return pool.map(partial(jugar_partida, **opciones), semillas,
+                        chunksize=PARTIDAS_POR_ENVIO)
+
+
+def resumir(resultados):
+    """
+    Estadisticas de un lote de partidas
+    :param resultados: Lista de resultados de jugar_partida
+    :return: Diccionario con partidas, victorias, ticks medios y media
+    de monstruos muertos
+    """
+    partidas = len(resultados)
+    return {
+        "partidas": partidas,
+        "victorias": sum(r["gana_jugador"] for r in resultados),
+        "derrotas": sum(r["vida_jugador"] <= 0 for r in resultados),
+        "ticks_medios": sum(r["ticks"] for r in resultados) / partidas,
+        "muertos_medios": (sum(r["monstruos_muertos"] for r in resultados)
+                           / partidas),
+    }
+
+
+if __name__ == "__main__":
+    politica = sys.argv[1] if len(sys.argv) > 1 else "aleatoria"
+    partidas = int(sys.argv[2]) if len(sys.argv) > 2 else PARTIDAS
+    # Con un fichero de mapa todas las partidas comparten ese mapa, que
+    # cada proceso proyecta en memoria en lugar de generarlo
+    ruta_mapa = sys.argv[3] if len(sys.argv) > 3 else None
+    inicio = time.perf_counter()
+    resultados = jugar_partidas(range(partidas), politica=politica,
+                                ruta_mapa=ruta_mapa)
+    segundos = time.perf_counter() - inicio
+    print(resumir(resultados))
+    print("%d partidas en %.1f s (%.0f partidas/hora)"
+          % (partidas, segundos, partidas / segundos * 3600))
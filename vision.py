@@ -0,0 +1,139 @@
+from collections import OrderedDict
+from mapa import MURO
+
+MAX_CAMPOS_CACHE = 4096
+
+# Transformaciones de cada uno de los ocho octantes (xx, xy, yx, yy)
+OCTANTES = [
+    (1, 0, 0, 1), (0, 1, 1, 0),
+    (0, -1, 1, 0), (-1, 0, 0, 1),
+    (-1, 0, 0, -1), (0, -1, -1, 0),
+    (0, 1, -1, 0), (1, 0, 0, -1)]
+
+
+class CampoVision:
+    """
+    Campo de vision con cache por celda. El conjunto de celdas visibles
+    desde una posicion se calcula una vez por sombras proyectadas
+    (shadowcasting) y se guarda hasta que cambia algun muro del mapa
+    """
+    def __init__(self, mapa, max_campos=MAX_CAMPOS_CACHE):
+        """
+        Constructor del campo de vision
+        :param mapa: Mapa sobre el que se calcula la vision
+        :param max_campos: Numero maximo de campos guardados en cache
+        """
+        self.mapa = mapa
+        self.max_campos = max_campos
+        self.campos = OrderedDict()
+        self.version = mapa.version
+
+    def invalidar(self):
+        """
+        Vaciar la cache de campos de vision
+        :return:
+        """
+        self.campos.clear()
+        self.version = self.mapa.version
+
+    def visibles(self, celda, radio):
+        """
+        Conseguir las celdas visibles desde una celda
+        :param celda: Celda desde la que se mira
+        :param radio: Distancia Manhattan maxima de vision
+        :return: Conjunto de indices de la rejilla visibles
+        """
+        if self.version != self.mapa.version:
+            self.invalidar()
+        clave = (celda, radio)
+        campo = self.campos.get(clave)
+        if campo is not None:
+            self.campos.move_to_end(clave)
+            return campo
+
+        campo = self.calcular(celda, radio)
+        self.campos[clave] = campo
+        if len(self.campos) > self.max_campos:
+            self.campos.popitem(last=False)
+        return campo
+
+    def es_visible(self, origen, destino, radio):
+        """
+        Comprueba si destino es visible desde origen dentro del radio
+        :param origen: Celda desde la que se mira
+        :param destino: Celda que se quiere ver
+        :param radio: Distancia Manhattan maxima de vision
+        :return: Si destino es visible o no
+        """
+        # Fuera del radio no hace falta calcular el campo
+        if abs(destino[0] - origen[0]) + abs(destino[1] - origen[1]) > radio:
+            return False
+        indice = destino[0] * self.mapa.alto_mapa + destino[1]
+        return indice in self.visibles(origen, radio)
+
+    def calcular(self, celda, radio):
+        """
+        Calcular por sombras proyectadas las celdas visibles desde una
+        celda, recorriendo los ocho octantes
+        :param celda: Celda desde la que se mira
+        :param radio: Distancia Manhattan maxima de vision
+        :return: Conjunto de indices de la rejilla visibles
+        """
+        (x, y) = celda
+        visibles = {x * self.mapa.alto_mapa + y}
+        for octante in OCTANTES:
+            self.proyectar(x, y, 1, 1.0, 0.0, radio, octante, visibles)
+        return frozenset(visibles)
+
+    def proyectar(self, cx, cy, fila, inicio, fin, radio, octante,
+                  visibles):
+        """
+        Recorrer las filas de un octante marcando las celdas visibles
+        entre las pendientes inicio y fin. Cada muro encontrado abre una
+        nueva proyeccion con la parte de la fila que queda a su lado
+        :param cx: Coordenada x del observador
+        :param cy: Coordenada y del observador
+        :param fila: Primera fila a recorrer
+        :param inicio: Pendiente inicial visible
+        :param fin: Pendiente final visible
+        :param radio: Distancia Manhattan maxima de vision
+        :param octante: Transformacion del octante
+        :param visibles: Conjunto donde se agregan las celdas
+        :return:
+        """
+        if inicio < fin:
+            return
+        (xx, xy, yx, yy) = octante
+        ancho = self.mapa.ancho_mapa
+        alto = self.mapa.alto_mapa
+        celdas = self.mapa.celdas_planas
+        nuevo_inicio = inicio
+        for j in range(fila, radio + 1):
+            bloqueado = False
+            dy = -j
+            for dx in range(-j, 1):
+                pendiente_izq = (dx - 0.5) / (dy + 0.5)
+                pendiente_der = (dx + 0.5) / (dy - 0.5)
+                if inicio < pendiente_der:
+                    continue
+                if fin > pendiente_izq:
+                    break
+                x = cx + dx * xx + dy * xy
+                y = cy + dx * yx + dy * yy
+                dentro = 0 <= x < ancho and 0 <= y < alto
+                if dentro and -dx - dy <= radio:
+                    visibles.add(x * alto + y)
+                muro = not dentro or celdas[x * alto + y] == MURO
+                if bloqueado:
+                    if muro:
+                        nuevo_inicio = pendiente_der
+                    else:
+                        bloqueado = False
+                        inicio = nuevo_inicio
+                elif muro and j < radio:
+                    bloqueado = True
+                    self.proyectar(cx, cy, j + 1, inicio, pendiente_izq,
+                                   radio, octante, visibles)
+                    nuevo_inicio = pendiente_der
+            if bloqueado:
+                break